@@ -0,0 +1,218 @@
+"""
+Concurrent connection load test of the web app's serving modes.
+
+Starts the web app under gunicorn with one worker process, once per
+WEB_MODE: "sync" (WEB_THREADS request threads) and "async" (an event loop,
+see web-app/async_app.py). For each level of --connections it holds that
+many long-polls of a pending record open, GET /api/sensor_data/<id>?wait=,
+while --probes clients ask for the status of a translated record, and
+reports how many long-polls were served and the probes' throughput and
+latency percentiles as JSON.
+
+Usage:
+    python benchmarks/bench_concurrency.py [--mongo-uri URI]
+        [--modes sync,async] [--connections 10,100,500] [--hold 2]
+        [--probes 20] [--output FILE]
+
+Without --mongo-uri the server runs on an in-memory mongomock database of
+its own, see in_memory_app.py.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+import resource
+import subprocess
+from urllib.parse import urlsplit, urlunsplit
+from bson import ObjectId
+import common
+from common import REPO_ROOT, open_database, summarize, write_report
+
+DATABASE = "benchmark_concurrency"
+
+
+def database_uri(mongo_uri, name):
+    """Returns 'mongo_uri' with 'name' as its default database."""
+    parts = urlsplit(mongo_uri)
+    return urlunsplit(parts._replace(path=f"/{name}"))
+
+
+def seed(db, pending_id, translated_id):
+    """Inserts a pending and a translated record with the given ids."""
+    now = datetime.datetime.now()
+    db.sensor_data.insert_one(
+        {
+            "_id": pending_id,
+            "input_text": "Still waiting",
+            "timestamp": now,
+            "status": "pending",
+        }
+    )
+    db.sensor_data.insert_one(
+        {
+            "_id": translated_id,
+            "input_text": "Hello",
+            "translated_text": "Hola",
+            "timestamp": now,
+            "translated_timestamp": now,
+            "status": "translated",
+        }
+    )
+
+
+async def get(port, path, timeout):
+    """Sends one GET request and returns its status code, or None on failure."""
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection("127.0.0.1", port), timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode()
+        )
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    except (OSError, IndexError, ValueError, asyncio.TimeoutError):
+        return None
+    finally:
+        writer.close()
+
+
+async def measure(port, records, connections, args):
+    """Holds 'connections' long-polls open while the probes run."""
+    pending, translated = records
+    polls = [
+        asyncio.ensure_future(
+            get(port, f"/api/sensor_data/{pending}?wait={args.hold}", args.timeout)
+        )
+        for _ in range(connections)
+    ]
+    # let the long-polls reach the server before probing
+    await asyncio.sleep(min(1.0, args.hold / 2))
+
+    async def probe():
+        started = time.perf_counter()
+        status = await get(port, f"/api/sensor_data/{translated}", args.timeout)
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    probes = await asyncio.gather(*(probe() for _ in range(args.probes)))
+    elapsed = time.perf_counter() - started
+    statuses = await asyncio.gather(*polls)
+    result = summarize(
+        [latency for status, latency in probes if status == 200], elapsed
+    )
+    result["probe_errors"] = sum(status != 200 for status, _ in probes)
+    result["long_polls_served"] = statuses.count(200)
+    result["long_polls_failed"] = len(statuses) - statuses.count(200)
+    return result
+
+
+def start_server(mode, port, records, args):
+    """Starts gunicorn with one worker process in 'mode' and waits until it answers."""
+    command = [sys.executable, "-m", "gunicorn"]
+    env = dict(
+        os.environ,
+        MONGO_URI=database_uri(args.mongo_uri or "mongodb://localhost:27017", DATABASE),
+        WEB_MODE=mode,
+        WEB_CONCURRENCY="1",
+        WEB_THREADS=str(args.threads),
+        WEB_CONNECTIONS=str(max(args.connections) + args.probes + 100),
+        PORT=str(port),
+    )
+    if not args.mongo_uri:
+        command.append(
+            "in_memory_app:create_asgi_app()"
+            if mode == "async"
+            else "in_memory_app:create_app()"
+        )
+        env.update(
+            PYTHONPATH=str(REPO_ROOT / "benchmarks"),
+            BENCH_RECORD_IDS=",".join(records),
+        )
+    server = subprocess.Popen(  # pylint: disable=consider-using-with
+        command,
+        cwd=REPO_ROOT / "web-app",
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while asyncio.run(get(port, "/", 1)) != 200:
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            raise SystemExit(f"The {mode} server did not start")
+        time.sleep(0.2)
+    return server
+
+
+def run(args):
+    """Runs every mode at every connection level and returns the report."""
+    pending, translated = ObjectId(), ObjectId()
+    if args.mongo_uri:
+        seed(open_database(args.mongo_uri, DATABASE), pending, translated)
+    elif common.mongomock is None:
+        raise SystemExit("Pass --mongo-uri or install mongomock for in-memory runs.")
+    records = (str(pending), str(translated))
+    results = {}
+    for mode in args.modes:
+        server = start_server(mode, args.port, records, args)
+        try:
+            for connections in args.connections:
+                results[f"{mode} {connections} connections"] = asyncio.run(
+                    measure(args.port, records, connections, args)
+                )
+                print(f"{mode}, {connections} connections: done", file=sys.stderr)
+        finally:
+            server.terminate()
+            server.wait()
+    return {
+        "benchmark": "concurrency",
+        "config": {
+            "database": "mongodb" if args.mongo_uri else "in-memory",
+            "modes": args.modes,
+            "connections": args.connections,
+            "hold_s": args.hold,
+            "probes": args.probes,
+            "threads": args.threads,
+        },
+        "results": results,
+    }
+
+
+def main():
+    """Parses the command line and writes the report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument(
+        "--mongo-uri", help="MongoDB to run against (default: in memory)"
+    )
+    parser.add_argument(
+        "--modes", type=lambda value: value.split(","), default=["sync", "async"]
+    )
+    parser.add_argument(
+        "--connections",
+        type=lambda value: [int(level) for level in value.split(",")],
+        default=[10, 100, 500],
+        help="comma separated numbers of concurrent long-polls",
+    )
+    parser.add_argument("--hold", type=float, default=2.0, help="long-poll seconds")
+    parser.add_argument("--probes", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=8, help="WEB_THREADS")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    # every held connection is a file descriptor, in this process and the server
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    write_report(run(args), args.output)
+
+
+if __name__ == "__main__":
+    main()
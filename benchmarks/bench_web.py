@@ -0,0 +1,129 @@
+"""
+Web app benchmark.
+
+Drives /submit_text, /api/sensor_data, /account and /home through the Flask
+test client against a seeded database and reports throughput and latency
+percentiles per route as JSON.
+
+Usage:
+    python benchmarks/bench_web.py [--mongo-uri URI] [--requests N]
+        [--seed-records N] [--output FILE]
+
+Without --mongo-uri the database is an in-memory mongomock stand-in.
+"""
+
+import os
+import sys
+import argparse
+import datetime
+import contextlib
+from common import add_service_to_path, open_database, time_calls, write_report
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/benchmark")
+add_service_to_path("web-app")
+
+import app as app_mod  # pylint: disable=wrong-import-position,wrong-import-order,import-error
+
+
+def seed(db, user_id, records):
+    """Inserts 'records' sensor_data documents, half of them translated and owned by the user."""
+    now = datetime.datetime.now()
+    documents = []
+    for i in range(records):
+        document = {
+            "input_text": f"Benchmark phrase {i}",
+            "target_language": ("es", "fr", "de")[i % 3],
+            "timestamp": now - datetime.timedelta(seconds=records - i),
+            "status": "pending",
+            "user_id": user_id if i % 2 else "someone-else",
+        }
+        if i % 2:
+            document.update(
+                translated_text=f"Frase {i}",
+                translated_timestamp=now,
+                status="translated",
+            )
+        documents.append(document)
+    if documents:
+        db.sensor_data.insert_many(documents)
+
+
+def run(args):
+    """Runs every route benchmark and returns the report."""
+    # keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        return run_benchmark(args)
+
+
+def run_benchmark(args):
+    """Runs every route benchmark and returns the report."""
+    db = open_database(args.mongo_uri, "benchmark_web")
+    app_mod.users_collection = db.users
+    app_mod.sensor_data_collection = db.sensor_data
+    app_mod.sensor_data_archive_collection = db.sensor_data_archive
+    app_mod.user_stats_collection = db.user_stats
+    app_mod.recent_translations_cache.invalidate()
+    if not args.mongo_uri:
+        # the in-memory stand-in has no change streams to follow
+        app_mod.notifier.run = lambda: None
+
+    user_id = str(
+        db.users.insert_one(
+            {"first_name": "Bench", "last_name": "Mark", "email": "bench@example.com"}
+        ).inserted_id
+    )
+    seed(db, user_id, args.seed_records)
+
+    client = app_mod.create_app({"TESTING": True}).test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["username"] = "bench@example.com"
+
+    def request(method, path, **kwargs):
+        def call(_):
+            response = getattr(client, method)(path, **kwargs)
+            response.get_data()
+            assert (
+                response.status_code == 200
+            ), f"{path} returned {response.status_code}"
+
+        return call
+
+    routes = {
+        "POST /submit_text": request(
+            "post", "/submit_text", json={"input_text": "Hello, how are you?"}
+        ),
+        "GET /api/sensor_data": request("get", "/api/sensor_data?limit=100"),
+        "GET /account": request("get", "/account"),
+        "GET /home": request("get", "/home"),
+    }
+    return {
+        "benchmark": "web",
+        "config": {
+            "database": "mongodb" if args.mongo_uri else "mongomock",
+            "requests": args.requests,
+            "seed_records": args.seed_records,
+        },
+        "results": {
+            name: time_calls(call, args.requests, warmup=args.warmup)
+            for name, call in routes.items()
+        },
+    }
+
+
+def main():
+    """Parses the command line and writes the report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument(
+        "--mongo-uri", help="MongoDB to run against (default: in memory)"
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed-records", type=int, default=2000)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    write_report(run(args), args.output)
+
+
+if __name__ == "__main__":
+    main()
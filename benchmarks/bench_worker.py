@@ -0,0 +1,186 @@
+"""
+ML client benchmark.
+
+Seeds pending sensor_data records, drains them with the worker against a
+fake translator of configurable latency, tail latency and error rate, and
+reports records per second plus the submit-to-translated latency
+percentiles as JSON. --hedge races a second fake backend against slow
+calls, as HEDGE_BACKEND does.
+
+Usage:
+    python benchmarks/bench_worker.py [--mongo-uri URI] [--records N]
+        [--latency S] [--tail-rate P] [--tail-latency S] [--error-rate P]
+        [--distinct N] [--max-in-flight N] [--batch-size N] [--hedge]
+        [--output FILE]
+
+Without --mongo-uri the database is an in-memory mongomock stand-in
+(mongomock's bulk_write does not support every pymongo version, so batch
+mode is best measured against a real MongoDB).
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import threading
+import contextlib
+from common import add_service_to_path, open_database, summarize, write_report
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/benchmark")
+add_service_to_path("machine-learning-client")
+
+# the services are imported from their own directories, after the path is set
+# pylint: disable=wrong-import-position,wrong-import-order,import-error
+import main as ml_client
+from backends import HedgedBackend
+
+# pylint: enable=wrong-import-position,wrong-import-order,import-error
+
+
+class FakeTranslation:  # pylint: disable=too-few-public-methods
+    """A translation result carrying only the text, like googletrans'."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeTranslator:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """
+    Stands in for the translation backend: a call takes 'latency' seconds,
+    or 'tail_latency' with probability 'tail_rate', and fails with
+    probability 'error_rate'.
+    """
+
+    def __init__(self, latency, error_rate, tail=(0.0, 0.0), seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.tail_rate, self.tail_latency = tail
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def translate(self, text, dest):
+        """Returns a fake translation of a text or a list of texts."""
+        with self.lock:
+            self.calls += 1
+            slow = self.random.random() < self.tail_rate
+            failed = self.random.random() < self.error_rate
+            self.errors += failed
+        time.sleep(self.tail_latency if slow else self.latency)
+        if failed:
+            raise RuntimeError("simulated backend error")
+        if isinstance(text, list):
+            return [FakeTranslation(f"[{dest}] {item}") for item in text]
+        return FakeTranslation(f"[{dest}] {text}")
+
+
+def run(args):
+    """Seeds the queue, drains it once and returns the report."""
+    # keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        return run_benchmark(args)
+
+
+def run_benchmark(args):
+    """Seeds the queue, drains it once and returns the report."""
+    db = open_database(args.mongo_uri, "benchmark_worker")
+    translator = FakeTranslator(
+        args.latency, args.error_rate, (args.tail_rate, args.tail_latency)
+    )
+    ml_client.db = db
+    ml_client.translator = translator
+    if args.hedge:
+        ml_client.translator = HedgedBackend(
+            translator,
+            FakeTranslator(args.latency, 0.0, seed=1),
+            initial_delay=args.latency * 2,
+        )
+    ml_client.translation_cache = ml_client.TranslationCache(db.translation_cache)
+    ml_client.MAX_IN_FLIGHT = args.max_in_flight
+    ml_client.TRANSLATE_BATCH_SIZE = args.batch_size
+    ml_client.ensure_indexes(db)
+
+    now = datetime.datetime.now()
+    db.sensor_data.insert_many(
+        {
+            "input_text": f"Benchmark phrase {i % args.distinct}",
+            "target_language": ("es", "fr", "de")[i % 3],
+            "timestamp": now,
+            "status": "pending",
+        }
+        for i in range(args.records)
+    )
+
+    started = time.perf_counter()
+    ml_client.drain_pending_records()
+    elapsed = time.perf_counter() - started
+
+    translated = list(
+        db.sensor_data.find(
+            {"status": "translated"}, {"timestamp": 1, "translated_timestamp": 1}
+        )
+    )
+    queue_latencies = [
+        (record["translated_timestamp"] - record["timestamp"]).total_seconds()
+        for record in translated
+    ]
+    worker = summarize(queue_latencies, elapsed)
+    worker["records_per_s"] = worker.pop("throughput_per_s")
+    worker["failed_records"] = args.records - len(translated)
+    return {
+        "benchmark": "worker",
+        "config": {
+            "database": "mongodb" if args.mongo_uri else "mongomock",
+            "records": args.records,
+            "distinct_texts": args.distinct,
+            "latency_s": args.latency,
+            "tail_rate": args.tail_rate,
+            "tail_latency_s": args.tail_latency,
+            "error_rate": args.error_rate,
+            "hedge": args.hedge,
+            "max_in_flight": args.max_in_flight,
+            "batch_size": args.batch_size,
+        },
+        "results": {
+            "worker drain": worker,
+            "backend": {
+                "calls": translator.calls,
+                "errors": translator.errors,
+                **getattr(ml_client.translator, "counters", {}),
+            },
+            "translation_cache": ml_client.translation_cache.stats(),
+        },
+    }
+
+
+def main():
+    """Parses the command line and writes the report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument(
+        "--mongo-uri", help="MongoDB to run against (default: in memory)"
+    )
+    parser.add_argument("--records", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument(
+        "--tail-rate", type=float, default=0.0, help="share of slow backend calls"
+    )
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--distinct", type=int, default=500, help="number of distinct input texts"
+    )
+    parser.add_argument("--max-in-flight", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument(
+        "--hedge", action="store_true", help="race a second backend against slow calls"
+    )
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    write_report(run(args), args.output)
+
+
+if __name__ == "__main__":
+    main()
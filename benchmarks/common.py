@@ -0,0 +1,80 @@
+"""
+Shared helpers for the benchmark scripts: timing, latency percentiles,
+database selection and JSON reports.
+"""
+
+import sys
+import json
+import time
+import datetime
+from pathlib import Path
+
+try:
+    import mongomock
+except ImportError:  # only needed for the in-memory mode
+    mongomock = None
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def add_service_to_path(service_dir):
+    """Makes a service's modules importable, e.g. add_service_to_path("web-app")."""
+    sys.path.insert(0, str(REPO_ROOT / service_dir))
+
+
+def open_database(mongo_uri, name):
+    """
+    Returns a fresh, empty database: on the MongoDB at 'mongo_uri', or in
+    memory through mongomock when no URI is given.
+    """
+    if mongo_uri:
+        from pymongo import MongoClient  # pylint: disable=import-outside-toplevel
+
+        client = MongoClient(mongo_uri)
+    elif mongomock is not None:
+        client = mongomock.MongoClient()
+    else:
+        raise SystemExit("Pass --mongo-uri or install mongomock for in-memory runs.")
+    client.drop_database(name)
+    return client[name]
+
+
+def summarize(latencies, elapsed):
+    """Returns count, throughput and p50/p95/p99 latency (ms) for timed calls."""
+    ordered = sorted(latencies)
+
+    def percentile(rank):
+        index = min(len(ordered) - 1, round(rank / 100 * (len(ordered) - 1)))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "throughput_per_s": round(len(ordered) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else None,
+        "p50_ms": percentile(50) if ordered else None,
+        "p95_ms": percentile(95) if ordered else None,
+        "p99_ms": percentile(99) if ordered else None,
+    }
+
+
+def time_calls(call, count, warmup=0):
+    """Calls 'call(i)' count times after 'warmup' untimed calls and summarizes them."""
+    for i in range(warmup):
+        call(i)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        call_started = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def write_report(report, output=None):
+    """Writes a benchmark report as JSON to 'output', or to stdout."""
+    report.setdefault("generated_at", datetime.datetime.now().isoformat())
+    text = json.dumps(report, indent=2, default=str)
+    if output:
+        Path(output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
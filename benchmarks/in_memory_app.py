@@ -0,0 +1,91 @@
+"""
+The web app on an in-memory database, for bench_concurrency.py runs
+without MongoDB.
+
+gunicorn serves "in_memory_app:create_app()" or
+"in_memory_app:create_asgi_app()" from here instead of the web-app
+modules' own factories. Both tiers share one mongomock database seeded by
+bench_concurrency.seed() with the record ids in BENCH_RECORD_IDS.
+mongomock is synchronous, so the async tier awaits its calls on the event
+loop: each takes microseconds without a network round trip, which also
+means the async numbers leave out the latency of a real MongoDB.
+"""
+
+import os
+from bson import ObjectId
+from common import add_service_to_path, open_database
+from bench_concurrency import DATABASE, seed
+
+add_service_to_path("web-app")
+
+# pylint: disable=wrong-import-position,wrong-import-order,import-error
+import app as app_mod
+import async_app
+
+
+class AsyncCursor:
+    """A mongomock cursor iterated with 'async for', like pymongo's AsyncCursor."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, keys):
+        """Sort by a list of (key, direction) pairs."""
+        return AsyncCursor(self.cursor.sort(keys))
+
+    def limit(self, count):
+        """Return at most 'count' documents."""
+        return AsyncCursor(self.cursor.limit(count))
+
+    async def __aiter__(self):
+        for document in self.cursor:
+            yield document
+
+
+class AsyncCollection:
+    """Awaitable operations on a mongomock collection, like pymongo's AsyncCollection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, query, projection=None, sort=None):
+        """Return the first document matching the given query."""
+        return self.collection.find_one(query, projection, sort=sort)
+
+    def find(self, query, projection=None):
+        """Return a cursor over the documents matching the given query."""
+        return AsyncCursor(self.collection.find(query, projection))
+
+    async def insert_one(self, document):
+        """Insert a document."""
+        return self.collection.insert_one(document)
+
+    async def update_one(self, query, update, upsert=False):
+        """Update the first matching document."""
+        return self.collection.update_one(query, update, upsert=upsert)
+
+
+def use_in_memory_database():
+    """Points both tiers' collections at a seeded mongomock database."""
+    db = open_database(None, DATABASE)
+    seed(db, *(ObjectId(value) for value in os.environ["BENCH_RECORD_IDS"].split(",")))
+    app_mod.users_collection = db.users
+    app_mod.sensor_data_collection = db.sensor_data
+    app_mod.sensor_data_archive_collection = db.sensor_data_archive
+    app_mod.user_stats_collection = db.user_stats
+    async_app.sensor_data_collection = AsyncCollection(db.sensor_data)
+    async_app.user_stats_collection = AsyncCollection(db.user_stats)
+    # the in-memory stand-in has no change streams to follow
+    app_mod.notifier.run = lambda: None
+
+
+def create_app():
+    """The Flask app of WEB_MODE=sync on the in-memory database."""
+    use_in_memory_database()
+    return app_mod.create_app()
+
+
+def create_asgi_app():
+    """The async tier of WEB_MODE=async on the in-memory database."""
+    use_in_memory_database()
+    return async_app.create_asgi_app()
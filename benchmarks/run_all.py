@@ -0,0 +1,81 @@
+"""
+Runs the web app and ML client benchmarks and merges their reports.
+
+Each benchmark runs in its own process because both services ship modules
+with the same names. With --compare, throughput and p95 latency are
+checked against an earlier report and the exit status is 1 if any metric
+regressed by more than --tolerance.
+
+Usage:
+    python benchmarks/run_all.py [--mongo-uri URI] [--output FILE]
+        [--compare BASELINE.json] [--tolerance 0.2]
+"""
+
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+from common import write_report
+
+BENCHMARKS = {"web": "bench_web.py", "worker": "bench_worker.py"}
+# metric -> True if higher is better
+COMPARED_METRICS = {"throughput_per_s": True, "records_per_s": True, "p95_ms": False}
+
+
+def run_benchmark(script, mongo_uri):
+    """Runs one benchmark script and returns its parsed report."""
+    command = [sys.executable, str(Path(__file__).with_name(script))]
+    if mongo_uri:
+        command += ["--mongo-uri", mongo_uri]
+    output = subprocess.run(command, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout)
+
+
+def regressions(report, baseline, tolerance):
+    """Lists every compared metric that got worse than the baseline by more than 'tolerance'."""
+    found = []
+    for name, benchmark in report["benchmarks"].items():
+        baseline_results = (
+            baseline.get("benchmarks", {}).get(name, {}).get("results", {})
+        )
+        for target, metrics in benchmark["results"].items():
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                old = baseline_results.get(target, {}).get(metric)
+                new = metrics.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                if (-change if higher_is_better else change) > tolerance:
+                    found.append(f"{name} / {target} / {metric}: {old} -> {new}")
+    return found
+
+
+def main():
+    """Runs the benchmarks, writes the merged report and compares it."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument(
+        "--mongo-uri", help="MongoDB to run against (default: in memory)"
+    )
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = {
+        "benchmarks": {
+            name: run_benchmark(script, args.mongo_uri)
+            for name, script in BENCHMARKS.items()
+        }
+    }
+    write_report(report, args.output)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        found = regressions(report, baseline, args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Translation backends for the ML client.
+
+A backend has the interface of googletrans' Translator that the worker
+relies on: translate(text, dest) returns a result with a 'text' attribute,
+or a list of them when given a list of texts. load_backend() builds one by
+name or from a "module:Class" path, and HedgedBackend races a second
+backend against a slow first one. RateLimiter spaces out the calls made
+to a backend.
+"""
+
+import json
+import time
+import importlib
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from googletrans import Translator
+from translation_cache import normalize_text
+
+Translation = namedtuple("Translation", ["text"])
+
+
+class DictionaryBackend:  # pylint: disable=too-few-public-methods
+    """
+    An offline backend answering from known translations,
+    {target_language: {text: translation}}, given directly or loaded from a
+    JSON file. Unknown texts get the deterministic stand-in "[dest] text",
+    so tests and benchmarks run without network access.
+    """
+
+    def __init__(self, entries=None, path=None):
+        """Initialize the backend from 'entries' or the JSON file at 'path'."""
+        if path:
+            with open(path, encoding="utf-8") as file:
+                entries = json.load(file)
+        self.entries = {
+            language: {
+                normalize_text(text): translated
+                for text, translated in translations.items()
+            }
+            for language, translations in (entries or {}).items()
+        }
+
+    def translate(self, text, dest="es"):
+        """Returns the translation of a text or a list of texts."""
+        if isinstance(text, list):
+            return [self.translate(item, dest) for item in text]
+        known = self.entries.get(dest, {}).get(normalize_text(text))
+        return Translation(known if known is not None else f"[{dest}] {text}")
+
+
+class HedgedBackend:  # pylint: disable=too-many-instance-attributes
+    """
+    Sends every request to 'primary' and, when it has not answered within
+    the 'percentile' of its recent latencies, a duplicate to 'secondary';
+    the first successful answer wins. A primary that fails fast is also
+    answered by the secondary. Until 'min_samples' latencies have been seen
+    the hedge fires after 'initial_delay' seconds.
+
+    Each backend is called on a thread pool of its own, of 'max_workers'
+    threads, so hedges never queue behind the slow primary calls they are
+    meant to overtake.
+    """
+
+    # how many of the primary's latest latencies the percentile is taken over
+    LATENCY_WINDOW = 200
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        primary,
+        secondary,
+        percentile=95,
+        min_samples=20,
+        initial_delay=1.0,
+        max_workers=None,
+    ):
+        """Initialize the hedge over two backends."""
+        self.primary = primary
+        self.secondary = secondary
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self.lock = threading.Lock()
+        self.primary_executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="hedged-primary"
+        )
+        self.secondary_executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="hedged-secondary"
+        )
+        self.counters = {"requests": 0, "hedged": 0, "secondary_wins": 0}
+
+    def hedge_delay(self):
+        """Returns how long to wait for the primary before hedging."""
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return self.initial_delay
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+
+    def call_primary(self, text, dest):
+        """Calls the primary backend and records how long it took."""
+        started = time.perf_counter()
+        try:
+            return self.primary.translate(text, dest=dest)
+        finally:
+            with self.lock:
+                self.latencies.append(time.perf_counter() - started)
+
+    def count(self, counter):
+        """Increments one of the hedge counters."""
+        with self.lock:
+            self.counters[counter] += 1
+
+    def translate(self, text, dest="es"):
+        """Returns the first successful translation of either backend."""
+        self.count("requests")
+        primary = self.primary_executor.submit(self.call_primary, text, dest)
+        wait([primary], timeout=self.hedge_delay())
+        if primary.done() and primary.exception() is None:
+            return primary.result()
+        self.count("hedged")
+        secondary = self.secondary_executor.submit(
+            self.secondary.translate, text, dest=dest
+        )
+        pending = {primary, secondary}
+        errors = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary:
+                        self.count("secondary_wins")
+                    return future.result()
+                errors.append(future.exception())
+        raise errors[0]
+
+
+def load_backend(spec, dictionary_path=None):
+    """
+    Builds a backend from its name, "google" or "dictionary", or from a
+    "module:Class" path to any class with a compatible translate().
+    """
+    if spec == "google":
+        return Translator()
+    if spec == "dictionary":
+        return DictionaryBackend(path=dictionary_path)
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown translation backend '{spec}'")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class RateLimiter:  # pylint: disable=too-few-public-methods
+    """Spaces out calls so that at most 'rate' of them start per second."""
+
+    def __init__(self, rate):
+        """A rate of zero or less disables the limit."""
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until the caller may make its next call."""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        time.sleep(slot - now)
@@ -0,0 +1,71 @@
+"""
+Splitting of long texts for the ML client.
+
+Long dictations are translated in chunks so they can be sent to the backend
+concurrently and retried piecewise. Chunks follow sentence boundaries where
+possible and never exceed a size limit, and the split is deterministic, so
+a retry produces the same chunks as the attempt it continues.
+"""
+
+import re
+
+# a sentence ends at terminal punctuation, optionally closed by a quote or
+# bracket, that is followed by whitespace
+SENTENCE_END = re.compile(r"[.!?。！？…][\"'”’)\]]*(?=\s)")
+
+
+def split_sentences(text):
+    """Splits a text into sentences, dropping the whitespace between them."""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        sentences.append(text[start : match.end()].strip())
+        start = match.end()
+    sentences.append(text[start:].strip())
+    return [sentence for sentence in sentences if sentence]
+
+
+def split_long_sentence(sentence, max_chars):
+    """Splits a sentence longer than 'max_chars' on whitespace, or hard if needed."""
+    pieces = []
+    current = ""
+    for word in sentence.split():
+        while len(word) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(word[:max_chars])
+            word = word[max_chars:]
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_text(text, max_chars):
+    """
+    Packs the sentences of a text into chunks of at most 'max_chars'
+    characters, in order. Joining the translated chunks with a space
+    reassembles the translation.
+    """
+    chunks = []
+    current = ""
+    for sentence in split_sentences(text):
+        pieces = (
+            split_long_sentence(sentence, max_chars)
+            if len(sentence) > max_chars
+            else [sentence]
+        )
+        for piece in pieces:
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
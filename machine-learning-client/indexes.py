@@ -0,0 +1,177 @@
+"""
+Index management for the ML client.
+
+Declares the pending-work query together with the partial index that
+serves it, creates the worker's indexes idempotently at startup and checks
+with explain() that none of the canonical queries falls back to a
+collection scan.
+
+Usage:
+    python indexes.py          create any missing indexes
+    python indexes.py --check  exit 1 if a canonical query plans a COLLSCAN
+"""
+
+import os
+import sys
+import datetime
+from dotenv import load_dotenv
+from pymongo import ASCENDING, IndexModel, MongoClient
+from pymongo.errors import PyMongoError
+from retention import RETENTION_DAYS, RETENTION_MODE
+
+# records waiting for a worker; the web app inserts them with status "pending"
+PENDING_QUERY = {"status": "pending", "lease_owner": {"$exists": False}}
+# oldest first
+PENDING_SORT = [("timestamp", ASCENDING)]
+# the scheduler walks pending records by priority band, then user, oldest first
+FAIR_SCHEDULE_KEYS = [
+    ("priority", ASCENDING),
+    ("user_id", ASCENDING),
+    ("timestamp", ASCENDING),
+]
+
+TRANSLATION_CACHE_TTL_DAYS = int(os.getenv("TRANSLATION_CACHE_TTL_DAYS", "30"))
+
+INDEXES = {
+    "sensor_data": [
+        # only untranslated records are indexed, so it stays small as history grows
+        IndexModel(
+            PENDING_SORT,
+            name="pending_timestamp",
+            partialFilterExpression={"status": "pending"},
+        ),
+        IndexModel(
+            FAIR_SCHEDULE_KEYS,
+            name="pending_priority_user_timestamp",
+            partialFilterExpression={"status": "pending"},
+        ),
+        # finds records past retention; in "expire" mode MongoDB deletes them
+        IndexModel(
+            [("translated_timestamp", ASCENDING)],
+            name="translated_timestamp",
+            **(
+                {"expireAfterSeconds": RETENTION_DAYS * 24 * 3600}
+                if RETENTION_MODE == "expire" and RETENTION_DAYS
+                else {}
+            ),
+        ),
+        IndexModel(
+            [("lease_expires_at", ASCENDING)],
+            name="lease_expires_at",
+            partialFilterExpression={"lease_expires_at": {"$exists": True}},
+        ),
+    ],
+    "translation_cache": [
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=TRANSLATION_CACHE_TTL_DAYS * 24 * 3600,
+        ),
+    ],
+}
+
+
+def pending_query(now=None):
+    """
+    Returns the query for records a worker may claim now: pending, unclaimed
+    and not backing off after a failed attempt ('next_attempt_at' is unset
+    or in the past).
+    """
+    return dict(
+        PENDING_QUERY,
+        next_attempt_at={"$not": {"$gt": now or datetime.datetime.now()}},
+    )
+
+
+def canonical_queries():
+    """Returns (description, collection, filter, sort) for every hot worker query."""
+    return [
+        ("oldest pending record", "sensor_data", pending_query(), PENDING_SORT),
+        (
+            "most urgent pending priority",
+            "sensor_data",
+            pending_query(),
+            [("priority", ASCENDING)],
+        ),
+        (
+            "head of every user's pending queue",
+            "sensor_data",
+            dict(pending_query(), priority=0),
+            FAIR_SCHEDULE_KEYS,
+        ),
+        (
+            "oldest pending records of a priority band",
+            "sensor_data",
+            dict(pending_query(), priority=0),
+            PENDING_SORT,
+        ),
+        (
+            "records past retention",
+            "sensor_data",
+            {
+                "status": "translated",
+                "translated_timestamp": {"$lt": datetime.datetime.now()},
+            },
+            [("translated_timestamp", ASCENDING)],
+        ),
+        (
+            "reap expired leases",
+            "sensor_data",
+            {
+                "status": "pending",
+                "lease_expires_at": {"$lt": datetime.datetime.now()},
+            },
+            None,
+        ),
+    ]
+
+
+def ensure_indexes(db):
+    """
+    Creates every declared index that does not exist yet. Safe to run on
+    every startup; failures are reported and do not stop the caller.
+    """
+    for collection_name, indexes in INDEXES.items():
+        try:
+            created = db[collection_name].create_indexes(indexes)
+            print(f"Indexes on {collection_name}: {', '.join(created)}")
+        except PyMongoError as e:
+            print(f"Could not create indexes on {collection_name}: {e}")
+
+
+def plan_stages(plan):
+    """Yields the name of every stage in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+
+def check_indexes(db, queries=None):
+    """
+    Runs explain() on each canonical query and returns the descriptions of
+    the ones whose winning plan contains a COLLSCAN.
+    """
+    collection_scans = []
+    for description, collection_name, query, sort in queries or canonical_queries():
+        cursor = db[collection_name].find(query).limit(10)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = set(plan_stages(winning_plan))
+        print(f"{description}: {', '.join(sorted(stages))}")
+        if "COLLSCAN" in stages:
+            collection_scans.append(description)
+    return collection_scans
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    database = MongoClient(os.getenv("MONGO_URI")).get_default_database()
+    if "--check" in sys.argv[1:]:
+        sys.exit(1 if check_indexes(database) else 0)
+    ensure_indexes(database)
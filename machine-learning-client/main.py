@@ -2,72 +2,988 @@
 Machine Learning Client for MongoDB Integration.
 
 This script connects to a MongoDB database using the connection string.
+main() runs WORKER_PROCESSES worker processes, each opening its own
+connections with connect() after it has been forked.
 """
 
 import os
 import time
+import uuid
+import random
+import socket
 import datetime
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from googletrans import Translator
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import (
+    BulkWriteError,
+    OperationFailure,
+    PyMongoError,
+    WriteConcernError,
+    WriteError,
+)
+from backends import HedgedBackend, RateLimiter, load_backend
+from translation_cache import TranslationCache
+from chunking import split_text
+from retention import run_retention
+from stats import failure_stats_update, translation_stats_update
+from worker_state import (
+    backfill_pending_status,
+    clear_resume_token,
+    load_resume_token,
+    save_resume_token,
+)
+from indexes import FAIR_SCHEDULE_KEYS, PENDING_SORT, ensure_indexes, pending_query
+from metrics import CommandTimer, Counter, Gauge, Histogram, start_http_server
 
 load_dotenv()
-mongo_uri = os.getenv("MONGO_URI")
-if not mongo_uri:
-    raise ValueError("MONGO_URI not set in .env")
 
-client = MongoClient(mongo_uri)
-db = client.get_default_database()
+# MongoClient options set in the environment, {setting: (option, type)}; unset
+# ones keep the value given in MONGO_URI or the driver's default
+MONGO_CLIENT_SETTINGS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", int),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", int),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", int),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", int),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", int),
+    "MONGO_READ_PREFERENCE": ("readPreference", str),
+}
+MONGO_CLIENT_OPTIONS = {
+    option: kind(os.getenv(setting))
+    for setting, (option, kind) in MONGO_CLIENT_SETTINGS.items()
+    if os.getenv(setting)
+}
 
-translator = Translator()
+# worker processes run by main(), each with its own connections
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
 
+# set by connect() in the process that uses them
+# pylint: disable=invalid-name
+client = None
+db = None
+translation_cache = None
+# pylint: enable=invalid-name
 
-def process_untranslated_records():
+# "google", "dictionary" (offline) or a "module:Class" path; HEDGE_BACKEND
+# races a second backend against requests slower than HEDGE_PERCENTILE
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")
+HEDGE_BACKEND = os.getenv("HEDGE_BACKEND", "")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+DICTIONARY_PATH = os.getenv("DICTIONARY_PATH") or None
+
+
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "10000"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "3600"))
+
+
+def connect(mongo_uri=None):
+    """
+    Creates this process's MongoClient and binds the module's db and
+    translation cache to it. The client connects on its first operation, so
+    call this in the process that will use it, after any fork.
     """
-    Fetches all records from the 'sensor_data' collection that have input text
-    but have not yet been translated. For each such record, it performs
-    language translation using the Google Translate API and updates the record
-    in the database with the translated text and a timestamp.
+    global client, db, translation_cache  # pylint: disable=global-statement
+    mongo_uri = mongo_uri or os.getenv("MONGO_URI")
+    if not mongo_uri:
+        raise ValueError("MONGO_URI not set in .env")
+    client = MongoClient(
+        mongo_uri,
+        connect=False,
+        event_listeners=[CommandTimer()],
+        **MONGO_CLIENT_OPTIONS,
+    )
+    db = client.get_default_database()
+    translation_cache = TranslationCache(
+        db.translation_cache, max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL
+    )
+    return db
 
-    The function logs the number of records processed and any translation errors encountered.
+
+# texts longer than CHUNK_MAX_CHARS are split on sentence boundaries and
+# their chunks translated CHUNK_CONCURRENCY at a time
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1000"))
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", "4"))
+# target languages of one record translated at once
+TARGET_CONCURRENCY = int(os.getenv("TARGET_CONCURRENCY", "6"))
+# how many translations may be in flight at once, 1 keeps the serial loop
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "1"))
+
+translator = load_backend(TRANSLATION_BACKEND, DICTIONARY_PATH)
+if HEDGE_BACKEND:
+    translator = HedgedBackend(
+        translator,
+        load_backend(HEDGE_BACKEND, DICTIONARY_PATH),
+        percentile=HEDGE_PERCENTILE,
+        # the most backend calls this worker makes at once
+        max_workers=MAX_IN_FLIGHT * TARGET_CONCURRENCY * CHUNK_CONCURRENCY,
+    )
+
+# port of the /metrics endpoint, 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "5001"))
+
+TRANSLATION_SECONDS = Histogram(
+    "translation_backend_duration_seconds",
+    "Duration of calls to the translation backend.",
+    ["target_language", "mode"],
+)
+TRANSLATION_ERRORS = Counter(
+    "translation_errors_total",
+    "Records whose translation failed.",
+    ["target_language"],
+)
+DEAD_LETTERS = Counter(
+    "translation_dead_letters_total",
+    "Records given up on after MAX_ATTEMPTS failed translations.",
+    ["target_language"],
+)
+
+
+def pending_queue_metrics():
+    """Returns the number of pending records and the age of the oldest one."""
+    depth = db.sensor_data.count_documents({"status": "pending"})
+    oldest = db.sensor_data.find_one(
+        {"status": "pending"}, {"timestamp": 1}, sort=PENDING_SORT
+    )
+    age = (
+        (datetime.datetime.now() - oldest["timestamp"]).total_seconds()
+        if oldest and oldest.get("timestamp")
+        else 0
+    )
+    return depth, age
+
+
+Gauge(
+    "translation_queue_depth",
+    "Records waiting for translation.",
+    function=lambda: pending_queue_metrics()[0],
+)
+Gauge(
+    "translation_queue_oldest_age_seconds",
+    "Age of the oldest record waiting for translation.",
+    function=lambda: pending_queue_metrics()[1],
+)
+Counter(
+    "translation_cache_lookups_total",
+    "Translation cache lookups by result.",
+    ["result"],
+    function=lambda: {
+        (result,): translation_cache.stats()[result]
+        for result in ("memory_hits", "persistent_hits", "misses")
+    },
+)
+Counter(
+    "translation_hedges_total",
+    "Hedged backend requests, hedges sent and hedges that answered first.",
+    ["result"],
+    function=lambda: {
+        (result,): count
+        for result, count in getattr(translator, "counters", {}).items()
+    },
+)
+Gauge(
+    "translation_cache_hit_rate",
+    "Share of translation cache lookups answered by either tier.",
+    function=lambda: translation_cache.stats()["hit_rate"],
+)
+
+# records sent to the backend per call in batch mode, 1 disables batching
+TRANSLATE_BATCH_SIZE = int(os.getenv("TRANSLATE_BATCH_SIZE", "1"))
+# backend calls per second across all threads of this worker, 0 disables
+rate_limiter = RateLimiter(float(os.getenv("TRANSLATE_RATE_LIMIT", "0")))
+
+# "watch" follows a change stream on sensor_data, "poll" re-queries on a timer
+WORKER_MODE = os.getenv("ML_CLIENT_MODE", "watch")
+POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "5"))
+
+# the resume token fell off the oplog or can no longer be used
+CHANGE_STREAM_LOST_CODES = (280, 286)
+# the server cannot open change streams at all: not a replica set, or
+# majority read concern disabled
+CHANGE_STREAM_UNSUPPORTED_CODES = (40573, 148)
+
+# identifies this replica in the lease fields of the records it claims
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEASE_SECONDS = float(os.getenv("LEASE_SECONDS", "120"))
+CLAIM_BATCH_SIZE = int(os.getenv("CLAIM_BATCH_SIZE", "20"))
+REAP_INTERVAL = float(os.getenv("REAP_INTERVAL", "30"))
+
+# seconds between retention passes (rollups, archiving), 0 disables them
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))
+
+LEASE_FIELDS = {"lease_owner": "", "lease_token": "", "lease_expires_at": ""}
+
+# failed translations are retried after RETRY_BASE_DELAY * 2^(attempt - 1)
+# seconds (capped at RETRY_MAX_DELAY, with jitter) until MAX_ATTEMPTS have
+# failed, after which the record is dead-lettered with status "failed"
+MAX_ATTEMPTS = int(os.getenv("MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "10"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "3600"))
+
+
+# the user served last, so the next claim continues the round-robin after it
+schedule_state = {"last_user": None}
+
+
+def schedule_pending_records(limit):
+    """
+    Returns the ids of up to 'limit' claimable records in the order they
+    should be translated.
+
+    Only the most urgent priority band present is served (the web app gives
+    interactive submissions priority 0, bulk ones 1 and simulated ones 2).
+    Within it, users take turns: each user's oldest record gets a slot,
+    starting after the user served last, and only the slots left over go
+    to the band's oldest other records, so a user with a long backlog only
+    fills the slots nobody else needs.
+
+    Three queries, whatever the backlog: the band, one aggregation walking
+    the pending_priority_user_timestamp index for the head of every user's
+    queue, and the oldest records for the leftover slots.
+    """
+    query = pending_query()
+    top = db.sensor_data.find_one(query, {"priority": 1}, sort=[("priority", 1)])
+    if top is None:
+        return []
+    band = dict(query, priority=top.get("priority"))
+    heads = sorted(
+        (
+            (head["_id"], head["record_id"])
+            for head in db.sensor_data.aggregate(
+                [
+                    {"$match": band},
+                    {"$sort": dict(FAIR_SCHEDULE_KEYS)},
+                    {"$group": {"_id": "$user_id", "record_id": {"$first": "$_id"}}},
+                ]
+            )
+        ),
+        key=lambda head: str(head[0]),
+    )
+    start = next(
+        (
+            position
+            for position, (user, _) in enumerate(heads)
+            if str(user) > str(schedule_state["last_user"])
+        ),
+        0,
+    )
+    heads = (heads[start:] + heads[:start])[:limit]
+    if heads:
+        schedule_state["last_user"] = heads[-1][0]
+    scheduled = [record_id for _, record_id in heads]
+    if len(scheduled) < limit:
+        scheduled += [
+            doc["_id"]
+            for doc in db.sensor_data.find(
+                dict(band, _id={"$nin": scheduled}), {"_id": 1}
+            )
+            .sort(PENDING_SORT)
+            .limit(limit - len(scheduled))
+        ]
+    return scheduled
+
+
+def claim_records(limit=CLAIM_BATCH_SIZE):
+    """
+    Atomically claims up to 'limit' pending records for this worker, in the
+    order chosen by schedule_pending_records().
+
+    Each claimed record is marked with the worker id, a per-claim token and a
+    lease expiry. The update re-checks that the record is still unclaimed, so
+    two workers racing for the same record can never both win it. Returns
+    the claimed records.
+    """
+    candidates = schedule_pending_records(limit)
+    if not candidates:
+        return []
+    lease_token = uuid.uuid4().hex
+    now = datetime.datetime.now()
+    db.sensor_data.update_many(
+        dict(pending_query(), _id={"$in": candidates}),
+        {
+            "$set": {
+                "lease_owner": WORKER_ID,
+                "lease_token": lease_token,
+                "lease_expires_at": now + datetime.timedelta(seconds=LEASE_SECONDS),
+                "updated_at": now,
+            }
+        },
+    )
+    position = {record_id: index for index, record_id in enumerate(candidates)}
+    return sorted(
+        db.sensor_data.find({"lease_token": lease_token}),
+        key=lambda record: position[record["_id"]],
+    )
+
+
+def reap_expired_leases():
+    """
+    Returns records whose lease expired before they were translated to the
+    pending queue, e.g. because the worker holding them died. Returns the
+    number of records released.
+    """
+    now = datetime.datetime.now()
+    result = db.sensor_data.update_many(
+        {"status": "pending", "lease_expires_at": {"$lt": now}},
+        {"$set": {"updated_at": now}, "$unset": LEASE_FIELDS},
+    )
+    if result.modified_count:
+        print(f"Released {result.modified_count} expired leases.")
+    return result.modified_count
+
+
+def leased(record):
+    """
+    Returns the filter of a write to a claimed record, which only matches
+    while this worker still holds the record's lease.
+    """
+    return {"_id": record["_id"], "lease_token": record.get("lease_token")}
+
+
+def retry_delay(attempts):
+    """
+    Returns how many seconds to wait before the next attempt after
+    'attempts' failures: exponential, capped, with jitter so records that
+    failed together do not all come back at once.
+    """
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def record_failure(record, error):
+    """
+    Records a failed translation attempt on a claimed record and releases
+    its lease. The record is scheduled for another attempt with backoff, or
+    dead-lettered with status "failed" once MAX_ATTEMPTS attempts failed;
+    like store_translation(), a dead letter only counts once its write
+    matched the record, so a lost lease does not count it twice.
+    """
+    attempts = record.get("attempts", 0) + 1
+    target_language = record.get("target_language", "es")
+    now = datetime.datetime.now()
+    TRANSLATION_ERRORS.inc(target_language=target_language)
+    if attempts >= MAX_ATTEMPTS:
+        print(f"Record {record['_id']} failed {attempts} times, dead-lettered: {error}")
+        update = {
+            "$set": {"status": "failed", "failed_at": now},
+            "$unset": dict(LEASE_FIELDS, next_attempt_at=""),
+        }
+    else:
+        delay = retry_delay(attempts)
+        print(
+            f"Error translating record {record['_id']} (attempt {attempts}),"
+            f" retrying in {delay:.0f}s: {error}"
+        )
+        update = {
+            "$set": {"next_attempt_at": now + datetime.timedelta(seconds=delay)},
+            "$unset": LEASE_FIELDS,
+        }
+    update["$set"].update(
+        attempts=attempts, last_error=str(error)[:500], updated_at=now
+    )
+    try:
+        result = db.sensor_data.update_one(leased(record), update)
+    except PyMongoError as e:
+        # the lease expires and the reaper returns the record to the queue
+        print(f"Could not record the failure of record {record['_id']}: {e}")
+        return
+    if attempts >= MAX_ATTEMPTS and result.modified_count:
+        DEAD_LETTERS.inc(target_language=target_language)
+        record_user_stats([(record, failure_stats_update(now))])
+
+
+def record_user_stats(updates):
+    """
+    Applies (record, update) pairs to the 'user_stats' document of each
+    record's user, skipping records without one. Statistics are best effort:
+    a failed write is logged and 'python stats.py' repairs the drift.
+    """
+    operations = [
+        UpdateOne({"_id": record["user_id"]}, update, upsert=True)
+        for record, update in updates
+        if record.get("user_id")
+    ]
+    if not operations:
+        return
+    try:
+        db.user_stats.bulk_write(operations, ordered=False)
+    except PyMongoError as e:
+        print(f"Could not update the statistics of {len(operations)} records: {e}")
+
+
+def work_pending():
+    """
+    Returns True if any record can be claimed now, including failed ones
+    whose retry backoff elapsed.
+    """
+    return db.sensor_data.find_one(pending_query(), {"_id": 1}) is not None
+
+
+def translate_text(text, target_language, mode="single"):
+    """
+    Returns the translation of a text, from the translation cache when
+    possible and from the translation backend otherwise.
+    """
+    translated_text = translation_cache.get(text, target_language)
+    if translated_text is None:
+        rate_limiter.acquire()
+        with TRANSLATION_SECONDS.time(target_language=target_language, mode=mode):
+            translated_text = translator.translate(text, dest=target_language).text
+        translation_cache.put(text, target_language, translated_text)
+    return translated_text
+
+
+def target_languages(record):
+    """
+    Returns the languages a record is translated into: its
+    'target_languages' when it has several, else its 'target_language'.
+    """
+    return record.get("target_languages") or [record.get("target_language", "es")]
+
+
+def request_translations(record):
+    """
+    Returns {target language: translation} of a record's input text.
+
+    A record with several target languages has them translated
+    TARGET_CONCURRENCY at a time, and each translation is saved on the
+    claimed record under 'translations' as soon as it arrives, so readers
+    see per-language progress and a retry only translates the missing
+    languages.
+    """
+    languages = target_languages(record)
+    if len(record["input_text"]) > CHUNK_MAX_CHARS and (
+        record.get("chunk_size") != CHUNK_MAX_CHARS
+    ):
+        # saved chunks are only reused with the chunk size they were split with
+        record = dict(record, chunk_size=CHUNK_MAX_CHARS, translated_chunks={})
+        db.sensor_data.update_one(
+            leased(record),
+            {
+                "$set": {
+                    "chunk_size": CHUNK_MAX_CHARS,
+                    "translated_chunks": {},
+                    "updated_at": datetime.datetime.now(),
+                }
+            },
+        )
+    if len(languages) == 1:
+        return {languages[0]: request_translation(record, languages[0])}
+    saved = record.get("translations", {})
+
+    def translate_target(target_language):
+        translated_text = request_translation(record, target_language)
+        db.sensor_data.update_one(
+            leased(record),
+            {
+                "$set": {
+                    f"translations.{target_language}": translated_text,
+                    "updated_at": datetime.datetime.now(),
+                }
+            },
+        )
+        return translated_text
+
+    missing = [language for language in languages if language not in saved]
+    if missing:
+        # every language is attempted even if one fails, so its progress is saved
+        with ThreadPoolExecutor(
+            max_workers=min(TARGET_CONCURRENCY, len(missing))
+        ) as executor:
+            futures = {
+                language: executor.submit(translate_target, language)
+                for language in missing
+            }
+        translated = {language: future.result() for language, future in futures.items()}
+    else:
+        translated = {}
+    return {
+        language: translated[language] if language in translated else saved[language]
+        for language in languages
+    }
+
+
+def request_translation(record, target_language):
+    """
+    Returns the translation of a record's input text into one language.
+    Texts longer than CHUNK_MAX_CHARS are translated in chunks.
+    """
+    if len(record["input_text"]) > CHUNK_MAX_CHARS:
+        return translate_in_chunks(record, target_language)
+    return translate_text(record["input_text"], target_language)
+
+
+def translate_in_chunks(record, target_language):
+    """
+    Translates a long text as chunks of at most CHUNK_MAX_CHARS characters,
+    CHUNK_CONCURRENCY at a time, and joins the translations in order.
+
+    Every translated chunk is saved on the claimed record under
+    'translated_chunks.<target language>' as soon as it arrives, so if some
+    chunks fail the next attempt only translates the missing ones.
     """
-    pending_records = list(
-        db.sensor_data.find(
-            {"input_text": {"$exists": True}, "translated_text": {"$exists": False}}
+    chunks = split_text(record["input_text"], CHUNK_MAX_CHARS)
+    saved = record.get("translated_chunks", {}).get(target_language, {})
+
+    def translate_chunk(index):
+        translated_chunk = translate_text(chunks[index], target_language, mode="chunk")
+        db.sensor_data.update_one(
+            leased(record),
+            {
+                "$set": {
+                    f"translated_chunks.{target_language}.{index}": translated_chunk,
+                    "updated_at": datetime.datetime.now(),
+                }
+            },
+        )
+        return translated_chunk
+
+    missing = [index for index in range(len(chunks)) if str(index) not in saved]
+    if missing:
+        print(
+            f"Translating record {record['_id']} in {len(chunks)} chunks"
+            f" ({len(missing)} remaining)"
         )
+        # every chunk is attempted even if one fails, so its progress is saved
+        with ThreadPoolExecutor(
+            max_workers=min(CHUNK_CONCURRENCY, len(missing))
+        ) as executor:
+            futures = {
+                index: executor.submit(translate_chunk, index) for index in missing
+            }
+        translated = {index: future.result() for index, future in futures.items()}
+    else:
+        translated = {}
+    return " ".join(
+        translated[index] if index in translated else saved[str(index)]
+        for index in range(len(chunks))
     )
 
-    if pending_records:
+
+def translation_update(record, translations, now=None):
+    """
+    Returns the filter and update that store the translations, given as
+    {target language: translation}, and a timestamp ('now' by default the
+    current time) on a claimed record and release its lease.
+    'translated_text' holds the translation into the first target language;
+    records with several keep all of them under 'translations'.
+    """
+    now = now or datetime.datetime.now()
+    translated = {
+        "translated_text": translations[target_languages(record)[0]],
+        "translated_timestamp": now,
+        "updated_at": now,
+        "status": "translated",
+    }
+    if len(translations) > 1:
+        translated["translations"] = translations
+    return (
+        leased(record),
+        {
+            "$set": translated,
+            "$unset": dict(
+                LEASE_FIELDS, next_attempt_at="", translated_chunks="", chunk_size=""
+            ),
+        },
+    )
+
+
+def store_translation(record, translations):
+    """
+    Stores the translations and a timestamp on a claimed record, releasing
+    the lease.
+    """
+    result = db.sensor_data.update_one(*translation_update(record, translations))
+    if result.modified_count:
+        record_user_stats(
+            [(record, translation_stats_update(record, datetime.datetime.now()))]
+        )
+    print(
+        f"Traslated '{record['input_text']}' to {translations} for record {record['_id']}"
+    )
+
+
+def translate_record(record):
+    """
+    Translates a single claimed 'sensor_data' record into its target languages
+    and stores the translations and a timestamp on the record, releasing
+    the lease.
+
+    A record that fails is handed to record_failure(), which schedules a
+    retry or dead-letters it. Returns True if the record was translated,
+    False if translation failed.
+    """
+    try:
+        store_translation(record, request_translations(record))
+        return True
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        record_failure(record, e)
+        return False
+
+
+def process_untranslated_records():
+    """
+    Claims batches of records from the 'sensor_data' collection that have
+    input text but have not yet been translated, until none are left. For
+    each such record, it performs language translation using the Google
+    Translate API and updates the record in the database with the translated
+    text and a timestamp.
+
+    The function logs the number of records processed and any translation errors encountered.
+    Returns the number of records processed.
+    """
+    processed = 0
+    while True:
+        pending_records = claim_records()
+        if not pending_records:
+            break
         print(f"Processing {len(pending_records)} records...")
         for record in pending_records:
-            raw_text = record["input_text"]
-            target_language = record.get("target_language", "es")
+            translate_record(record)
+        processed += len(pending_records)
+
+    if not processed:
+        print("No new translation jobs found.")
+    return processed
+
+
+def process_untranslated_records_concurrently(max_in_flight=None):
+    """
+    Same as process_untranslated_records(), but keeps up to 'max_in_flight'
+    translations running at once on a thread pool.
+
+    Records are claimed ahead of the pool so it never runs dry, and results
+    are written from the calling thread in claim order, so the translation
+    threads never wait on the database. Failed translations go to
+    record_failure() like in translate_record(). Returns the number of
+    records processed.
+    """
+    max_in_flight = max_in_flight or MAX_IN_FLIGHT
+    processed = 0
+    in_flight = deque()
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        while True:
+            if not exhausted and len(in_flight) < max_in_flight:
+                pending_records = claim_records(max(CLAIM_BATCH_SIZE, max_in_flight))
+                exhausted = not pending_records
+                if pending_records:
+                    print(f"Processing {len(pending_records)} records...")
+                for record in pending_records:
+                    in_flight.append(
+                        (record, pool.submit(request_translations, record))
+                    )
+            if not in_flight:
+                break
+            record, future = in_flight.popleft()
             try:
-                result = translator.translate(raw_text, dest=target_language)
-                translated_text = result.text
-                db.sensor_data.update_one(
-                    {"_id": record["_id"]},
-                    {
-                        "$set": {
-                            "translated_text": translated_text,
-                            "translated_timestamp": datetime.datetime.now(),
-                        }
-                    },
-                )
-                print(
-                    f"Traslated '{raw_text}' to '{translated_text}' for record {record['_id']}"
-                )
+                translations = future.result()
             except Exception as e:  # pylint: disable=broad-exception-caught
-                print(f"Error translating record {record['_id']}: {e}")
-    else:
+                record_failure(record, e)
+            else:
+                try:
+                    store_translation(record, translations)
+                except PyMongoError as e:
+                    # the lease expires and the reaper returns the record to the queue
+                    print(f"Could not store the translation of {record['_id']}: {e}")
+            processed += 1
+
+    if not processed:
         print("No new translation jobs found.")
+    return processed
 
 
-if __name__ == "__main__":
-    print("Translation ML Client is running. Press Ctrl+C to exit.")
+def request_batch_translation(texts, target_language):
+    """
+    Returns the translations of several texts into one target language,
+    answering from the translation cache where possible and sending the
+    remaining distinct texts to the backend in a single call.
+    """
+    translations = {
+        text: translation_cache.get(text, target_language) for text in texts
+    }
+    missing = [text for text, translated in translations.items() if translated is None]
+    if missing:
+        rate_limiter.acquire()
+        with TRANSLATION_SECONDS.time(target_language=target_language, mode="batch"):
+            results = translator.translate(missing, dest=target_language)
+        for text, result in zip(missing, results):
+            translations[text] = result.text
+            translation_cache.put(text, target_language, result.text)
+    return [translations[text] for text in texts]
+
+
+def translate_batch(records, target_language):
+    """
+    Translates a batch of claimed records that share a target language and
+    stores the results with one unordered bulk_write.
+
+    If the batched backend call fails, the records are retried one by one so
+    a single bad record does not sink the batch; records that still fail go
+    to record_failure() like in translate_record(). Records whose lease was
+    lost meanwhile are not updated and not counted. Returns the number of
+    records translated.
+    """
     try:
-        while True:
-            process_untranslated_records()
-            time.sleep(5)
+        translated = request_batch_translation(
+            [record["input_text"] for record in records], target_language
+        )
+        results = list(zip(records, translated))
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        print(f"Batch translation to '{target_language}' failed, retrying singly: {e}")
+        results = []
+        for record in records:
+            try:
+                results.append((record, request_translation(record, target_language)))
+            except Exception as record_error:  # pylint: disable=broad-exception-caught
+                record_failure(record, record_error)
+    if not results:
+        return 0
+    # one timestamp for the batch, in the millisecond precision MongoDB stores
+    now = datetime.datetime.now()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    operations = [
+        UpdateOne(*translation_update(record, {target_language: translated_text}, now))
+        for record, translated_text in results
+    ]
+    try:
+        matched = db.sensor_data.bulk_write(operations, ordered=False).matched_count
+    except BulkWriteError as e:
+        matched = e.details.get("nMatched", 0)
+        print(f"Failed to store some of {len(operations)} translations: {e}")
+    stored = [record for record, _ in results]
+    if matched < len(operations):
+        # the filters do not say which records matched, their timestamps do
+        stored_ids = {
+            doc["_id"]
+            for doc in db.sensor_data.find(
+                {
+                    "_id": {"$in": [record["_id"] for record in stored]},
+                    "translated_timestamp": now,
+                },
+                {"_id": 1},
+            )
+        }
+        stored = [record for record in stored if record["_id"] in stored_ids]
+    record_user_stats(
+        (record, translation_stats_update(record, now)) for record in stored
+    )
+    print(
+        f"Translated {len(stored)} of {len(operations)} records to '{target_language}'"
+    )
+    return len(stored)
+
+
+def process_untranslated_records_in_batches(batch_size=None):
+    """
+    Same as process_untranslated_records(), but groups claimed records by
+    target language and translates and stores them in batches of up to
+    'batch_size' records. Returns the number of records processed.
+    """
+    batch_size = batch_size or TRANSLATE_BATCH_SIZE
+    processed = 0
+    while True:
+        pending_records = claim_records(max(CLAIM_BATCH_SIZE, batch_size))
+        if not pending_records:
+            break
+        print(f"Processing {len(pending_records)} records...")
+        by_language = {}
+        for record in pending_records:
+            if len(record["input_text"]) > CHUNK_MAX_CHARS or (
+                len(target_languages(record)) > 1
+            ):
+                # already split into concurrent backend calls of its own
+                translate_record(record)
+                continue
+            by_language.setdefault(record.get("target_language", "es"), []).append(
+                record
+            )
+        for target_language, records in by_language.items():
+            for start in range(0, len(records), batch_size):
+                translate_batch(records[start : start + batch_size], target_language)
+        processed += len(pending_records)
+
+    if not processed:
+        print("No new translation jobs found.")
+    return processed
+
+
+def drain_pending_records():
+    """
+    Translates every pending record, in batches if TRANSLATE_BATCH_SIZE
+    allows it, otherwise concurrently if MAX_IN_FLIGHT allows it.
+    """
+    if TRANSLATE_BATCH_SIZE > 1:
+        processed = process_untranslated_records_in_batches()
+    elif MAX_IN_FLIGHT > 1:
+        processed = process_untranslated_records_concurrently()
+    else:
+        processed = process_untranslated_records()
+    if processed:
+        print(f"Translation cache: {translation_cache.stats()}")
+    return processed
+
+
+def drain_after_change():
+    """Drains the pending queue, logging instead of raising failed writes."""
+    try:
+        drain_pending_records()
+    except (WriteError, WriteConcernError) as e:
+        print(f"Could not drain the pending queue, retrying on the next change: {e}")
+
+
+def watch_untranslated_records():
+    """
+    Opens a change stream on 'sensor_data' and translates inserted records
+    as soon as they land.
+
+    The stream is opened before the catch-up query runs so that nothing
+    inserted in between is missed. An insert only wakes the worker up: the
+    pending queue is drained in scheduler order, so a burst of bulk inserts
+    does not get ahead of interactive ones, and events for records already
+    handled by an earlier drain or by another worker cost one indexed
+    lookup. Every REAP_INTERVAL seconds expired leases are reaped and
+    records whose retry backoff elapsed are drained. A drain that fails on
+    a write is logged and the stream kept open: the leases it held expire
+    and the reaper returns their records to the queue. Raises
+    OperationFailure if the server does not support change streams.
+    """
+    pipeline = [
+        {
+            "$match": {
+                "operationType": "insert",
+                "fullDocument.input_text": {"$exists": True},
+            }
+        }
+    ]
+    with db.sensor_data.watch(
+        pipeline, resume_after=load_resume_token(db), max_await_time_ms=1000
+    ) as stream:
+        drain_after_change()
+        next_reap = time.monotonic() + REAP_INTERVAL
+        while stream.alive:
+            change = stream.try_next()
+            if change is not None:
+                if work_pending():
+                    drain_after_change()
+                save_resume_token(db, stream.resume_token)
+            if time.monotonic() >= next_reap:
+                if reap_expired_leases() or work_pending():
+                    drain_after_change()
+                next_reap = time.monotonic() + REAP_INTERVAL
+
+
+def poll_untranslated_records():
+    """
+    Translates pending records by re-running the pending query every
+    POLL_INTERVAL seconds. After a failed cycle, logged, the wait doubles
+    with each consecutive failure, up to 16 times POLL_INTERVAL.
+    """
+    failures = 0
+    while True:
+        try:
+            reap_expired_leases()
+            drain_pending_records()
+            failures = 0
+        except PyMongoError as e:
+            failures += 1
+            print(f"Polling for pending records failed ({failures} in a row): {e}")
+        time.sleep(POLL_INTERVAL * 2 ** min(failures, 4))
+
+
+def run_retention_periodically():
+    """Runs a retention pass every RETENTION_INTERVAL seconds."""
+    while True:
+        try:
+            run_retention(db)
+        except PyMongoError as e:
+            print(f"Retention pass failed: {e}")
+        time.sleep(RETENTION_INTERVAL)
+
+
+def run_worker():
+    """
+    Runs the translation worker until interrupted.
+
+    Uses a change stream when the server supports one and falls back to
+    polling only when it cannot open one (for example against a
+    standalone mongod). Any other failure reopens the stream after
+    POLL_INTERVAL seconds.
+    """
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+    if RETENTION_INTERVAL > 0:
+        threading.Thread(
+            target=run_retention_periodically, name="retention", daemon=True
+        ).start()
+    ensure_indexes(db)
+    backfill_pending_status(db)
+    if WORKER_MODE == "poll":
+        poll_untranslated_records()
+    while True:
+        try:
+            watch_untranslated_records()
+        except OperationFailure as e:
+            if e.code in CHANGE_STREAM_LOST_CODES:
+                print(f"Change stream history lost, restarting from now: {e}")
+                clear_resume_token(db)
+                continue
+            if e.code in CHANGE_STREAM_UNSUPPORTED_CODES:
+                print(f"Change streams unavailable, falling back to polling: {e}")
+                poll_untranslated_records()
+            print(f"Change stream failed, reopening it: {e}")
+            time.sleep(POLL_INTERVAL)
+        except PyMongoError as e:
+            print(f"Change stream interrupted, reconnecting: {e}")
+            time.sleep(POLL_INTERVAL)
+
+
+def run_worker_process(index=0):
+    """
+    Entry point of one worker process. With several processes each gets
+    its own WORKER_ID and serves /metrics on METRICS_PORT + index.
+    """
+    global WORKER_ID, METRICS_PORT  # pylint: disable=global-statement
+    if WORKER_PROCESSES > 1:
+        WORKER_ID = f"{WORKER_ID}-{index}"
+        METRICS_PORT = METRICS_PORT + index if METRICS_PORT else 0
+    connect()
+    try:
+        run_worker()
     except KeyboardInterrupt:
+        pass
+
+
+def main():
+    """
+    Runs the worker in this process, or forks WORKER_PROCESSES of them and
+    stops them all once any of them exits.
+    """
+    print("Translation ML Client is running. Press Ctrl+C to exit.")
+    if WORKER_PROCESSES <= 1:
+        run_worker_process()
         print("Translation ML Client stopped.")
+        return
+    processes = [
+        multiprocessing.Process(
+            target=run_worker_process, args=(index,), name=f"worker-{index}"
+        )
+        for index in range(WORKER_PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        wait([process.sentinel for process in processes])
+    except KeyboardInterrupt:
+        pass
+    for process in processes:
+        process.terminate()
+        process.join()
+    print("Translation ML Client stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Retention for sensor_data.
+
+Keeps the hot sensor_data collection, which every query reads, small. Each
+pass first rolls finished days up into per-user, per-language daily counts
+in 'sensor_data_rollup', then deletes /simulate_input test documents after
+SIMULATED_RETENTION_DAYS and removes translated records older than
+RETENTION_DAYS: moved in batches to 'sensor_data_archive' (RETENTION_MODE
+"archive", where the account history still finds them) or deleted by the
+TTL index on translated_timestamp (RETENTION_MODE "expire"). Switching
+modes on an existing database needs the old translated_timestamp index
+dropped first.
+
+Usage:
+    python retention.py   run one retention pass
+"""
+
+import os
+import datetime
+from dotenv import load_dotenv
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import BulkWriteError
+
+# days a translated record stays in sensor_data, 0 keeps them forever
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))
+# "archive" moves expired records to sensor_data_archive, "expire" deletes them
+RETENTION_MODE = os.getenv("RETENTION_MODE", "archive")
+# days /simulate_input test documents are kept, 0 keeps them forever
+SIMULATED_RETENTION_DAYS = int(os.getenv("SIMULATED_RETENTION_DAYS", "1"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+
+# the web app's priority for /simulate_input documents
+SIMULATED_PRIORITY = 2
+# worker_state document remembering the first day not rolled up yet
+ROLLUP_STATE_ID = "rollup"
+DUPLICATE_KEY = 11000
+
+
+def start_of_day(moment):
+    """Returns midnight of the day of a datetime."""
+    return datetime.datetime.combine(moment.date(), datetime.time())
+
+
+def roll_up(db, today):
+    """
+    Adds every finished day that was not rolled up yet to
+    'sensor_data_rollup', as one document per (day, user_id,
+    target_language) counting the submissions and how many of them were
+    translated. Runs before any record of those days can be archived or
+    expired. Returns the number of days rolled up.
+    """
+    state = db.worker_state.find_one({"_id": ROLLUP_STATE_ID}) or {}
+    since = state.get("through")
+    if since is None:
+        oldest = db.sensor_data.find_one(
+            {}, {"timestamp": 1}, sort=[("timestamp", ASCENDING)]
+        )
+        if oldest is None or "timestamp" not in oldest:
+            return 0
+        since = start_of_day(oldest["timestamp"])
+    if since >= today:
+        return 0
+    db.sensor_data.aggregate(
+        [
+            {"$match": {"timestamp": {"$gte": since, "$lt": today}}},
+            {
+                "$group": {
+                    "_id": {
+                        "day": {
+                            "$dateToString": {
+                                "format": "%Y-%m-%d",
+                                "date": "$timestamp",
+                            }
+                        },
+                        "user_id": "$user_id",
+                        "target_language": "$target_language",
+                    },
+                    "submissions": {"$sum": 1},
+                    "translated": {
+                        "$sum": {"$cond": [{"$eq": ["$status", "translated"]}, 1, 0]}
+                    },
+                }
+            },
+            {
+                "$merge": {
+                    "into": "sensor_data_rollup",
+                    "on": "_id",
+                    "whenMatched": "replace",
+                }
+            },
+        ]
+    )
+    db.worker_state.update_one(
+        {"_id": ROLLUP_STATE_ID}, {"$set": {"through": today}}, upsert=True
+    )
+    return (today - since).days
+
+
+def delete_simulated(db, cutoff):
+    """Deletes /simulate_input documents submitted before 'cutoff'. Returns how many."""
+    result = db.sensor_data.delete_many(
+        {"priority": SIMULATED_PRIORITY, "timestamp": {"$lt": cutoff}}
+    )
+    return result.deleted_count
+
+
+def archive_expired(db, cutoff, batch_size=RETENTION_BATCH_SIZE):
+    """
+    Moves records translated before 'cutoff' to 'sensor_data_archive' in
+    batches. Each batch is copied before it is deleted, so an interrupted
+    pass leaves copies that the next pass skips rather than losing records.
+    Returns the number of records moved.
+    """
+    query = {"status": "translated", "translated_timestamp": {"$lt": cutoff}}
+    moved = 0
+    while True:
+        batch = list(
+            db.sensor_data.find(query)
+            .sort([("translated_timestamp", ASCENDING)])
+            .limit(batch_size)
+        )
+        if not batch:
+            return moved
+        try:
+            db.sensor_data_archive.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            copied_before = all(
+                error["code"] == DUPLICATE_KEY for error in e.details["writeErrors"]
+            )
+            if not copied_before or e.details.get("writeConcernErrors"):
+                raise
+        db.sensor_data.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+        moved += len(batch)
+
+
+def run_retention(db, now=None):
+    """Runs one retention pass and returns what it did."""
+    now = now or datetime.datetime.now()
+    report = {"days_rolled_up": roll_up(db, start_of_day(now))}
+    if SIMULATED_RETENTION_DAYS:
+        report["simulated_deleted"] = delete_simulated(
+            db, now - datetime.timedelta(days=SIMULATED_RETENTION_DAYS)
+        )
+    if RETENTION_DAYS and RETENTION_MODE == "archive":
+        report["archived"] = archive_expired(
+            db, now - datetime.timedelta(days=RETENTION_DAYS)
+        )
+    print(f"Retention pass: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    run_retention(MongoClient(os.getenv("MONGO_URI")).get_default_database())
@@ -0,0 +1,134 @@
+"""
+Per-user translation statistics.
+
+'user_stats' holds one small document per user, keyed by user_id:
+
+    {submitted, translated, characters_translated, failures,
+     languages: {target_language: {submitted, translated}}, last_activity}
+
+The web app adds submissions and the worker adds translations and
+dead-lettered records with atomic $inc updates, so reading a user's totals
+never scans their history. rebuild_stats() recomputes every user's document
+from sensor_data and sensor_data_archive, to backfill existing data or
+repair drift; records deleted by RETENTION_MODE "expire" are no longer
+counted by a rebuild.
+
+Usage:
+    python stats.py   rebuild the statistics of every user
+"""
+
+import os
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+
+def record_languages(record):
+    """Returns the target languages of a record, as the worker translates them."""
+    return record.get("target_languages") or [record.get("target_language", "es")]
+
+
+def translation_stats_update(record, now):
+    """
+    Returns the update adding a translated record to its user's statistics.
+    Characters are counted once per target language.
+    """
+    languages = record_languages(record)
+    increments = {
+        "translated": 1,
+        "characters_translated": len(record.get("input_text", "")) * len(languages),
+    }
+    for language in languages:
+        increments[f"languages.{language}.translated"] = 1
+    return {"$inc": increments, "$max": {"last_activity": now}}
+
+
+def failure_stats_update(now):
+    """Returns the update adding a dead-lettered record to its user's statistics."""
+    return {"$inc": {"failures": 1}, "$max": {"last_activity": now}}
+
+
+def rebuild_pipeline():
+    """
+    Returns the aggregation over sensor_data that recomputes every user's
+    statistics from their records, live and archived, and replaces their
+    'user_stats' documents.
+    """
+    with_user = {"$match": {"user_id": {"$exists": True, "$ne": None}}}
+    translated = {"$gt": ["$translated_text", None]}
+    # record totals are taken from the first of each record's languages
+    first = {"$eq": ["$language_index", 0]}
+    return [
+        with_user,
+        {"$unionWith": {"coll": "sensor_data_archive", "pipeline": [with_user]}},
+        {
+            "$project": {
+                "user_id": 1,
+                "translated": translated,
+                "failed": {"$eq": ["$status", "failed"]},
+                "characters": {"$strLenCP": {"$ifNull": ["$input_text", ""]}},
+                "languages": {
+                    "$ifNull": [
+                        "$target_languages",
+                        [{"$ifNull": ["$target_language", "es"]}],
+                    ]
+                },
+                "activity": {
+                    "$max": ["$timestamp", "$translated_timestamp", "$failed_at"]
+                },
+            }
+        },
+        {"$unwind": {"path": "$languages", "includeArrayIndex": "language_index"}},
+        {
+            "$group": {
+                "_id": {"user_id": "$user_id", "language": "$languages"},
+                "submitted": {"$sum": 1},
+                "translated": {"$sum": {"$cond": ["$translated", 1, 0]}},
+                "characters": {"$sum": {"$cond": ["$translated", "$characters", 0]}},
+                "records": {"$sum": {"$cond": [first, 1, 0]}},
+                "records_translated": {
+                    "$sum": {"$cond": [{"$and": [first, "$translated"]}, 1, 0]}
+                },
+                "failures": {"$sum": {"$cond": [{"$and": [first, "$failed"]}, 1, 0]}},
+                "last_activity": {"$max": "$activity"},
+            }
+        },
+        {
+            "$group": {
+                "_id": "$_id.user_id",
+                "submitted": {"$sum": "$records"},
+                "translated": {"$sum": "$records_translated"},
+                "characters_translated": {"$sum": "$characters"},
+                "failures": {"$sum": "$failures"},
+                "last_activity": {"$max": "$last_activity"},
+                "languages": {
+                    "$push": {
+                        "k": "$_id.language",
+                        "v": {"submitted": "$submitted", "translated": "$translated"},
+                    }
+                },
+            }
+        },
+        {"$set": {"languages": {"$arrayToObject": "$languages"}}},
+        {
+            "$merge": {
+                "into": "user_stats",
+                "on": "_id",
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+
+
+def rebuild_stats(db):
+    """
+    Recomputes every user's statistics. Updates made while the rebuild runs
+    may be overwritten, so run it when traffic is low.
+    """
+    db.sensor_data.aggregate(rebuild_pipeline())
+    print(f"Rebuilt the statistics of {db.user_stats.count_documents({})} users")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    rebuild_stats(MongoClient(os.getenv("MONGO_URI")).get_default_database())
@@ -0,0 +1,96 @@
+# pylint: disable=w0613
+"""
+Testing for the translation backends (backends.py).
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from backends import DictionaryBackend, HedgedBackend, Translation, load_backend
+
+
+class SlowBackend:  # pylint: disable=too-few-public-methods
+    """A backend that answers after 'latency' seconds, or fails."""
+
+    def __init__(self, name, latency, fail=False):
+        """Initialize the backend."""
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+
+    def translate(self, text, dest="es"):
+        """Answer with the backend's name after the latency."""
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return Translation(f"{self.name}:{text}")
+
+
+def test_dictionary_backend_answers_offline(tmp_path):
+    """Known texts come from the dictionary, others get a stand-in."""
+    path = tmp_path / "dictionary.json"
+    path.write_text(json.dumps({"es": {"Hello  world": "Hola mundo"}}))
+    backend = load_backend("dictionary", str(path))
+    assert backend.translate("Hello world", dest="es").text == "Hola mundo"
+    assert backend.translate("Hello world", dest="fr").text == "[fr] Hello world"
+    assert [result.text for result in backend.translate(["a", "b"], dest="de")] == [
+        "[de] a",
+        "[de] b",
+    ]
+
+
+def test_load_backend_by_class_path():
+    """Any class with a compatible translate() can be loaded by path."""
+    assert isinstance(load_backend("backends:DictionaryBackend"), DictionaryBackend)
+    with pytest.raises(ValueError):
+        load_backend("deepl")
+
+
+def test_hedge_answers_a_slow_primary_from_the_secondary():
+    """A primary slower than the hedge delay loses to the secondary."""
+    hedged = HedgedBackend(
+        SlowBackend("primary", 1.0), SlowBackend("secondary", 0), initial_delay=0.05
+    )
+    started = time.perf_counter()
+    assert hedged.translate("hi").text == "secondary:hi"
+    assert time.perf_counter() - started < 0.5
+    assert hedged.counters == {"requests": 1, "hedged": 1, "secondary_wins": 1}
+
+
+def test_hedge_only_fires_for_slow_or_failed_requests():
+    """Fast answers are not hedged and a failed primary falls back."""
+    hedged = HedgedBackend(
+        SlowBackend("primary", 0), SlowBackend("secondary", 0), initial_delay=0.5
+    )
+    assert hedged.translate("hi").text == "primary:hi"
+    assert hedged.counters["hedged"] == 0
+
+    hedged.primary.fail = True
+    assert hedged.translate("hi").text == "secondary:hi"
+    hedged.secondary.fail = True
+    with pytest.raises(RuntimeError):
+        hedged.translate("hi")
+
+
+def test_hedges_do_not_queue_behind_slow_primaries():
+    """A hedge is answered even while every primary thread is busy."""
+    hedged = HedgedBackend(
+        SlowBackend("primary", 1.0),
+        SlowBackend("secondary", 0),
+        initial_delay=0.05,
+        max_workers=1,
+    )
+    started = time.perf_counter()
+    with ThreadPoolExecutor(2) as callers:
+        results = list(callers.map(hedged.translate, ["hi", "there"]))
+    assert [result.text for result in results] == ["secondary:hi", "secondary:there"]
+    assert time.perf_counter() - started < 0.5
+
+
+def test_hedge_delay_follows_the_latency_percentile():
+    """Once enough latencies are known, the delay is their percentile."""
+    hedged = HedgedBackend(None, None, percentile=90, min_samples=10)
+    assert hedged.hedge_delay() == 1.0
+    hedged.latencies.extend(i / 100 for i in range(1, 101))
+    assert hedged.hedge_delay() == pytest.approx(0.91)
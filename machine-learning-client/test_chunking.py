@@ -0,0 +1,32 @@
+"""
+Testing for the splitting of long texts (chunking.py).
+"""
+
+from chunking import split_sentences, split_text
+
+
+def test_split_sentences_keeps_punctuation_and_quotes():
+    """Sentences end at terminal punctuation, closing quotes included."""
+    text = 'Hello there.  How are you?\nI said "fine." Done'
+    assert split_sentences(text) == [
+        "Hello there.",
+        "How are you?",
+        'I said "fine."',
+        "Done",
+    ]
+
+
+def test_split_text_packs_sentences_under_the_limit():
+    """Chunks follow sentence boundaries and never exceed the limit."""
+    text = "One two. Three four. Five six seven eight nine ten eleven. " + "x" * 25
+    chunks = split_text(text, 20)
+    assert chunks == [
+        "One two. Three four.",
+        "Five six seven eight",
+        "nine ten eleven.",
+        "x" * 20,
+        "x" * 5,
+    ]
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    assert split_text("Short text.", 20) == ["Short text."]
+    assert split_text(text, 20) == chunks
@@ -0,0 +1,34 @@
+"""
+Testing for the ML client index management (indexes.py).
+
+This file checks the plan inspection used by the COLLSCAN check against
+canned explain() output.
+"""
+
+from indexes import INDEXES, PENDING_QUERY, plan_stages
+
+
+def test_plan_stages_walks_nested_plans():
+    """Every stage of a nested winning plan is reported."""
+    plan = {
+        "stage": "LIMIT",
+        "inputStage": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "pending_timestamp"},
+        },
+    }
+    assert list(plan_stages(plan)) == ["LIMIT", "FETCH", "IXSCAN"]
+    assert "COLLSCAN" in plan_stages(
+        {"stage": "OR", "inputStages": [{"stage": "COLLSCAN"}]}
+    )
+
+
+def test_pending_index_covers_the_pending_query():
+    """The partial index filter is implied by the pending query, so the planner can use it."""
+    pending_index = next(
+        index.document
+        for index in INDEXES["sensor_data"]
+        if index.document["name"] == "pending_timestamp"
+    )
+    for field, value in pending_index["partialFilterExpression"].items():
+        assert PENDING_QUERY[field] == value
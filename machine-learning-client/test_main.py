@@ -1,13 +1,121 @@
-# pylint: disable=r0903,w0613,w0621
+# pylint: disable=r0903,w0212,w0613,w0621
 """
 Testing for ML Client (main.py).
 
 This file contains unit tests for the machine learning client portion of the web app.
 It simulates MongoDB operations using dummy collection classes and a dummy translator.
 """
+
+import time
+import datetime
+import threading
 import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError, OperationFailure, WriteError
 import main as ml_client
 
+# query operators understood by the dummy collections: (present, value, argument)
+QUERY_OPERATORS = {
+    "$eq": lambda present, value, argument: value == argument,
+    "$exists": lambda present, value, argument: present == argument,
+    "$in": lambda present, value, argument: value in argument,
+    "$nin": lambda present, value, argument: value not in argument,
+    "$ne": lambda present, value, argument: value != argument,
+    "$lt": lambda present, value, argument: present and value < argument,
+    "$lte": lambda present, value, argument: present and value <= argument,
+    "$gt": lambda present, value, argument: present and value > argument,
+}
+QUERY_OPERATORS["$not"] = lambda present, value, argument: not all(
+    QUERY_OPERATORS[operator](present, value, operand)
+    for operator, operand in argument.items()
+)
+
+
+def matches(doc, query):
+    """Return True if the document satisfies the query."""
+    for key, condition in query.items():
+        operators = condition if isinstance(condition, dict) else {"$eq": condition}
+        for operator, argument in operators.items():
+            if not QUERY_OPERATORS[operator](key in doc, doc.get(key), argument):
+                return False
+    return True
+
+
+def apply_update(doc, update):
+    """Apply the '$set', '$inc', '$max' and '$unset' parts of an update to a document."""
+    for operator in ("$set", "$inc", "$max"):
+        for key, value in update.get(operator, {}).items():
+            *parents, field = key.split(".")
+            target = doc
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            if operator == "$inc":
+                value += target.get(field, 0)
+            elif operator == "$max" and field in target:
+                value = max(value, target[field])
+            target[field] = value
+    for key in update.get("$unset", {}):
+        doc.pop(key, None)
+
+
+class DummyCursor(list):
+    """A list of documents that also supports the cursor sort() and limit() calls."""
+
+    def sort(self, keys):
+        """Sort by a list of (key, direction) pairs, documents missing a key first."""
+        for key, direction in reversed(keys):
+            super().sort(
+                key=lambda doc, k=key: (k in doc, doc[k] if k in doc else 0),
+                reverse=direction < 0,
+            )
+        return self
+
+    def limit(self, count):
+        """Return at most 'count' documents."""
+        return DummyCursor(self[:count])
+
+
+class DummyUpdateResult:
+    """A dummy update result carrying the matched and modified counts."""
+
+    def __init__(self, count):
+        """Initialize the result with the number of documents updated."""
+        self.matched_count = count
+        self.modified_count = count
+
+
+def run_pipeline(documents, pipeline):
+    """
+    Yield the results of an aggregation pipeline of $match, $sort and
+    $group stages, the groups keyed by one field and using $first.
+    """
+    for stage in pipeline:
+        ((operator, argument),) = stage.items()
+        if operator == "$match":
+            documents = [doc for doc in documents if matches(doc, argument)]
+        elif operator == "$sort":
+            documents = DummyCursor(documents).sort(list(argument.items()))
+        elif operator == "$group":
+            groups = {}
+            for doc in documents:
+                key = doc.get(argument["_id"][1:])
+                groups.setdefault(
+                    key,
+                    {
+                        field: key if field == "_id" else doc.get(value["$first"][1:])
+                        for field, value in argument.items()
+                    },
+                )
+            documents = list(groups.values())
+    yield from documents
+
+
+class DummyDeleteResult:
+    """A dummy delete result carrying the deleted count."""
+
+    def __init__(self, count):
+        """Initialize the result with the number of documents deleted."""
+        self.deleted_count = count
+
 
 # DummyCollection simulates MongoDB collection operations
 class DummyCollection:
@@ -16,27 +124,159 @@ class DummyCollection:
     def __init__(self):
         """Initialize the DummyCollection with an empty data list."""
         self.data = []
+        self.bulk_writes = 0
+        self.pipelines = []
 
-    def find(self, query):
+    def find(self, query, projection=None):
         """
-        Simulate the find() method by returning all documents that have an "input_text"
-        field but do not have a "translated_text" field.
+        Simulate the find() method by returning all documents matching the query.
         """
-        return [
-            doc
-            for doc in self.data
-            if "input_text" in doc and "translated_text" not in doc
+        return DummyCursor(doc for doc in self.data if matches(doc, query))
+
+    def find_one(self, query, projection=None, sort=None):
+        """Simulate find_one() by returning the first match in sort order."""
+        cursor = self.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        return next(iter(cursor.limit(1)), None)
+
+    def distinct(self, key, query):
+        """Simulate distinct() over the documents matching the query."""
+        return list(
+            {doc[key] for doc in self.data if key in doc and matches(doc, query)}
+        )
+
+    def count_documents(self, query):
+        """Simulate count_documents() by counting the matching documents."""
+        return sum(1 for doc in self.data if matches(doc, query))
+
+    def insert_many(self, documents, ordered=True):
+        """Simulate insert_many(), reporting duplicate _ids like MongoDB."""
+        existing = {doc["_id"] for doc in self.data}
+        duplicates = [
+            {"index": index, "code": 11000}
+            for index, doc in enumerate(documents)
+            if doc["_id"] in existing
         ]
+        self.data.extend(dict(doc) for doc in documents if doc["_id"] not in existing)
+        if duplicates:
+            raise BulkWriteError({"writeErrors": duplicates})
+
+    def delete_many(self, query):
+        """Simulate delete_many() by removing every matching document."""
+        kept = [doc for doc in self.data if not matches(doc, query)]
+        deleted = len(self.data) - len(kept)
+        self.data = kept
+        return DummyDeleteResult(deleted)
+
+    def aggregate(self, pipeline):
+        """
+        Record the pipeline and return an iterator that runs it on first
+        use; see run_pipeline() for the stages it understands.
+        """
+        self.pipelines.append(pipeline)
+        return run_pipeline(self.data, pipeline)
 
-    def update_one(self, query, update):
+    def update_one(self, query, update, upsert=False):
         """
-        Simulate the update_one() method by finding the document with a matching "_id"
+        Simulate the update_one() method by updating the first matching document,
+        or inserting one with the query's _id when upserting.
         """
         for doc in self.data:
-            if doc.get("_id") == query.get("_id"):
-                for key, value in update.get("$set", {}).items():
-                    doc[key] = value
-                return
+            if matches(doc, query):
+                apply_update(doc, update)
+                return DummyUpdateResult(1)
+        if upsert:
+            self.data.append({"_id": query["_id"]})
+            apply_update(self.data[-1], update)
+        return DummyUpdateResult(0)
+
+    def update_many(self, query, update):
+        """Simulate the update_many() method by updating every matching document."""
+        matched = [doc for doc in self.data if matches(doc, query)]
+        for doc in matched:
+            apply_update(doc, update)
+        return DummyUpdateResult(len(matched))
+
+    def find_one_and_update(self, query, update, return_document=None):
+        """Simulate find_one_and_update() by returning the updated document."""
+        for doc in self.data:
+            if matches(doc, query):
+                apply_update(doc, update)
+                return doc
+        return None
+
+    def bulk_write(self, requests, ordered=True):
+        """Simulate bulk_write() by applying each UpdateOne in turn."""
+        self.bulk_writes += 1
+        return DummyUpdateResult(
+            sum(
+                self.update_one(
+                    request._filter, request._doc, request._upsert
+                ).matched_count
+                for request in requests
+            )
+        )
+
+    def watch(self, pipeline, resume_after=None, max_await_time_ms=None):
+        """
+        Simulate the watch() method by returning a change stream over the
+        documents queued in 'inserts'.
+        """
+        return DummyChangeStream(getattr(self, "inserts", []), resume_after)
+
+
+class DummyChangeStream:
+    """A dummy change stream that yields one insert event per queued document."""
+
+    def __init__(self, documents, resume_after):
+        """Initialize the stream with the documents to deliver."""
+        self.documents = list(documents)
+        self.resume_token = resume_after
+        self.delivered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    @property
+    def alive(self):
+        """The stream closes once every queued document has been delivered."""
+        return self.delivered < len(self.documents)
+
+    def try_next(self):
+        """Return the next insert event."""
+        document = self.documents[self.delivered]
+        self.resume_token = {"_data": f"token-{self.delivered}"}
+        self.delivered += 1
+        return {
+            "operationType": "insert",
+            "documentKey": {"_id": document["_id"]},
+            "fullDocument": document,
+        }
+
+
+class DummyStateCollection:
+    """A dummy collection holding documents keyed by '_id'."""
+
+    def __init__(self):
+        """Initialize the DummyStateCollection with an empty document map."""
+        self.docs = {}
+
+    def find_one(self, query, projection=None):
+        """Return the document with a matching '_id'."""
+        return self.docs.get(query["_id"])
+
+    def update_one(self, query, update, upsert=False):
+        """Apply a '$set' to the document with a matching '_id'."""
+        doc = self.docs.setdefault(query["_id"], {"_id": query["_id"]})
+        doc.update(update.get("$set", {}))
+
+    def delete_one(self, query):
+        """Remove the document with a matching '_id'."""
+        self.docs.pop(query["_id"], None)
 
 
 # DummyTranslator now creates an instance with a properly set text attribute.
@@ -59,8 +299,35 @@ class DummyTranslator:
 
     def translate(self, text, dest):
         """
-        Simulate the translation by returning a DummyTranslation instance.
+        Simulate the translation by returning a DummyTranslation instance,
+        or a list of them when given a list of texts.
         """
+        if isinstance(text, list):
+            return [DummyTranslation(item) for item in text]
+        return DummyTranslation(text)
+
+
+class SlowTranslator(DummyTranslator):
+    """
+    A dummy translator that takes 'latency' seconds per call, like a network
+    round trip, and records the highest number of calls in flight at once.
+    """
+
+    def __init__(self, latency):
+        """Initialize the SlowTranslator with its per-call latency."""
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def translate(self, text, dest):
+        """Simulate a slow translation call."""
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
         return DummyTranslation(text)
 
 
@@ -72,24 +339,61 @@ def ml_client_setup(monkeypatch):
     """
     dummy_sensor_data = DummyCollection()
     dummy_sensor_data.data = [
-        {"_id": 1, "input_text": "hello", "target_language": "fr"},
+        {"_id": 1, "input_text": "hello", "target_language": "fr", "status": "pending"},
         {
             "_id": 2,
             "input_text": "world",
             "target_language": "es",
             "translated_text": "old_translation",
+            "status": "translated",
         },
-        {"_id": 3, "input_text": "test", "target_language": "de"},
+        {"_id": 3, "input_text": "test", "target_language": "de", "status": "pending"},
     ]
     dummy_translator = DummyTranslator()
+    dummy_cache = DummyStateCollection()
     monkeypatch.setattr(
-        ml_client, "db", type("DummyDB", (), {"sensor_data": dummy_sensor_data})()
+        ml_client,
+        "db",
+        type(
+            "DummyDB",
+            (),
+            {
+                "sensor_data": dummy_sensor_data,
+                "worker_state": DummyStateCollection(),
+                "translation_cache": dummy_cache,
+                "user_stats": DummyCollection(),
+            },
+        )(),
     )
     monkeypatch.setattr(ml_client, "translator", dummy_translator)
+    monkeypatch.setattr(
+        ml_client, "translation_cache", ml_client.TranslationCache(dummy_cache)
+    )
+    monkeypatch.setattr(ml_client, "METRICS_PORT", 0)
+    monkeypatch.setattr(ml_client, "RETENTION_INTERVAL", 0)
+    monkeypatch.setattr(ml_client, "schedule_state", {"last_user": None})
 
     return ml_client
 
 
+def claim(client, record_id):
+    """
+    Claim one pending record by id, with the lease claim_records() gives a
+    batch. Returns the claimed record, or None if it cannot be claimed now.
+    """
+    return client.db.sensor_data.find_one_and_update(
+        dict(client.pending_query(), _id=record_id),
+        {
+            "$set": {
+                "lease_owner": client.WORKER_ID,
+                "lease_token": f"token-{record_id}",
+                "lease_expires_at": datetime.datetime.now()
+                + datetime.timedelta(seconds=client.LEASE_SECONDS),
+            }
+        },
+    )
+
+
 # Tests
 
 
@@ -123,8 +427,562 @@ def test_process_untranslated_records_no_pending(ml_client_setup, capsys):
     """
     for doc in ml_client_setup.db.sensor_data.data:
         doc["translated_text"] = "existing_translation"
+        doc["status"] = "translated"
 
     ml_client_setup.process_untranslated_records()
 
     captured = capsys.readouterr().out
     assert "No new translation jobs found." in captured
+
+
+def test_watch_translates_inserted_records(ml_client_setup):
+    """
+    Verify that watch_untranslated_records() catches up on pending records,
+    translates newly inserted records and saves the resume token.
+    """
+    sensor_data = ml_client_setup.db.sensor_data
+    new_record = {
+        "_id": 4,
+        "input_text": "late",
+        "target_language": "it",
+        "status": "pending",
+    }
+    sensor_data.data.append(new_record)
+    sensor_data.inserts = [new_record]
+
+    ml_client_setup.watch_untranslated_records()
+
+    assert new_record["translated_text"] == "translated_late"
+    record1 = next(doc for doc in sensor_data.data if doc["_id"] == 1)
+    assert record1["translated_text"] == "translated_hello"
+    assert ml_client_setup.load_resume_token(ml_client_setup.db) == {"_data": "token-0"}
+
+
+def test_run_worker_falls_back_to_polling(ml_client_setup, monkeypatch):
+    """
+    Verify that run_worker() falls back to polling when the server does not
+    support change streams.
+    """
+
+    def unsupported(*args, **kwargs):
+        raise OperationFailure("not a replica set", code=40573)
+
+    class StopPolling(Exception):
+        """Raised to break out of the polling loop."""
+
+    def fake_poll():
+        raise StopPolling()
+
+    monkeypatch.setattr(ml_client_setup, "ensure_indexes", lambda db: None)
+    monkeypatch.setattr(ml_client_setup.db.sensor_data, "watch", unsupported)
+    monkeypatch.setattr(ml_client_setup, "poll_untranslated_records", fake_poll)
+
+    with pytest.raises(StopPolling):
+        ml_client_setup.run_worker()
+
+
+def test_run_worker_reopens_the_stream_on_other_failures(ml_client_setup, monkeypatch):
+    """
+    Verify that run_worker() only falls back to polling when change streams
+    are unsupported, and reopens the stream after any other failure.
+    """
+    failures = [OperationFailure("not authorized", code=13)]
+
+    class StopWorker(Exception):
+        """Raised to break out of the worker loop."""
+
+    def watch(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        raise StopWorker()
+
+    def fake_poll():
+        raise AssertionError("fell back to polling")
+
+    monkeypatch.setattr(ml_client_setup, "ensure_indexes", lambda db: None)
+    monkeypatch.setattr(ml_client_setup.db.sensor_data, "watch", watch)
+    monkeypatch.setattr(ml_client_setup, "poll_untranslated_records", fake_poll)
+    monkeypatch.setattr(ml_client_setup.time, "sleep", lambda seconds: None)
+
+    with pytest.raises(StopWorker):
+        ml_client_setup.run_worker()
+
+
+def test_watch_survives_failed_drains(ml_client_setup, monkeypatch):
+    """
+    Verify that a write error while draining does not end the change
+    stream: later inserts are still translated.
+    """
+    sensor_data = ml_client_setup.db.sensor_data
+    new_record = {"_id": 4, "input_text": "late", "status": "pending"}
+    sensor_data.inserts = [new_record]
+    drain = ml_client_setup.drain_pending_records
+    drains = []
+
+    def failing_drain():
+        drains.append(drain)
+        if len(drains) == 1:
+            raise WriteError("write failed", code=2)
+        return drain()
+
+    monkeypatch.setattr(ml_client_setup, "drain_pending_records", failing_drain)
+    sensor_data.data.append(new_record)
+    ml_client_setup.watch_untranslated_records()
+    assert len(drains) == 2
+    assert new_record["translated_text"] == "translated_late"
+
+
+def test_polling_backs_off_after_failures(ml_client_setup, monkeypatch):
+    """
+    Verify that a failed poll is logged and retried after a growing delay
+    instead of ending the worker, and that a good poll resets the delay.
+    """
+    outcomes = [True, True, False]
+    sleeps = []
+
+    def reap():
+        if outcomes.pop(0):
+            raise AutoReconnect("down")
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if not outcomes:
+            raise KeyboardInterrupt()
+
+    monkeypatch.setattr(ml_client_setup, "POLL_INTERVAL", 1)
+    monkeypatch.setattr(ml_client_setup, "reap_expired_leases", reap)
+    monkeypatch.setattr(ml_client_setup.time, "sleep", sleep)
+    with pytest.raises(KeyboardInterrupt):
+        ml_client_setup.poll_untranslated_records()
+    assert sleeps == [2, 4, 1]
+
+
+def test_claim_records_is_exclusive(ml_client_setup, monkeypatch):
+    """
+    Verify that a record claimed by one worker cannot be claimed by another
+    and that translating it releases the lease.
+    """
+    first = ml_client_setup.claim_records()
+    assert sorted(record["_id"] for record in first) == [1, 3]
+    assert all(record["lease_owner"] == ml_client_setup.WORKER_ID for record in first)
+
+    monkeypatch.setattr(ml_client_setup, "WORKER_ID", "other-worker")
+    assert not ml_client_setup.claim_records()
+    assert claim(ml_client_setup, 1) is None
+
+    ml_client_setup.translate_record(first[0])
+    assert "lease_owner" not in first[0]
+    assert first[0]["translated_text"].startswith("translated_")
+
+
+def test_reap_expired_leases_requeues_records(ml_client_setup, monkeypatch):
+    """
+    Verify that records whose lease expired are returned to the pending queue.
+    """
+    monkeypatch.setattr(ml_client_setup, "LEASE_SECONDS", -1)
+    claimed = ml_client_setup.claim_records()
+    assert claimed
+
+    assert ml_client_setup.reap_expired_leases() == len(claimed)
+    assert len(ml_client_setup.claim_records()) == len(claimed)
+
+
+def test_concurrent_processing_overlaps_translations(ml_client_setup, monkeypatch):
+    """
+    Verify that the concurrent variant keeps several translations in flight,
+    beats the serial loop on a slow backend and writes every result.
+    """
+    sensor_data = ml_client_setup.db.sensor_data
+    sensor_data.data = [
+        {
+            "_id": i,
+            "input_text": f"text{i}",
+            "target_language": "fr",
+            "status": "pending",
+        }
+        for i in range(16)
+    ]
+    slow_translator = SlowTranslator(latency=0.05)
+    monkeypatch.setattr(ml_client_setup, "translator", slow_translator)
+
+    started = time.monotonic()
+    processed = ml_client_setup.process_untranslated_records_concurrently(8)
+    elapsed = time.monotonic() - started
+
+    assert processed == 16
+    assert slow_translator.max_in_flight == 8
+    assert elapsed < 16 * 0.05 / 2
+    assert all(
+        doc["translated_text"] == f"translated_{doc['input_text']}"
+        for doc in sensor_data.data
+    )
+
+
+def test_rate_limiter_spaces_out_calls():
+    """Verify that the rate limiter lets at most 'rate' calls start per second."""
+    limiter = ml_client.RateLimiter(20)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.monotonic() - started >= 4 / 20 - 0.01
+
+
+def test_repeated_phrases_skip_the_backend(ml_client_setup, monkeypatch):
+    """
+    Verify that a phrase translated once is served from the translation cache
+    instead of calling the translator again.
+    """
+    sensor_data = ml_client_setup.db.sensor_data
+    sensor_data.data = [
+        {
+            "_id": i,
+            "input_text": "Hello,  how are you?",
+            "target_language": "es",
+            "status": "pending",
+        }
+        for i in range(5)
+    ]
+    calls = []
+
+    class CountingTranslator(DummyTranslator):
+        """A dummy translator that counts its calls."""
+
+        def translate(self, text, dest):
+            calls.append(text)
+            return super().translate(text, dest)
+
+    monkeypatch.setattr(ml_client_setup, "translator", CountingTranslator())
+
+    ml_client_setup.process_untranslated_records()
+
+    assert len(calls) == 1
+    assert all("translated_text" in doc for doc in sensor_data.data)
+    assert ml_client_setup.translation_cache.stats()["memory_hits"] == 4
+
+
+def test_batches_group_by_language_and_isolate_failures(ml_client_setup, monkeypatch):
+    """
+    Verify that batch mode sends one backend call and one bulk_write per
+    target language, and that a failing batch falls back to single records
+    so only the bad record stays untranslated.
+    """
+    sensor_data = ml_client_setup.db.sensor_data
+    sensor_data.data = [
+        {
+            "_id": i,
+            "input_text": f"text{i}",
+            "target_language": language,
+            "status": "pending",
+        }
+        for i, language in enumerate(["fr", "es", "fr", "es", "fr"])
+    ]
+    sensor_data.data[3]["input_text"] = "poison"
+    calls = []
+
+    class PickyTranslator(DummyTranslator):
+        """A dummy translator that rejects any call containing 'poison'."""
+
+        def translate(self, text, dest):
+            calls.append((text, dest))
+            if "poison" in text:
+                raise ValueError("unsupported text")
+            return super().translate(text, dest)
+
+    monkeypatch.setattr(ml_client_setup, "translator", PickyTranslator())
+
+    assert ml_client_setup.process_untranslated_records_in_batches(10) == 5
+
+    assert (["text0", "text2", "text4"], "fr") in calls
+    assert sensor_data.bulk_writes == 2
+    translated = {doc["_id"] for doc in sensor_data.data if "translated_text" in doc}
+    assert translated == {0, 1, 2, 4}
+
+
+def test_metrics_report_queue_and_failures(ml_client_setup, monkeypatch):
+    """
+    Verify that the queue gauges follow the pending records and that failed
+    translations are counted per target language.
+    """
+    now = datetime.datetime.now()
+    ml_client_setup.db.sensor_data.data[0]["timestamp"] = now - datetime.timedelta(
+        seconds=90
+    )
+    ml_client_setup.db.sensor_data.data[2]["timestamp"] = now
+
+    depth, age = ml_client_setup.pending_queue_metrics()
+    assert depth == 2
+    assert 89 <= age < 120
+
+    class BrokenTranslator:
+        """A translator whose backend is down."""
+
+        def translate(self, text, dest="es"):
+            """Fail every call."""
+            raise RuntimeError("backend down")
+
+    monkeypatch.setattr(ml_client_setup, "translator", BrokenTranslator())
+    before = ml_client_setup.TRANSLATION_ERRORS.collect().get(("de",), 0)
+    ml_client_setup.translate_record(claim(ml_client_setup, 3))
+    assert ml_client_setup.TRANSLATION_ERRORS.collect()[("de",)] == before + 1
+
+
+def test_failures_back_off_then_dead_letter(ml_client_setup, monkeypatch):
+    """
+    Verify that a failing record is retried with growing delays, skipped by
+    the pending query while it backs off and dead-lettered after
+    MAX_ATTEMPTS failures.
+    """
+
+    class BrokenTranslator:
+        """A translator that rejects the target language."""
+
+        def translate(self, text, dest="es"):
+            """Fail every call."""
+            raise ValueError(f"invalid destination language: {dest}")
+
+    monkeypatch.setattr(ml_client_setup, "translator", BrokenTranslator())
+    monkeypatch.setattr(ml_client_setup, "MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(ml_client_setup.random, "uniform", lambda low, high: high)
+    record = ml_client_setup.db.sensor_data.data[2]
+    ml_client_setup.db.sensor_data.data[:] = [record]
+    now = datetime.datetime.now()
+
+    ml_client_setup.translate_record(claim(ml_client_setup, 3))
+    assert record["attempts"] == 1
+    assert "lease_owner" not in record
+    assert "invalid destination language" in record["last_error"]
+    # the web app's validators see the failed attempt
+    assert record["updated_at"] >= now
+    first_delay = (record["next_attempt_at"] - now).total_seconds()
+    assert claim(ml_client_setup, 3) is None
+    assert not ml_client_setup.work_pending()
+
+    record["next_attempt_at"] = now
+    assert ml_client_setup.work_pending()
+    ml_client_setup.translate_record(claim(ml_client_setup, 3))
+    assert (record["next_attempt_at"] - now).total_seconds() > first_delay * 1.5
+
+    record["next_attempt_at"] = now
+    ml_client_setup.translate_record(claim(ml_client_setup, 3))
+    assert record["status"] == "failed"
+    assert record["attempts"] == 3
+    assert "next_attempt_at" not in record
+    assert claim(ml_client_setup, 3) is None
+
+    # the concurrent path records failures the same way
+    record["status"] = "pending"
+    for field in ("attempts", "failed_at", "last_error"):
+        record.pop(field)
+    assert ml_client_setup.process_untranslated_records_concurrently(2) == 1
+    assert record["attempts"] == 1
+    assert "lease_owner" not in record
+    assert "invalid destination language" in record["last_error"]
+    assert record["next_attempt_at"] > now
+    assert claim(ml_client_setup, 3) is None
+
+
+def test_scheduler_prefers_interactive_and_rotates_users(ml_client_setup):
+    """
+    Verify that claims serve the most urgent priority band first and take
+    turns between the users waiting in it, so one user's backlog cannot
+    starve another's interactive requests.
+    """
+    start = datetime.datetime.now()
+    sensor_data = ml_client_setup.db.sensor_data
+    sensor_data.data = [
+        {
+            "_id": f"{user}-{priority}-{index}",
+            "input_text": "text",
+            "status": "pending",
+            "priority": priority,
+            "user_id": user,
+            "timestamp": start + datetime.timedelta(seconds=index),
+        }
+        for user, priority, count in (("bulk", 1, 50), ("busy", 0, 6), ("quiet", 0, 1))
+        for index in range(count)
+    ]
+
+    first = [record["_id"] for record in ml_client_setup.claim_records(limit=4)]
+    assert first == ["busy-0-0", "quiet-0-0", "busy-0-1", "busy-0-2"]
+    second = [record["_id"] for record in ml_client_setup.claim_records(limit=4)]
+    assert second == ["busy-0-3", "busy-0-4", "busy-0-5"]
+    third = ml_client_setup.claim_records(limit=4)
+    assert [record["_id"] for record in third] == [f"bulk-1-{i}" for i in range(4)]
+
+
+def test_long_texts_are_chunked_and_resume(ml_client_setup, monkeypatch):
+    """
+    Verify that a long text is translated in chunks reassembled in order and
+    that a retry after a failed chunk only translates the missing chunks.
+    """
+
+    class FlakyTranslator:
+        """Fails every chunk mentioning 'three' until 'healthy' is set."""
+
+        def __init__(self):
+            self.calls = []
+            self.healthy = False
+
+        def translate(self, text, dest="es"):
+            """Translate a chunk, or fail."""
+            self.calls.append(text)
+            if "three" in text and not self.healthy:
+                raise RuntimeError("backend timeout")
+            return DummyTranslation(text)
+
+    flaky = FlakyTranslator()
+    monkeypatch.setattr(ml_client_setup, "translator", flaky)
+    monkeypatch.setattr(ml_client_setup, "CHUNK_MAX_CHARS", 20)
+    record = ml_client_setup.db.sensor_data.data[0]
+    record["input_text"] = "Sentence one. Sentence two. Sentence three. Sentence four."
+
+    assert not ml_client_setup.translate_record(claim(ml_client_setup, 1))
+    assert len(flaky.calls) == 4
+    assert sorted(record["translated_chunks"]["fr"]) == ["0", "1", "3"]
+
+    flaky.healthy = True
+    record["next_attempt_at"] = datetime.datetime.now()
+    flaky.calls.clear()
+    assert ml_client_setup.translate_record(claim(ml_client_setup, 1))
+    assert flaky.calls == ["Sentence three."]
+    assert record["translated_text"] == (
+        "translated_Sentence one. translated_Sentence two."
+        " translated_Sentence three. translated_Sentence four."
+    )
+    assert "translated_chunks" not in record
+
+
+def test_multiple_target_languages_fan_out(ml_client_setup, monkeypatch):
+    """
+    Test that a record with several target languages is translated into all
+    of them, saving each as it arrives and retrying only the failed ones.
+    """
+
+    class LanguageTranslator:
+        """A translator that fails German until healthy."""
+
+        def __init__(self):
+            self.calls = []
+            self.healthy = False
+
+        def translate(self, text, dest="es"):
+            """Translate into 'dest', or fail."""
+            self.calls.append(dest)
+            if dest == "de" and not self.healthy:
+                raise RuntimeError("backend timeout")
+            return DummyTranslation(f"{dest}:{text}")
+
+    translator = LanguageTranslator()
+    monkeypatch.setattr(ml_client_setup, "translator", translator)
+    record = ml_client_setup.db.sensor_data.data[0]
+    record["target_languages"] = ["fr", "de", "es"]
+
+    assert not ml_client_setup.translate_record(claim(ml_client_setup, 1))
+    assert sorted(translator.calls) == ["de", "es", "fr"]
+    assert record["translations"] == {
+        "fr": "translated_fr:hello",
+        "es": "translated_es:hello",
+    }
+    assert "translated_text" not in record
+
+    translator.healthy = True
+    translator.calls.clear()
+    record["next_attempt_at"] = datetime.datetime.now()
+    assert ml_client_setup.translate_record(claim(ml_client_setup, 1))
+    assert translator.calls == ["de"]
+    assert record["status"] == "translated"
+    assert record["translated_text"] == "translated_fr:hello"
+    assert record["translations"] == {
+        "fr": "translated_fr:hello",
+        "de": "translated_de:hello",
+        "es": "translated_es:hello",
+    }
+
+
+def test_user_stats_count_translations_and_dead_letters(ml_client_setup, monkeypatch):
+    """Test that translated and dead-lettered records are added to their user's stats."""
+
+    class PickyTranslator:
+        """A translator that cannot translate 'test'."""
+
+        def translate(self, text, dest="es"):
+            """Translate the text, or fail on 'test'."""
+            if text == "test":
+                raise RuntimeError("unsupported")
+            return DummyTranslation(text)
+
+    monkeypatch.setattr(ml_client_setup, "translator", PickyTranslator())
+    monkeypatch.setattr(ml_client_setup, "MAX_ATTEMPTS", 1)
+    for record in ml_client_setup.db.sensor_data.data:
+        record["user_id"] = "user-1"
+    ml_client_setup.db.sensor_data.data[0]["target_languages"] = ["fr", "de"]
+
+    ml_client_setup.process_untranslated_records()
+
+    (stats,) = ml_client_setup.db.user_stats.data
+    assert stats["_id"] == "user-1"
+    assert stats["translated"] == 1
+    assert stats["characters_translated"] == 2 * len("hello")
+    assert stats["languages"] == {"fr": {"translated": 1}, "de": {"translated": 1}}
+    assert stats["failures"] == 1
+    assert isinstance(stats["last_activity"], datetime.datetime)
+
+    # a failure whose lease was lost meanwhile is not counted again
+    lost = dict(ml_client_setup.db.sensor_data.data[2], lease_token="lost")
+    ml_client_setup.record_failure(lost, RuntimeError("unsupported"))
+    assert stats["failures"] == 1
+
+
+def test_batch_stats_skip_records_whose_lease_was_lost(ml_client_setup):
+    """Test that a batch only counts the records its lease-guarded updates stored."""
+    sensor_data = ml_client_setup.db.sensor_data
+    sensor_data.data = [
+        {"_id": i, "input_text": f"text{i}", "status": "pending", "user_id": "user-1"}
+        for i in range(3)
+    ]
+    # copies, as the dummy collection hands out its stored documents
+    records = [dict(record) for record in ml_client_setup.claim_records(3)]
+    # the reaper requeued the last record and another worker claimed it
+    sensor_data.data[2]["lease_token"] = "someone-else"
+
+    assert ml_client_setup.translate_batch(records, "es") == 2
+
+    (stats,) = ml_client_setup.db.user_stats.data
+    assert stats["translated"] == 2
+    assert "translated_text" not in sensor_data.data[2]
+
+
+def test_connect_is_lazy_and_configured(monkeypatch):
+    """Test that connect() needs MONGO_URI and builds an unconnected, pooled client."""
+    monkeypatch.setattr(ml_client, "client", None)
+    monkeypatch.setattr(ml_client, "db", None)
+    monkeypatch.setattr(ml_client, "translation_cache", None)
+    monkeypatch.setitem(ml_client.MONGO_CLIENT_OPTIONS, "maxPoolSize", 7)
+    monkeypatch.delenv("MONGO_URI", raising=False)
+    with pytest.raises(ValueError):
+        ml_client.connect()
+
+    # nothing listens on this port, so any eager connection would fail
+    db = ml_client.connect(
+        "mongodb://localhost:1/translator?serverSelectionTimeoutMS=1"
+    )
+    assert db.name == "translator"
+    assert ml_client.client.options.pool_options.max_pool_size == 7
+    assert ml_client.translation_cache.collection.name == "translation_cache"
+    ml_client.client.close()
+
+
+def test_worker_processes_get_their_own_identity(monkeypatch):
+    """Test that each of several worker processes connects with its own id and port."""
+    seen = []
+    monkeypatch.setattr(ml_client, "WORKER_PROCESSES", 3)
+    monkeypatch.setattr(ml_client, "WORKER_ID", "host-1")
+    monkeypatch.setattr(ml_client, "METRICS_PORT", 5001)
+    monkeypatch.setattr(ml_client, "connect", lambda: seen.append("connect"))
+    monkeypatch.setattr(
+        ml_client,
+        "run_worker",
+        lambda: seen.append((ml_client.WORKER_ID, ml_client.METRICS_PORT)),
+    )
+    ml_client.run_worker_process(2)
+    assert seen == ["connect", ("host-1-2", 5003)]
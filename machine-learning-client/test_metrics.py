@@ -0,0 +1,54 @@
+"""
+Unit tests for the Prometheus-style metrics module.
+"""
+
+from urllib.request import urlopen
+from metrics import Counter, Gauge, Histogram, Registry, start_http_server
+
+
+def test_registry_renders_exposition_format():
+    """Counters, callback gauges and histograms render as Prometheus text."""
+    registry = Registry()
+    requests = Counter("requests_total", "Requests.", ["route"], registry=registry)
+    Gauge("queue_depth", "Depth.", function=lambda: 7, registry=registry)
+    latency = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+    registry.register(latency)
+
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    latency.observe(0.05)
+    latency.observe(0.5)
+    body = registry.render()
+
+    assert "# TYPE requests_total counter" in body
+    assert 'requests_total{route="/a\\"b"} 3' in body
+    assert "queue_depth 7" in body
+    assert 'latency_seconds_bucket{le="0.1"} 1' in body
+    assert 'latency_seconds_bucket{le="1"} 2' in body
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in body
+    assert "latency_seconds_count 2" in body
+
+
+def test_failing_callback_is_skipped():
+    """A gauge whose callback raises renders no samples instead of failing."""
+    registry = Registry()
+
+    def broken():
+        raise RuntimeError("database down")
+
+    Gauge("queue_depth", "Depth.", function=broken, registry=registry)
+    assert registry.render() == "# HELP queue_depth Depth.\n# TYPE queue_depth gauge\n"
+
+
+def test_http_server_serves_metrics():
+    """start_http_server() answers scrapes on /metrics."""
+    registry = Registry()
+    Gauge("queue_depth", "Depth.", function=lambda: 3, registry=registry)
+    server = start_http_server(0, address="127.0.0.1", registry=registry)
+    try:
+        port = server.server_address[1]
+        with urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+        assert "queue_depth 3" in body
+    finally:
+        server.shutdown()
@@ -0,0 +1,82 @@
+"""
+Testing for the sensor_data retention passes (retention.py).
+
+This file runs the passes against the dummy collections of test_main.py.
+"""
+
+import datetime
+from types import SimpleNamespace
+import pytest
+import retention
+from test_main import DummyCollection, DummyStateCollection
+
+NOW = datetime.datetime(2025, 5, 20, 15, 30)
+
+
+def record(record_id, days_ago, **fields):
+    """Build a sensor_data record submitted and translated 'days_ago' days ago."""
+    moment = NOW - datetime.timedelta(days=days_ago)
+    doc = {
+        "_id": record_id,
+        "timestamp": moment,
+        "translated_timestamp": moment,
+        "status": "translated",
+        "priority": 0,
+    }
+    doc.update(fields)
+    return doc
+
+
+@pytest.fixture(name="db")
+def fixture_db(monkeypatch):
+    """A dummy database with records of different ages and kinds."""
+    monkeypatch.setattr(retention, "RETENTION_DAYS", 30)
+    monkeypatch.setattr(retention, "RETENTION_MODE", "archive")
+    monkeypatch.setattr(retention, "SIMULATED_RETENTION_DAYS", 1)
+    db = SimpleNamespace(
+        sensor_data=DummyCollection(),
+        sensor_data_archive=DummyCollection(),
+        worker_state=DummyStateCollection(),
+    )
+    db.sensor_data.data = [
+        record("old", 40),
+        record("old-simulated", 40, priority=2),
+        record("recent", 3),
+        record("recent-simulated", 3, priority=2),
+        record("today-simulated", 0, priority=2),
+        dict(record("old-pending", 40), status="pending"),
+    ]
+    return db
+
+
+def ids(collection):
+    """Return the sorted _ids of a dummy collection's documents."""
+    return sorted(doc["_id"] for doc in collection.data)
+
+
+def test_retention_pass_archives_and_prunes(db):
+    """Old translated records are archived, stale test documents deleted."""
+    report = retention.run_retention(db, NOW)
+    assert ids(db.sensor_data) == ["old-pending", "recent", "today-simulated"]
+    assert ids(db.sensor_data_archive) == ["old"]
+    assert report == {"days_rolled_up": 40, "simulated_deleted": 2, "archived": 1}
+
+
+def test_archive_skips_copies_of_an_interrupted_pass(db):
+    """Records copied before a crash are not duplicated, and still removed."""
+    db.sensor_data_archive.data.append(dict(db.sensor_data.data[0]))
+    cutoff = NOW - datetime.timedelta(days=30)
+    assert retention.archive_expired(db, cutoff, batch_size=1) == 2
+    assert "old" not in ids(db.sensor_data)
+    assert ids(db.sensor_data_archive) == ["old", "old-simulated"]
+
+
+def test_roll_up_covers_each_finished_day_once(db):
+    """Each pass rolls up the finished days since the previous one."""
+    today = retention.start_of_day(NOW)
+    assert retention.roll_up(db, today) == 40
+    match = db.sensor_data.pipelines[0][0]["$match"]["timestamp"]
+    assert match == {"$gte": today - datetime.timedelta(days=40), "$lt": today}
+    assert retention.roll_up(db, today) == 0
+    assert retention.roll_up(db, today + datetime.timedelta(days=1)) == 1
+    assert db.sensor_data.pipelines[1][0]["$match"]["timestamp"]["$gte"] == today
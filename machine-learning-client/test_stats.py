@@ -0,0 +1,115 @@
+"""
+Testing for the per-user statistics (stats.py).
+
+The rebuild runs an aggregation the dummy collections cannot, so its test
+needs a MongoDB at TEST_MONGO_URI and is skipped without one. It works in
+a throwaway database that it drops afterwards.
+"""
+
+import os
+import uuid
+import datetime
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+import stats
+
+NOW = datetime.datetime(2025, 5, 20, 15, 30)
+
+
+def test_translation_stats_update_counts_each_language():
+    """Test that a translated record counts its characters once per target language."""
+    record = {"input_text": "hello", "target_languages": ["fr", "de"]}
+    assert stats.translation_stats_update(record, NOW) == {
+        "$inc": {
+            "translated": 1,
+            "characters_translated": 10,
+            "languages.fr.translated": 1,
+            "languages.de.translated": 1,
+        },
+        "$max": {"last_activity": NOW},
+    }
+    update = stats.translation_stats_update({"input_text": "hi"}, NOW)
+    assert update["$inc"]["languages.es.translated"] == 1
+
+
+@pytest.fixture(name="mongo_db")
+def fixture_mongo_db():
+    """A throwaway database on the MongoDB at TEST_MONGO_URI."""
+    if not os.getenv("TEST_MONGO_URI"):
+        pytest.skip("TEST_MONGO_URI is not set")
+    client = MongoClient(os.environ["TEST_MONGO_URI"], serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"No MongoDB at TEST_MONGO_URI: {e}")
+    name = f"test_stats_{uuid.uuid4().hex}"
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+def test_rebuild_pipeline_merges_live_and_archived_records():
+    """Test that the rebuild reads both collections and replaces the stats documents."""
+    pipeline = stats.rebuild_pipeline()
+    assert pipeline[1]["$unionWith"]["coll"] == "sensor_data_archive"
+    assert pipeline[-1]["$merge"]["into"] == "user_stats"
+    assert pipeline[-1]["$merge"]["whenMatched"] == "replace"
+
+
+def test_rebuild_counts_live_and_archived_records(mongo_db):
+    """Test that a rebuild counts live and archived records and replaces the stats."""
+    earlier = NOW - datetime.timedelta(days=1)
+    mongo_db.sensor_data.insert_many(
+        [
+            {
+                "user_id": "user-1",
+                "input_text": "hello",
+                "target_languages": ["fr", "de"],
+                "translated_text": "bonjour",
+                "timestamp": earlier,
+                "translated_timestamp": NOW,
+            },
+            {
+                "user_id": "user-1",
+                "input_text": "oops",
+                "target_languages": ["fr", "xx"],
+                "status": "failed",
+                "timestamp": earlier,
+                "failed_at": earlier,
+            },
+            {"user_id": "user-2", "input_text": "hi", "timestamp": NOW},
+            {"input_text": "anonymous", "translated_text": "anonyme", "timestamp": NOW},
+        ]
+    )
+    mongo_db.sensor_data_archive.insert_one(
+        {
+            "user_id": "user-1",
+            "input_text": "old",
+            "translated_text": "viejo",
+            "timestamp": earlier,
+        }
+    )
+    # drifted totals are replaced, not added to
+    mongo_db.user_stats.insert_one({"_id": "user-1", "submitted": 99, "stale": True})
+
+    stats.rebuild_stats(mongo_db)
+
+    user_1, user_2 = mongo_db.user_stats.find().sort("_id")
+    assert user_1 == {
+        "_id": "user-1",
+        "submitted": 3,
+        "translated": 2,
+        "characters_translated": 2 * len("hello") + len("old"),
+        "failures": 1,
+        "languages": {
+            "fr": {"submitted": 2, "translated": 1},
+            "de": {"submitted": 1, "translated": 1},
+            "xx": {"submitted": 1, "translated": 0},
+            "es": {"submitted": 1, "translated": 1},
+        },
+        "last_activity": NOW,
+    }
+    assert user_2["submitted"] == 1 and user_2["translated"] == 0
+    assert user_2["languages"] == {"es": {"submitted": 1, "translated": 0}}
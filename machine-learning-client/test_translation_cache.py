@@ -0,0 +1,70 @@
+# pylint: disable=r0903,w0613
+"""
+Testing for the translation cache (translation_cache.py).
+
+This file contains unit tests for the in-process LRU tier and for the
+persistent tier, which is simulated with a dummy collection.
+"""
+
+import time
+from translation_cache import LRUCache, TranslationCache, cache_key
+
+
+class DummyCacheCollection:
+    """A dummy collection holding cache entries keyed by '_id'."""
+
+    def __init__(self):
+        """Initialize the DummyCacheCollection with an empty document map."""
+        self.docs = {}
+
+    def find_one(self, query, projection=None):
+        """Return the entry with a matching '_id'."""
+        return self.docs.get(query["_id"])
+
+    def update_one(self, query, update, upsert=False):
+        """Apply a '$set' to the entry with a matching '_id'."""
+        self.docs.setdefault(query["_id"], {"_id": query["_id"]}).update(update["$set"])
+
+
+def test_cache_key_normalizes_whitespace():
+    """Equivalent texts share a key, different target languages do not."""
+    assert cache_key("Hello,  how are you? ", "es") == cache_key(
+        "Hello, how are you?", "es"
+    )
+    assert cache_key("Hello", "es") != cache_key("Hello", "fr")
+
+
+def test_lru_evicts_least_recently_used():
+    """The least recently used entry is evicted once the cache is full."""
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.evictions == 1
+
+
+def test_lru_expires_entries():
+    """Entries older than the ttl are treated as misses."""
+    cache = LRUCache(max_size=2, ttl=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+
+
+def test_persistent_tier_backs_the_memory_tier():
+    """A translation stored by one worker is found by another through the collection."""
+    collection = DummyCacheCollection()
+    TranslationCache(collection).put("Hello", "es", "Hola")
+
+    other_worker = TranslationCache(collection)
+    assert other_worker.get("Hello", "es") == "Hola"
+    assert other_worker.get("Hello", "es") == "Hola"
+    assert other_worker.get("Hello", "fr") is None
+    stats = other_worker.stats()
+    assert stats["persistent_hits"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 1
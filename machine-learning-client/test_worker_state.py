@@ -0,0 +1,46 @@
+"""
+Testing for the worker's bookkeeping in worker_state (worker_state.py).
+
+This file runs it against the dummy collections of test_main.py.
+"""
+
+from types import SimpleNamespace
+import pytest
+import worker_state
+from test_main import DummyCollection, DummyStateCollection
+
+
+@pytest.fixture(name="db")
+def fixture_db():
+    """A dummy database with no worker state yet."""
+    return SimpleNamespace(
+        sensor_data=DummyCollection(), worker_state=DummyStateCollection()
+    )
+
+
+def test_backfill_gives_legacy_records_a_status(db):
+    """
+    Verify that records written before the 'status' field existed are marked
+    pending or translated exactly once, and that the change is visible to
+    the web app's validators.
+    """
+    db.sensor_data.data = [
+        {"_id": 1, "input_text": "old"},
+        {"_id": 2, "input_text": "done", "translated_text": "fait"},
+    ]
+    worker_state.backfill_pending_status(db)
+    assert [doc["status"] for doc in db.sensor_data.data] == ["pending", "translated"]
+    assert all("updated_at" in doc for doc in db.sensor_data.data)
+
+    db.sensor_data.data.append({"_id": 3, "input_text": "new"})
+    worker_state.backfill_pending_status(db)
+    assert "status" not in db.sensor_data.data[2]
+
+
+def test_resume_token_is_saved_and_cleared(db):
+    """Verify that a saved resume token is loaded back until it is cleared."""
+    assert worker_state.load_resume_token(db) is None
+    worker_state.save_resume_token(db, {"_data": "token-1"})
+    assert worker_state.load_resume_token(db) == {"_data": "token-1"}
+    worker_state.clear_resume_token(db)
+    assert worker_state.load_resume_token(db) is None
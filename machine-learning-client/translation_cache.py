@@ -0,0 +1,141 @@
+"""
+Two-tier cache of translations for the ML client.
+
+Translations are keyed on the normalized input text and the target language.
+The first tier is an in-process LRU bounded by size and age; the second is
+the persistent 'translation_cache' collection shared by every worker.
+"""
+
+import time
+import hashlib
+import datetime
+import threading
+import unicodedata
+from collections import OrderedDict
+from pymongo.errors import PyMongoError
+
+
+def normalize_text(text):
+    """Normalizes unicode and collapses whitespace so equivalent inputs share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text, target_language):
+    """Returns the cache key for a text and target language."""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{target_language}:{digest}"
+
+
+class LRUCache:
+    """A thread-safe LRU cache whose entries also expire after 'ttl' seconds."""
+
+    def __init__(self, max_size, ttl):
+        """A max_size of zero disables the cache."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Returns the cached value for a key, or None if it is missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Caches a value, evicting the least recently used entries past max_size."""
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class TranslationCache:
+    """
+    Looks translations up in the in-process LRU, then in the persistent
+    collection, and keeps hit/miss/eviction counters for both tiers.
+    """
+
+    def __init__(self, collection, max_size=10000, ttl=3600):
+        """Initialize the cache over a MongoDB collection (or None for memory only)."""
+        self.collection = collection
+        self.memory = LRUCache(max_size, ttl)
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, text, target_language):
+        """Returns the cached translation of a text, or None on a miss."""
+        key = cache_key(text, target_language)
+        translated_text = self.memory.get(key)
+        if translated_text is not None:
+            with self.lock:
+                self.memory_hits += 1
+            return translated_text
+        if self.collection is not None:
+            try:
+                entry = self.collection.find_one({"_id": key}, {"translated_text": 1})
+            except PyMongoError as e:
+                print(f"Translation cache lookup failed: {e}")
+                entry = None
+            if entry is not None:
+                with self.lock:
+                    self.persistent_hits += 1
+                self.memory.put(key, entry["translated_text"])
+                return entry["translated_text"]
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, target_language, translated_text):
+        """Stores a translation in both tiers."""
+        key = cache_key(text, target_language)
+        self.memory.put(key, translated_text)
+        if self.collection is None:
+            return
+        try:
+            self.collection.update_one(
+                {"_id": key},
+                {
+                    "$set": {
+                        "text": normalize_text(text),
+                        "target_language": target_language,
+                        "translated_text": translated_text,
+                        "created_at": datetime.datetime.now(),
+                    }
+                },
+                upsert=True,
+            )
+        except PyMongoError as e:
+            print(f"Translation cache write failed: {e}")
+
+    def stats(self):
+        """Returns the cache counters."""
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations,
+            "size": len(self.memory),
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+        }
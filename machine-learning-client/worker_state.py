@@ -0,0 +1,62 @@
+"""
+Bookkeeping of the translation worker in the 'worker_state' collection.
+
+Remembers where the sensor_data change stream left off, so a restarted
+worker resumes it instead of missing inserts, and which one-off migrations
+of existing records have already run.
+"""
+
+import datetime
+
+# document in worker_state that remembers where the change stream left off
+STREAM_STATE_ID = "sensor_data_stream"
+
+# worker_state document recording that legacy records were given a status
+STATUS_BACKFILL_ID = "status_backfill"
+
+
+def backfill_pending_status(db):
+    """
+    Gives records written before sensor_data had a 'status' field the status
+    the pending query and its partial index rely on. Runs once per database.
+    """
+    if db.worker_state.find_one({"_id": STATUS_BACKFILL_ID}):
+        return
+    now = datetime.datetime.now()
+    for translated in (False, True):
+        db.sensor_data.update_many(
+            {
+                "status": {"$exists": False},
+                "input_text": {"$exists": True},
+                "translated_text": {"$exists": translated},
+            },
+            {
+                "$set": {
+                    "status": "translated" if translated else "pending",
+                    "updated_at": now,
+                }
+            },
+        )
+    db.worker_state.update_one(
+        {"_id": STATUS_BACKFILL_ID}, {"$set": {"completed_at": now}}, upsert=True
+    )
+
+
+def load_resume_token(db):
+    """Returns the last saved change stream resume token, or None."""
+    state = db.worker_state.find_one({"_id": STREAM_STATE_ID})
+    return state.get("resume_token") if state else None
+
+
+def save_resume_token(db, token):
+    """Saves the change stream resume token so a restart picks up where it left off."""
+    db.worker_state.update_one(
+        {"_id": STREAM_STATE_ID},
+        {"$set": {"resume_token": token, "updated_at": datetime.datetime.now()}},
+        upsert=True,
+    )
+
+
+def clear_resume_token(db):
+    """Forgets the saved resume token so the next stream starts from now."""
+    db.worker_state.delete_one({"_id": STREAM_STATE_ID})
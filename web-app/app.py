@@ -2,71 +2,265 @@
 Web Application for Microphone Translation.
 
 This Flask app connects to a MongoDB database and handles routes
- to interact with the microphone translation app.
+ to interact with the microphone translation app. create_app() builds the
+ app; its MongoDB connections open on first use, so the app can be created
+ before a pre-fork server such as gunicorn forks its worker processes.
 """
 
 import os
+import re
+import atexit
+import time
+import threading
+import queue
 import datetime
+from concurrent import futures
 from flask import (
+    Blueprint,
     Flask,
+    g,
     render_template,
     redirect,
     url_for,
     jsonify,
     request,
+    Response,
     session,
     flash,
 )
 from flask_pymongo import PyMongo
+from pymongo.errors import BulkWriteError, PyMongoError
 from dotenv import load_dotenv
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.local import LocalProxy
 from werkzeug.security import generate_password_hash, check_password_hash
 from bson import ObjectId
+from bson.errors import InvalidId
+from notifier import TranslationNotifier
+from records import (
+    API_MAX_PAGE_SIZE,
+    API_PAGE_SIZE,
+    after_cursor,
+    format_cursor,
+    language_progress,
+    parse_cursor,
+    record_json,
+    record_state,
+    sensor_data_request,
+    sensor_record_request,
+    serialize_record,
+    still_pending,
+    translation_event,
+)
+from indexes import KEYSET_SORT
+from feed_cache import WriteInvalidatedCache
+from content_encoding import compress_response
+from conditional import conditional, make_etag, query_validators
+from write_buffer import BufferClosed, BufferFull, GroupCommitBuffer
+from metrics import CONTENT_TYPE, REGISTRY, CommandTimer, Counter, Gauge, Histogram
 
 load_dotenv()
 
-app = Flask(__name__)
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "fallback_key_if_missing")
-app.config["MONGO_URI"] = os.getenv("MONGO_URI")
-mongo = PyMongo(app)
+# bound to a MongoClient by create_app()
+mongo = PyMongo()
+
+# defining collections, resolved against the client on each use
+users_collection = LocalProxy(lambda: mongo.db.users)  # registration
+# sensor data and translations
+sensor_data_collection = LocalProxy(lambda: mongo.db.sensor_data)
+# translations past retention, moved there by the ML client
+sensor_data_archive_collection = LocalProxy(lambda: mongo.db.sensor_data_archive)
+# per-user totals, see count_submissions() and the ML client's stats.py
+user_stats_collection = LocalProxy(lambda: mongo.db.user_stats)
+
+bp = Blueprint("main", __name__)
+
+ACCOUNT_PAGE_SIZE = 20
+# fields the account page renders
+HISTORY_PROJECTION = {
+    "input_text": 1,
+    "translated_text": 1,
+    "target_language": 1,
+    "timestamp": 1,
+    "translated_timestamp": 1,
+}
+# fields listed for dead-lettered records
+DEAD_LETTER_PROJECTION = {
+    "input_text": 1,
+    "target_language": 1,
+    "timestamp": 1,
+    "user_id": 1,
+    "attempts": 1,
+    "last_error": 1,
+    "failed_at": 1,
+}
+USER_PROJECTION = {"first_name": 1, "last_name": 1, "email": 1}
+# fields of a user_stats document
+STATS_FIELDS = (
+    "submitted",
+    "translated",
+    "characters_translated",
+    "failures",
+    "languages",
+)
+# upper bound of a long-poll on a record's translation; the notifier wakes
+# it on every change to the record, and it re-reads the record at least
+# every LONG_POLL_INTERVAL seconds for changes the notifier cannot see
+# while it polls (then only translations reach it)
+LONG_POLL_MAX_SECONDS = 30
+LONG_POLL_INTERVAL = 5
+# seconds between keep-alive comments on an idle event stream
+SSE_HEARTBEAT_SECONDS = 15
+
+# smallest buffered response worth compressing, in bytes
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+# scheduling priority of a record, lower is translated sooner
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_SIMULATED = 2
+
+# most target languages one submission may ask for
+MAX_TARGET_LANGUAGES = int(os.getenv("MAX_TARGET_LANGUAGES", "10"))
+# a language code such as "es" or "zh-cn"; also keys the per-user statistics
+LANGUAGE_CODE = re.compile(r"[A-Za-z]{2,3}(-[A-Za-z0-9]{2,8})*")
+
+# longest input_text of one submission, in characters
+SUBMIT_TEXT_MAX_CHARS = int(os.getenv("SUBMIT_TEXT_MAX_CHARS", "10000"))
+# largest /submit_text body, in bytes: room for SUBMIT_TEXT_MAX_CHARS in UTF-8
+SUBMIT_TEXT_MAX_BYTES = int(os.getenv("SUBMIT_TEXT_MAX_BYTES", str(64 * 1024)))
+# limits of one /submit_batch request
+SUBMIT_BATCH_MAX_ITEMS = int(os.getenv("SUBMIT_BATCH_MAX_ITEMS", "500"))
+SUBMIT_BATCH_MAX_BYTES = int(os.getenv("SUBMIT_BATCH_MAX_BYTES", str(1024 * 1024)))
+
+# "direct" inserts each /submit_text on its own, "buffered" group-commits them
+INGEST_MODE = os.getenv("INGEST_MODE", "direct")
+# how long a buffered /submit_text waits for its batch to be acknowledged
+INGEST_ACK_TIMEOUT = float(os.getenv("INGEST_ACK_TIMEOUT", "10"))
+
+# one shared watcher fans translations out to every open event stream
+notifier = TranslationNotifier(lambda: sensor_data_collection)
+
+# fields the /home feed renders
+RECENT_PROJECTION = {
+    "input_text": 1,
+    "translated_text": 1,
+    "target_language": 1,
+    "translator": 1,
+    "timestamp": 1,
+}
+
+
+def load_recent_translations():
+    """Query and format the ten newest records for the /home feed."""
+    recent_translations = list(
+        sensor_data_collection.find({}, RECENT_PROJECTION).sort(KEYSET_SORT).limit(10)
+    )
+    for record in recent_translations:
+        record["_id"] = str(record["_id"])
+        if "timestamp" in record:
+            record["timestamp"] = record["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
+    return recent_translations
+
+
+# shared by every /home request until a write invalidates it
+recent_translations_cache = WriteInvalidatedCache(
+    load_recent_translations,
+    max_staleness=float(os.getenv("HOME_FEED_MAX_STALENESS", "60")),
+)
+notifier.add_listener(recent_translations_cache.invalidate)
+
+write_buffer = GroupCommitBuffer(
+    lambda: sensor_data_collection,
+    max_batch=int(os.getenv("INGEST_MAX_BATCH", "100")),
+    max_delay=float(os.getenv("INGEST_MAX_DELAY_MS", "5")) / 1000,
+    max_pending=int(os.getenv("INGEST_MAX_PENDING", "10000")),
+)
+atexit.register(write_buffer.close)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to first byte of HTTP requests by route.",
+    ["method", "route", "status"],
+)
+Counter(
+    "home_feed_cache_lookups_total",
+    "Lookups of the cached /home feed by result.",
+    ["result"],
+    function=lambda: {
+        (result,): count for result, count in recent_translations_cache.counters.items()
+    },
+)
+Gauge(
+    "event_stream_subscribers",
+    "Open /api/stream connections in this process.",
+    function=notifier.subscriber_count,
+)
+Gauge(
+    "ingest_buffer_pending",
+    "Submissions waiting in the group-commit buffer.",
+    function=lambda: len(write_buffer),
+)
+
 
-# defining collections
-users_collection = mongo.db.users  # registration
-sensor_data_collection = mongo.db.sensor_data  # sensor data and translations
+@bp.before_app_request
+def start_request_timer():
+    """Remember when the request started for REQUEST_SECONDS."""
+    g.request_started = time.perf_counter()
 
 
-@app.route("/")
+@bp.after_app_request
+def observe_request_duration(response):
+    """Record the request duration under its route pattern."""
+    if "request_started" in g:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - g.request_started,
+            method=request.method,
+            route=request.url_rule.rule if request.url_rule else "unmatched",
+            status=response.status_code,
+        )
+    return response
+
+
+@bp.after_app_request
+def compress(response):
+    """Compress HTML and JSON responses for clients that accept brotli or gzip."""
+    return compress_response(response, request.accept_encodings, COMPRESS_MIN_BYTES)
+
+
+@bp.route("/")
 def home():
     """First page for the web app."""
     return render_template("login.html")
 
 
-@app.route("/home")
+@bp.route("/home")
 def index():
     """First page for logged in users that shows quick links and recent translations."""
     if not session.get("username"):
         flash("You must be logged in to view this page.", "warning")
-        return redirect(url_for("login"))
-    recent_translations = list(
-        mongo.db.sensor_data.find({}).sort("timestamp", -1).limit(10)
+        return redirect(url_for("main.login"))
+    # the notifier invalidates the feed when any process writes sensor_data
+    notifier.start()
+    recent_translations = recent_translations_cache.get()
+    return conditional(
+        make_etag(recent_translations),
+        None,
+        lambda: render_template("index.html", recent_translations=recent_translations),
     )
-    for record in recent_translations:
-        record["_id"] = str(record["_id"])
-        if "timestamp" in record:
-            record["timestamp"] = record["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-    return render_template("index.html", recent_translations=recent_translations)
 
 
-@app.route("/translator")
+@bp.route("/translator")
 def translator():
     """Translate page"""
     # check if logged
     if not session.get("username"):
         flash("You must be logged in to access the translator.", "warning")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
     return render_template("translator.html")
 
 
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     """Sign in page"""
     # authenticate user
@@ -78,15 +272,15 @@ def register():
         confirm_password = request.form.get("confirm_password")
         if not (first_name and last_name and email and password and confirm_password):
             flash("All fields are required.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
         if password != confirm_password:
             flash("Passwords do not match.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
         # check if  user already exists
         existing_user = users_collection.find_one({"email": email})
         if existing_user:
             flash("User already exists with that email.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
         # create a new user
         new_user = {
             "first_name": first_name,
@@ -101,12 +295,12 @@ def register():
         session["username"] = user["email"]
         flash("Registration successful! You can now log in.", "success")
         # redirect to login page
-        return redirect(url_for("index"))
+        return redirect(url_for("main.index"))
     # get request; render registration form
     return render_template("register.html")
 
 
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     """Login page"""
     # when user authenticated
@@ -120,91 +314,603 @@ def login():
             session["username"] = user["email"]
             flash("Logged in successfully!", "success")
             # redirect to translate page
-            return redirect(url_for("translator"))
+            return redirect(url_for("main.translator"))
         flash("Invalid email or password.", "danger")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
     # get request; render login page
     return render_template("login.html")
 
 
-@app.route("/logout", methods=["GET"])
+@bp.route("/logout", methods=["GET"])
 def logout():
     """Logout Functionality"""
     session.clear()
     flash("Logged out successfully.", "success")
     # logout user with flask login
-    return redirect(url_for("home"))
+    return redirect(url_for("main.home"))
+
+
+def keyset_page(query, projection, cursor_arg, limit, collections=None):
+    """
+    Fetch one page of sensor_data records matching a query, newest first,
+    merged across 'collections' (default: sensor_data only). Returns the
+    serialized records and the cursor of the next page (None on the last
+    page). Raises ValueError on a malformed cursor.
+    """
+    if cursor_arg:
+        query = after_cursor(query, parse_cursor(cursor_arg))
+    # one extra record tells whether another page follows
+    records = []
+    for collection in collections or [sensor_data_collection]:
+        records.extend(
+            collection.find(query, projection).sort(KEYSET_SORT).limit(limit + 1)
+        )
+    if collections:
+        records.sort(key=lambda record: (record["timestamp"], record["_id"]))
+        records.reverse()
+    next_cursor = format_cursor(records[limit - 1]) if len(records) > limit else None
+    return [serialize_record(record) for record in records[:limit]], next_cursor
+
+
+def user_history_page(user_id, cursor_arg=None, limit=ACCOUNT_PAGE_SIZE):
+    """
+    Fetch one page of a user's translations, newest first, with only the
+    fields the history views show, including those moved to the archive.
+    See keyset_page().
+    """
+    return keyset_page(
+        {"user_id": user_id},
+        HISTORY_PROJECTION,
+        cursor_arg,
+        limit,
+        [sensor_data_collection, sensor_data_archive_collection],
+    )
 
 
-@app.route("/account")
+def user_stats(user_id):
+    """
+    Return a user's translation statistics: totals, {language: counts} and
+    the last activity, zeroed for a user without any.
+    """
+    document = user_stats_collection.find_one({"_id": user_id}) or {}
+    result = {field: document.get(field, 0) for field in STATS_FIELDS}
+    result["languages"] = document.get("languages", {})
+    last_activity = document.get("last_activity")
+    result["last_activity"] = last_activity.isoformat() if last_activity else None
+    return result
+
+
+@bp.route("/account")
 def account():
-    """User account page that shows past translations."""
+    """
+    User account page that shows the user's statistics and one page of past
+    translations. Its validators come from the statistics' last activity,
+    which every submission and translation of the user moves forward.
+    """
     if not session.get("username"):
         flash("You must be logged in to view your account.", "warning")
-        return redirect(url_for("login"))
-    # Fetch this user's translations by filtering with session["user_id"]
-    user = users_collection.find_one({"_id": ObjectId(session.get("user_id"))})
-    user_translations = list(
-        sensor_data_collection.find({"user_id": session.get("user_id")}).sort(
-            "timestamp", -1
+        return redirect(url_for("main.login"))
+    totals = user_stats(session.get("user_id"))
+    last_activity = (
+        datetime.datetime.fromisoformat(totals["last_activity"])
+        if totals["last_activity"]
+        else None
+    )
+
+    def render_account():
+        # Fetch this user's translations by filtering with session["user_id"]
+        user = users_collection.find_one(
+            {"_id": ObjectId(session.get("user_id"))}, USER_PROJECTION
         )
+        try:
+            user_translations, next_cursor = user_history_page(
+                session.get("user_id"), request.args.get("cursor")
+            )
+        except ValueError:
+            return redirect(url_for("main.account"))
+        return render_template(
+            "account.html",
+            user=user,
+            stats=totals,
+            translations=user_translations,
+            next_cursor=next_cursor,
+            paged=bool(request.args.get("cursor")),
+        )
+
+    return conditional(
+        make_etag(session.get("user_id"), totals), last_activity, render_account
     )
-    for record in user_translations:
-        record["_id"] = str(record["_id"])
-        if "timestamp" in record:
-            record["timestamp"] = record["timestamp"].isoformat()
-        if "translated_timestamp" in record:
-            record["translated_timestamp"] = record["translated_timestamp"].isoformat()
-    return render_template("account.html", user=user, translations=user_translations)
+
+
+@bp.route("/api/account/translations", methods=["GET"])
+def account_translations():
+    """JSON page of the logged-in user's translations; ?cursor= continues, ?limit= sizes."""
+    if not session.get("user_id"):
+        return jsonify({"error": "Login required"}), 401
+    limit = min(
+        max(request.args.get("limit", ACCOUNT_PAGE_SIZE, type=int), 1),
+        API_MAX_PAGE_SIZE,
+    )
+    try:
+        translations, next_cursor = user_history_page(
+            session["user_id"], request.args.get("cursor"), limit
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"translations": translations, "next_cursor": next_cursor})
+
+
+@bp.route("/api/stats", methods=["GET"])
+def stats():
+    """The logged-in user's translation statistics."""
+    if not session.get("user_id"):
+        return jsonify({"error": "Login required"}), 401
+    return jsonify(user_stats(session["user_id"]))
 
 
 # Endpoints for sensor/translation data
-@app.route("/api/sensor_data", methods=["GET"])
+@bp.route("/api/sensor_data", methods=["GET"])
 def get_sensor_data():
-    """Get sensor data from MongoDB."""
-    sensor_data = list(mongo.db.sensor_data.find({}))
-    for record in sensor_data:
-        record["_id"] = str(record["_id"])
-        if "timestamp" in record:
-            record["timestamp"] = record["timestamp"].isoformat()
-    return jsonify(sensor_data)
+    """
+    Get a page of sensor data from MongoDB, newest first, streamed from the
+    cursor as a JSON array (or NDJSON with ?format=ndjson).
+
+    Supports ?limit=, ?fields=, the filters ?user_id=, ?target_language=,
+    ?status=translated|pending|failed, ?since= and ?until= (ISO timestamps), and
+    ?cursor=<timestamp>,<_id> of the last record of the previous page. Answers
+    304 Not Modified while no record in scope was added or translated.
+    """
+    try:
+        query, projection, limit = sensor_data_request(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def page():
+        records = (
+            sensor_data_collection.find(query, projection)
+            .sort(KEYSET_SORT)
+            .limit(limit)
+        )
+        if request.args.get("format") == "ndjson":
+            lines = (record_json(record) + "\n" for record in records)
+            return Response(lines, mimetype="application/x-ndjson")
+
+        def json_array():
+            yield "["
+            for position, record in enumerate(records):
+                yield ("," if position else "") + record_json(record)
+            yield "]"
+
+        return Response(json_array(), mimetype="application/json")
+
+    etag, last_modified = query_validators(sensor_data_collection, query)
+    return conditional(etag, last_modified, page)
+
 
+@bp.route("/api/sensor_data/<record_id>", methods=["GET"])
+def get_sensor_record(record_id):
+    """
+    Get a single sensor data record. ?fields= limits the returned fields and
+    ?wait=<seconds> holds the request until the record is translated,
+    dead-lettered or the wait expires. Records with several target languages
+    also report the status of each under 'languages', and a wait returns as
+    soon as another language is translated.
+    """
+    try:
+        query, projection, lookup = sensor_record_request(record_id, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    wait = min(request.args.get("wait", 0, type=float), LONG_POLL_MAX_SECONDS)
+    deadline = time.monotonic() + wait
+    changed = threading.Event()
 
-@app.route("/simulate_input", methods=["GET"])
+    def wake(_record):
+        changed.set()
+
+    # listen before the first read, so no change after it is missed
+    if wait > 0:
+        notifier.add_record_listener(query["_id"], wake)
+    try:
+        record = sensor_data_collection.find_one(query, lookup)
+        progress = record and language_progress(record)
+        while still_pending(record, progress) and time.monotonic() < deadline:
+            changed.wait(min(deadline - time.monotonic(), LONG_POLL_INTERVAL))
+            changed.clear()
+            record = sensor_data_collection.find_one(query, lookup)
+    finally:
+        notifier.remove_record_listener(query["_id"], wake)
+    if record is None:
+        return jsonify({"error": "Record not found"}), 404
+    return jsonify(record_state(record, projection))
+
+
+@bp.route("/api/dead_letters", methods=["GET"])
+def dead_letters():
+    """
+    JSON page of the logged-in user's dead-lettered records, whose
+    translation the worker gave up on after MAX_ATTEMPTS failures, newest
+    first. ?target_language= filters, ?cursor= continues and ?limit= sizes
+    the page.
+    """
+    if not session.get("user_id"):
+        return jsonify({"error": "Login required"}), 401
+    query = {"user_id": session["user_id"], "status": "failed"}
+    if request.args.get("target_language"):
+        query["target_language"] = request.args["target_language"]
+    limit = min(
+        max(request.args.get("limit", API_PAGE_SIZE, type=int), 1), API_MAX_PAGE_SIZE
+    )
+    try:
+        records, next_cursor = keyset_page(
+            query, DEAD_LETTER_PROJECTION, request.args.get("cursor"), limit
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"records": records, "next_cursor": next_cursor})
+
+
+@bp.route("/api/dead_letters/<record_id>/requeue", methods=["POST"])
+def requeue_dead_letter(record_id):
+    """
+    Returns one of the logged-in user's dead-lettered records to the pending
+    queue with a fresh attempt budget, e.g. after the cause of its failures
+    was fixed.
+    """
+    if not session.get("user_id"):
+        return jsonify({"error": "Login required"}), 401
+    try:
+        query = {
+            "_id": ObjectId(record_id),
+            "user_id": session["user_id"],
+            "status": "failed",
+        }
+    except InvalidId:
+        return jsonify({"error": "Invalid record id"}), 400
+    now = datetime.datetime.now()
+    result = sensor_data_collection.update_one(
+        query,
+        {
+            # due now, so the worker's next retry sweep picks it up
+            "$set": {
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": now,
+                "updated_at": now,
+            },
+            "$unset": {"failed_at": "", "last_error": ""},
+        },
+    )
+    if not result.matched_count:
+        return jsonify({"error": "Dead-lettered record not found"}), 404
+    return jsonify({"message": "Record requeued", "id": record_id})
+
+
+@bp.route("/api/stream", methods=["GET"])
+def stream_translations():
+    """Server-Sent Events stream of the logged-in user's records as they get translated."""
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Login required"}), 401
+    subscription = notifier.subscribe(user_id)
+
+    def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    record = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield translation_event(record)
+        finally:
+            notifier.unsubscribe(user_id, subscription)
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus metrics of the worker process that answers, see
+    WEB_METRICS_PORT in gunicorn.conf.py for every worker's.
+    """
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@bp.route("/simulate_input", methods=["GET"])
 def simulate_input():
     """Simulate a test document in MongoDB."""
+    now = datetime.datetime.now()
     test_document = {
         "input_text": "Hello, world! How are you?",
         "target_language": "es",
-        "timestamp": datetime.datetime.now(),
+        "timestamp": now,
+        "updated_at": now,
+        "status": "pending",
+        "priority": PRIORITY_SIMULATED,
     }
-    result = mongo.db.sensor_data.insert_one(test_document)
+    result = sensor_data_collection.insert_one(test_document)
+    recent_translations_cache.invalidate()
     return jsonify({"message": "Test document inserted", "id": str(result.inserted_id)})
 
 
-@app.route("/submit_text", methods=["POST"])
-def submit_text():
-    """Backend function to receive user-submitted text (from microphone)"""
-    data = request.get_json()
-    input_text = data.get("input_text")
-    target_language = data.get("target_language", "es")
-    if not input_text:
-        return jsonify({"error": "Input text is required"}), 400
-    # Build the document and include a user identifier if logged in
+def requested_languages(item):
+    """
+    Returns the target languages a submission asks for: its
+    'target_languages' list, or else its 'target_language' ("es" by
+    default). Raises ValueError on invalid values.
+    """
+    if "target_languages" in item:
+        languages = item["target_languages"]
+        if not isinstance(languages, list) or not languages:
+            raise ValueError("Target languages must be a non-empty list")
+        if len(languages) > MAX_TARGET_LANGUAGES:
+            raise ValueError(f"At most {MAX_TARGET_LANGUAGES} target languages")
+    else:
+        languages = [item.get("target_language", "es")]
+    if not all(
+        isinstance(language, str) and LANGUAGE_CODE.fullmatch(language)
+        for language in languages
+    ):
+        raise ValueError("Target languages must be language codes such as 'es'")
+    return list(dict.fromkeys(languages))
+
+
+def submission_document(
+    input_text,
+    target_languages,
+    timestamp=None,
+    priority=PRIORITY_INTERACTIVE,
+    user_session=None,
+):
+    """
+    Builds a pending sensor_data record, including the user if logged in to
+    'user_session' (default: this request's session). 'target_language'
+    holds the first of the target languages; records with several also
+    list them all under 'target_languages'.
+    """
+    user_session = session if user_session is None else user_session
+    timestamp = timestamp or datetime.datetime.now()
     document = {
         "input_text": input_text,
-        "target_language": target_language,
-        "timestamp": datetime.datetime.now(),
+        "target_language": target_languages[0],
+        "timestamp": timestamp,
+        "updated_at": timestamp,
+        "status": "pending",
+        "priority": priority,
     }
-    if session.get("user_id"):
-        document["user_id"] = session.get("user_id")
-    if session.get("username"):
-        document["translator"] = session.get("username")
-    result = mongo.db.sensor_data.insert_one(document)
-    return jsonify(
-        {"message": "Text submitted successfully", "id": str(result.inserted_id)}
+    if len(target_languages) > 1:
+        document["target_languages"] = target_languages
+    if user_session.get("user_id"):
+        document["user_id"] = user_session.get("user_id")
+    if user_session.get("username"):
+        document["translator"] = user_session.get("username")
+    return document
+
+
+def count_submissions(documents):
+    """
+    Add submitted records to their user's statistics with one atomic $inc.
+    Statistics are best effort: a failed write is logged, and the ML client's
+    'python stats.py' rebuild repairs the drift.
+    """
+    user_id = session.get("user_id")
+    if not user_id or not documents:
+        return
+    try:
+        user_stats_collection.update_one(
+            {"_id": user_id}, submission_stats_update(documents), upsert=True
+        )
+    except PyMongoError as e:
+        print(f"Could not count submissions of user {user_id}: {e}")
+
+
+def submission_stats_update(documents):
+    """Return the user_stats update adding submitted records to their user's totals."""
+    increments = {"submitted": len(documents)}
+    for document in documents:
+        for language in document.get("target_languages") or [
+            document["target_language"]
+        ]:
+            key = f"languages.{language}.submitted"
+            increments[key] = increments.get(key, 0) + 1
+    return {
+        "$inc": increments,
+        "$max": {"last_activity": max(doc["timestamp"] for doc in documents)},
+    }
+
+
+def submission_error(item):
+    """
+    Returns why a submission, of /submit_text or a /submit_batch item, is
+    invalid, or None if it is valid.
+    """
+    if not isinstance(item, dict):
+        return "Expected a JSON object"
+    if not item.get("input_text") or not isinstance(item["input_text"], str):
+        return "Input text is required"
+    if len(item["input_text"]) > SUBMIT_TEXT_MAX_CHARS:
+        return f"Input text exceeds {SUBMIT_TEXT_MAX_CHARS} characters"
+    try:
+        requested_languages(item)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+@bp.route("/submit_text", methods=["POST"])
+def submit_text():
+    """Backend function to receive user-submitted text (from microphone)"""
+    request.max_content_length = SUBMIT_TEXT_MAX_BYTES
+    data = request.get_json(silent=True)
+    error = submission_error(data)
+    if error:
+        return jsonify({"error": error}), 400
+    document = submission_document(data["input_text"], requested_languages(data))
+    if INGEST_MODE == "buffered":
+        try:
+            inserted_id = write_buffer.submit(document).result(INGEST_ACK_TIMEOUT)
+        except (BufferFull, BufferClosed, PyMongoError, futures.TimeoutError) as e:
+            print(f"Could not store submission: {e}")
+            return jsonify({"error": "Could not store the text, try again"}), 503
+    else:
+        inserted_id = sensor_data_collection.insert_one(document).inserted_id
+    count_submissions([document])
+    recent_translations_cache.invalidate()
+    return jsonify({"message": "Text submitted successfully", "id": str(inserted_id)})
+
+
+@bp.route("/submit_batch", methods=["POST"])
+def submit_batch():
+    """
+    Receives many utterances at once, e.g. a replayed transcript.
+
+    The body is a JSON array of {input_text, target_language} or
+    {input_text, target_languages} items. Every
+    item is validated before anything is written; the records are then
+    inserted with one unordered insert_many and their ids are returned in
+    input order. If some inserts fail, the answer is 207 with null ids and
+    an error under 'items' for those; if the database cannot be reached,
+    503.
+    """
+    # chunked bodies have no Content-Length to check, so read at most one
+    # byte past the limit; the stream stops there instead of raising
+    request.max_content_length = SUBMIT_BATCH_MAX_BYTES + 1
+    try:
+        too_large = len(request.get_data()) > SUBMIT_BATCH_MAX_BYTES
+    except RequestEntityTooLarge:
+        too_large = True
+    if too_large:
+        return (
+            jsonify({"error": f"Payload exceeds {SUBMIT_BATCH_MAX_BYTES} bytes"}),
+            413,
+        )
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Expected a non-empty JSON array of items"}), 400
+    if len(items) > SUBMIT_BATCH_MAX_ITEMS:
+        return (
+            jsonify({"error": f"At most {SUBMIT_BATCH_MAX_ITEMS} items per batch"}),
+            413,
+        )
+    errors = [
+        {"index": index, "error": error}
+        for index, error in enumerate(map(submission_error, items))
+        if error
+    ]
+    if errors:
+        return jsonify({"error": "Invalid items", "items": errors}), 400
+    # one timestamp for the batch; the _id tie-breaker keeps input order in feeds
+    timestamp = datetime.datetime.now()
+    documents = [
+        submission_document(
+            item["input_text"],
+            requested_languages(item),
+            timestamp,
+            PRIORITY_BULK,
+        )
+        for item in items
+    ]
+    try:
+        ids, failed = insert_batch(documents)
+    except PyMongoError as e:
+        print(f"Could not store a batch of {len(documents)} texts: {e}")
+        return jsonify({"error": "Could not store the texts, try again"}), 503
+    count_submissions([document for document, id_ in zip(documents, ids) if id_])
+    recent_translations_cache.invalidate()
+    body = {"message": f"{len(documents)} texts submitted successfully", "ids": ids}
+    if failed:
+        body["message"] = (
+            f"{len(documents) - len(failed)} of {len(documents)} texts submitted"
+        )
+        body["items"] = failed
+    return jsonify(body), 207 if failed else 200
+
+
+def insert_batch(documents):
+    """
+    Insert a batch's records with one unordered insert_many. Returns their
+    ids in input order, None for those whose insert failed, and the
+    [{index, error}] of the failed ones.
+    """
+    try:
+        result = sensor_data_collection.insert_many(documents, ordered=False)
+        return [str(inserted_id) for inserted_id in result.inserted_ids], []
+    except BulkWriteError as e:
+        print(f"Could not store some of a batch of {len(documents)} texts: {e}")
+        failed = [
+            {"index": error["index"], "error": "Could not store the text"}
+            for error in sorted(
+                e.details.get("writeErrors", []), key=lambda error: error["index"]
+            )
+        ]
+        failed_indexes = {error["index"] for error in failed}
+        # insert_many gave every document its _id before sending it
+        ids = [
+            None if index in failed_indexes else str(document["_id"])
+            for index, document in enumerate(documents)
+        ]
+        return ids, failed
+
+
+# MongoClient options settable from the environment, {setting: (option, type)};
+# unset ones keep the value given in MONGO_URI or the driver's default
+MONGO_CLIENT_SETTINGS = {
+    # connections per worker process; each gunicorn worker has its own pool
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", int),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", int),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", int),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", int),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", int),
+    # e.g. secondaryPreferred to spread reads over a replica set
+    "MONGO_READ_PREFERENCE": ("readPreference", str),
+}
+
+
+def default_config():
+    """Return the app's settings as read from the environment."""
+    config = {
+        "SECRET_KEY": os.getenv("SECRET_KEY", "fallback_key_if_missing"),
+        "MONGO_URI": os.getenv("MONGO_URI"),
+    }
+    for setting, (_, kind) in MONGO_CLIENT_SETTINGS.items():
+        if os.getenv(setting):
+            config[setting] = kind(os.getenv(setting))
+    return config
+
+
+def mongo_client_options(config):
+    """Return the MongoClient keyword arguments set in an app's config."""
+    return {
+        option: config[setting]
+        for setting, (option, _) in MONGO_CLIENT_SETTINGS.items()
+        if config.get(setting) is not None
+    }
+
+
+def create_app(config=None):
+    """
+    Build the web app from the environment's settings, overridden by
+    'config'. The MongoDB client does not connect until the first query,
+    so each process forked after this call opens its own connections.
+    """
+    app = Flask(__name__)
+    app.config.update(default_config())
+    app.config.update(config or {})
+    mongo.init_app(
+        app,
+        connect=False,
+        event_listeners=[CommandTimer()],
+        **mongo_client_options(app.config),
     )
+    app.register_blueprint(bp)
+    return app
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5050)
+    create_app().run(host="0.0.0.0", port=5050)
@@ -0,0 +1,471 @@
+"""
+Async serving tier for the web app.
+
+create_asgi_app() serves the I/O-bound routes (/submit_text, the
+/api/sensor_data pages, the status and long-poll of one record and the
+/api/stream event stream) as coroutines on an asyncio event loop backed by
+pymongo's AsyncMongoClient, so a waiting client costs a coroutine instead
+of a thread. Every other route is handed to the Flask app of create_app()
+on a pool of WEB_THREADS threads. Both tiers read the same signed session
+cookie and share the record helpers, the notifier and the write buffer.
+gunicorn serves it with WEB_MODE=async, see gunicorn.conf.py.
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+from a2wsgi import WSGIMiddleware
+from pymongo import AsyncMongoClient
+from pymongo.errors import PyMongoError
+from werkzeug.datastructures import Headers
+from werkzeug.local import LocalProxy
+from werkzeug.sansio.request import Request
+from werkzeug.sansio.response import Response
+from app import (
+    COMPRESS_MIN_BYTES,
+    INGEST_ACK_TIMEOUT,
+    INGEST_MODE,
+    LONG_POLL_INTERVAL,
+    LONG_POLL_MAX_SECONDS,
+    REQUEST_SECONDS,
+    SSE_HEARTBEAT_SECONDS,
+    SUBMIT_TEXT_MAX_BYTES,
+    create_app,
+    mongo_client_options,
+    notifier,
+    recent_translations_cache,
+    requested_languages,
+    submission_document,
+    submission_error,
+    submission_stats_update,
+    write_buffer,
+)
+from records import (
+    language_progress,
+    record_json,
+    record_state,
+    sensor_data_request,
+    sensor_record_request,
+    still_pending,
+    translation_event,
+)
+from indexes import KEYSET_SORT
+from metrics import CommandTimer
+from conditional import VALIDATOR_LOOKUPS, not_modified, record_validators
+from conditional import set_validators
+from content_encoding import compress_async_chunks, compressor, response_encoding
+from write_buffer import BufferClosed, BufferFull
+
+
+class AsyncMongo:
+    """
+    The AsyncMongoClient of this process. It is created on first use, so it
+    belongs to the worker process and event loop that serve the requests.
+    """
+
+    def __init__(self):
+        self.config = {}
+        self.client = None
+
+    def init_app(self, config):
+        """Use an app's MONGO_URI and MongoClient settings."""
+        self.config = config
+
+    @property
+    def db(self):
+        """The database named in MONGO_URI."""
+        if self.client is None:
+            self.client = AsyncMongoClient(
+                self.config.get("MONGO_URI"),
+                event_listeners=[CommandTimer()],
+                **mongo_client_options(self.config),
+            )
+        return self.client.get_default_database()
+
+    async def close(self):
+        """Close the client's connections, if it was ever used."""
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+
+# bound to the app's settings by create_asgi_app()
+mongo = AsyncMongo()
+
+# the collections of app.py, resolved against the async client on each use
+sensor_data_collection = LocalProxy(lambda: mongo.db.sensor_data)
+user_stats_collection = LocalProxy(lambda: mongo.db.user_stats)
+
+
+class PayloadTooLarge(Exception):
+    """Raised when a request body exceeds its size limit."""
+
+
+class AsyncRequest(Request):
+    """A request parsed by werkzeug from an ASGI scope, with its body and session."""
+
+    def __init__(self, scope):
+        client = scope.get("client")
+        super().__init__(
+            method=scope["method"],
+            scheme=scope.get("scheme", "http"),
+            server=scope.get("server"),
+            root_path=scope.get("root_path", ""),
+            path=scope["path"],
+            query_string=scope.get("query_string", b""),
+            headers=Headers(
+                [
+                    (name.decode("latin-1"), value.decode("latin-1"))
+                    for name, value in scope["headers"]
+                ]
+            ),
+            remote_addr=client[0] if client else None,
+        )
+        self.body = b""
+        self.session = {}
+
+    def get_json(self):
+        """The JSON body, or None if it is missing or malformed."""
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+class AsyncResponse(Response):
+    """A response whose body is bytes or an async iterator of bytes."""
+
+    def __init__(self, body=b"", status=200, mimetype="application/json", headers=None):
+        super().__init__(status=status, headers=headers, mimetype=mimetype)
+        self.body = body
+
+
+def jsonify(payload, status=200):
+    """A JSON response, like Flask's jsonify()."""
+    return AsyncResponse((json.dumps(payload) + "\n").encode("utf-8"), status)
+
+
+class AsyncSubscription:
+    """
+    A notifier subscription for a coroutine. The notifier thread hands
+    records over to the event loop, which drops them while 'records' is full.
+    """
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.records = asyncio.Queue(maxsize)
+
+    def put_nowait(self, record):
+        """Called by the notifier thread for every translated record of the user."""
+        self.loop.call_soon_threadsafe(self.deliver, record)
+
+    def deliver(self, record):
+        """Queues a record on the event loop unless the subscriber is behind."""
+        if not self.records.full():
+            self.records.put_nowait(record)
+
+
+async def read_body(receive, max_bytes):
+    """Reads a request body. Raises PayloadTooLarge past 'max_bytes'."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > max_bytes:
+            raise PayloadTooLarge(f"Payload exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def until_disconnected(coroutine, receive):
+    """Runs 'coroutine', cancelling it if the client disconnects first."""
+    work = asyncio.ensure_future(coroutine)
+
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(disconnected())
+    await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    watcher.cancel()
+    if not work.done():
+        work.cancel()
+    try:
+        await work
+    except asyncio.CancelledError:
+        pass
+
+
+async def send_response(send, request, response):
+    """Sends a response, compressed like the Flask app's, body chunk by chunk."""
+    body = response.body
+    encoding = response_encoding(response, request.accept_encodings)
+    if isinstance(body, bytes):
+        if encoding and len(body) >= COMPRESS_MIN_BYTES:
+            compress, finish = compressor(encoding)
+            body = compress(body) + finish()
+            response.headers["Content-Encoding"] = encoding
+        if response.status_code != 304:
+            response.headers["Content-Length"] = str(len(body))
+    elif encoding:
+        body = compress_async_chunks(body, encoding)
+        response.headers["Content-Encoding"] = encoding
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in response.headers.items()
+            ],
+        }
+    )
+    if isinstance(body, bytes):
+        await send({"type": "http.response.body", "body": body})
+        return
+    async for chunk in body:
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def count_submissions(user_session, documents):
+    """count_submissions() of app.py for a session of the async tier."""
+    user_id = user_session.get("user_id")
+    if not user_id or not documents:
+        return
+    try:
+        await user_stats_collection.update_one(
+            {"_id": user_id}, submission_stats_update(documents), upsert=True
+        )
+    except PyMongoError as e:
+        print(f"Could not count submissions of user {user_id}: {e}")
+
+
+async def submit_text(request):
+    """/submit_text: stores one utterance for translation."""
+    data = request.get_json()
+    error = submission_error(data)
+    if error:
+        return jsonify({"error": error}, 400)
+    document = submission_document(
+        data["input_text"], requested_languages(data), user_session=request.session
+    )
+    if INGEST_MODE == "buffered":
+        try:
+            # shielded: a timeout must not cancel the buffer's future
+            inserted_id = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(write_buffer.submit(document))),
+                INGEST_ACK_TIMEOUT,
+            )
+        except (BufferFull, BufferClosed, PyMongoError, asyncio.TimeoutError) as e:
+            print(f"Could not store submission: {e}")
+            return jsonify({"error": "Could not store the text, try again"}, 503)
+    else:
+        inserted_id = (await sensor_data_collection.insert_one(document)).inserted_id
+    await count_submissions(request.session, [document])
+    recent_translations_cache.invalidate()
+    return jsonify({"message": "Text submitted successfully", "id": str(inserted_id)})
+
+
+async def get_sensor_data(request):
+    """/api/sensor_data: a page of records, streamed from the cursor."""
+    try:
+        query, projection, limit = sensor_data_request(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
+    etag, last_modified = record_validators(
+        *[
+            await sensor_data_collection.find_one(query, fields, sort=sort)
+            for fields, sort in VALIDATOR_LOOKUPS
+        ]
+    )
+    if not_modified(request, etag, last_modified):
+        return set_validators(AsyncResponse(status=304), etag, last_modified)
+    records = (
+        sensor_data_collection.find(query, projection).sort(KEYSET_SORT).limit(limit)
+    )
+    if request.args.get("format") == "ndjson":
+
+        async def lines():
+            async for record in records:
+                yield (record_json(record) + "\n").encode("utf-8")
+
+        response = AsyncResponse(lines(), mimetype="application/x-ndjson")
+    else:
+
+        async def json_array():
+            separator = b"["
+            async for record in records:
+                yield separator + record_json(record).encode("utf-8")
+                separator = b","
+            yield b"[]" if separator == b"[" else b"]"
+
+        response = AsyncResponse(json_array())
+    return set_validators(response, etag, last_modified)
+
+
+async def get_sensor_record(request, record_id):
+    """/api/sensor_data/<record_id>: a record's status, optionally long-polled."""
+    try:
+        query, projection, lookup = sensor_record_request(record_id, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
+    wait = min(request.args.get("wait", 0, type=float), LONG_POLL_MAX_SECONDS)
+    deadline = time.monotonic() + wait
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def wake(_record):
+        """Called by the notifier thread for every change to the record."""
+        loop.call_soon_threadsafe(changed.set)
+
+    # listen before the first read, so no change after it is missed
+    if wait > 0:
+        notifier.add_record_listener(query["_id"], wake)
+    try:
+        record = await sensor_data_collection.find_one(query, lookup)
+        progress = record and language_progress(record)
+        while still_pending(record, progress) and time.monotonic() < deadline:
+            try:
+                await asyncio.wait_for(
+                    changed.wait(), min(deadline - time.monotonic(), LONG_POLL_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                pass
+            changed.clear()
+            record = await sensor_data_collection.find_one(query, lookup)
+    finally:
+        notifier.remove_record_listener(query["_id"], wake)
+    if record is None:
+        return jsonify({"error": "Record not found"}, 404)
+    return jsonify(record_state(record, projection))
+
+
+async def stream_translations(request):
+    """/api/stream: Server-Sent Events of the user's records as they get translated."""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Login required"}, 401)
+
+    async def events():
+        subscription = notifier.subscribe(
+            user_id,
+            AsyncSubscription(asyncio.get_running_loop(), notifier.queue_size),
+        )
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    record = await asyncio.wait_for(
+                        subscription.records.get(), SSE_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield translation_event(record).encode("utf-8")
+        finally:
+            notifier.unsubscribe(user_id, subscription)
+
+    return AsyncResponse(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# (method, Flask rule, handler) of the routes served on the event loop
+ROUTES = [
+    ("POST", "/submit_text", submit_text),
+    ("GET", "/api/sensor_data", get_sensor_data),
+    ("GET", "/api/sensor_data/<record_id>", get_sensor_record),
+    ("GET", "/api/stream", stream_translations),
+]
+
+
+class AsyncApp:
+    """
+    ASGI app serving ROUTES on the event loop and passing every other
+    request, and any of ROUTES with another method, to the Flask app.
+    """
+
+    def __init__(self, flask_app, threads=8):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=threads)
+        self.routes = [
+            (
+                method,
+                re.compile(re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", rule) + "$"),
+                rule,
+                handler,
+            )
+            for method, rule, handler in ROUTES
+        ]
+
+    def match(self, scope):
+        """Returns the (rule, handler, path arguments) serving a request, or None."""
+        for method, pattern, rule, handler in self.routes:
+            matched = pattern.match(scope["path"])
+            if matched and scope["method"] == method:
+                return rule, handler, matched.groupdict()
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        route = self.match(scope) if scope["type"] == "http" else None
+        if route is None:
+            await self.wsgi(scope, receive, send)
+            return
+        request = AsyncRequest(scope)
+        # the session cookie set by the Flask app, read the same way
+        request.session = (
+            self.flask_app.session_interface.open_session(self.flask_app, request) or {}
+        )
+        try:
+            # of ROUTES only /submit_text takes a body, batches go to Flask
+            request.body = await read_body(receive, SUBMIT_TEXT_MAX_BYTES)
+        except PayloadTooLarge as e:
+            await send_response(send, request, jsonify({"error": str(e)}, 413))
+            return
+        # read the body first: from here on, receive() only reports a disconnect
+        await until_disconnected(self.serve(send, request, route), receive)
+
+    async def serve(self, send, request, route):
+        """Serves a request with the handler of its route."""
+        started = time.perf_counter()
+        rule, handler, arguments = route
+        response = await handler(request, **arguments)
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=rule,
+            status=response.status_code,
+        )
+        await send_response(send, request, response)
+
+    async def lifespan(self, receive, send):
+        """Closes the AsyncMongoClient when the worker shuts down."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await mongo.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app(config=None):
+    """
+    Build the async tier around create_app(config). Like the Flask app's,
+    its MongoDB client connects on first use, inside each worker process.
+    """
+    flask_app = create_app(config)
+    mongo.init_app(flask_app.config)
+    return AsyncApp(flask_app, threads=int(os.getenv("WEB_THREADS", "8")))
@@ -0,0 +1,93 @@
+"""
+Conditional GET for the web app.
+
+Routes derive an entity tag and a Last-Modified time from a few cheap reads
+(the newest record in scope, the latest write to one, a user's last activity)
+and let conditional() answer 304 Not Modified to clients whose copy is still
+current, before the full body is queried or rendered.
+"""
+
+import hashlib
+import datetime
+from flask import Response, make_response, request
+from indexes import KEYSET_SORT
+
+
+def make_etag(*parts):
+    """Return an entity tag for the values a response is derived from."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:20]
+
+
+# (projection, sort) of the lookups query_validators() derives validators from
+VALIDATOR_LOOKUPS = (
+    ({"timestamp": 1}, KEYSET_SORT),
+    ({"updated_at": 1}, [("updated_at", -1)]),
+)
+
+
+def query_validators(collection, query):
+    """
+    Return an entity tag and Last-Modified time for the records a query
+    selects, from its newest record and its most recently updated one: two
+    indexed lookups of one document each, whatever the page size. Every
+    write that changes what the API returns of a record sets its
+    'updated_at', from the submission to claims, translations,
+    per-language progress, failed attempts and dead-lettering.
+    """
+    return record_validators(
+        *(
+            collection.find_one(query, projection, sort=sort)
+            for projection, sort in VALIDATOR_LOOKUPS
+        )
+    )
+
+
+def record_validators(newest, updated):
+    """Return the validators of the VALIDATOR_LOOKUPS results of a query."""
+    times = [
+        record[field]
+        for record, field in ((newest, "timestamp"), (updated, "updated_at"))
+        if record and isinstance(record.get(field), datetime.datetime)
+    ]
+    etag = make_etag(newest and newest["_id"], times, updated and updated["_id"])
+    return etag, max(times, default=None)
+
+
+def http_time(moment):
+    """Convert a naive local time, like the stored timestamps, to an HTTP date."""
+    return moment.astimezone(datetime.timezone.utc).replace(microsecond=0)
+
+
+def not_modified(current_request, etag, last_modified):
+    """
+    Whether the If-None-Match (or, without one, If-Modified-Since)
+    validators of a werkzeug request still match.
+    """
+    if current_request.if_none_match:
+        return current_request.if_none_match.contains_weak(etag)
+    return bool(
+        last_modified
+        and current_request.if_modified_since
+        and http_time(last_modified) <= current_request.if_modified_since
+    )
+
+
+def set_validators(response, etag, last_modified):
+    """Add the validators to a werkzeug response and ask clients to revalidate."""
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = http_time(last_modified)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional(etag, last_modified, build):
+    """
+    Answer 304 Not Modified if the request's validators still match, and
+    otherwise the response 'build()' returns. Either way the response
+    carries the validators and asks clients to revalidate before reusing it.
+    """
+    if not_modified(request, etag, last_modified):
+        return set_validators(Response(status=304), etag, last_modified)
+    return set_validators(make_response(build()), etag, last_modified)
@@ -0,0 +1,87 @@
+"""
+Response compression for the web app.
+
+Negotiates brotli or gzip from the request's Accept-Encoding and compresses
+HTML and JSON responses: buffered bodies of at least 'min_size' bytes in one
+go, streamed ones (the /api/sensor_data pages) chunk by chunk as they are
+produced. Event streams are left alone, as a compressor would hold their
+events back.
+"""
+
+import zlib
+import brotli
+
+# media types worth compressing
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/html")
+# supported encodings, most preferred first
+ENCODINGS = ("br", "gzip")
+# fast settings: polled responses are compressed on every request
+BROTLI_QUALITY = 4
+GZIP_LEVEL = 6
+
+
+def compressor(encoding):
+    """Returns the compress and finish functions of a new compressor."""
+    if encoding == "br":
+        stream = brotli.Compressor(quality=BROTLI_QUALITY)
+        return stream.process, stream.finish
+    # wbits 31 writes the gzip container around the deflate stream
+    stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return stream.compress, stream.flush
+
+
+def compress_chunks(chunks, encoding):
+    """Compresses a stream of byte chunks, yielding output as it becomes available."""
+    compress, finish = compressor(encoding)
+    for chunk in chunks:
+        compressed = compress(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+async def compress_async_chunks(chunks, encoding):
+    """compress_chunks() for an async iterator of byte chunks."""
+    compress, finish = compressor(encoding)
+    async for chunk in chunks:
+        compressed = compress(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+def response_encoding(response, accept_encodings):
+    """
+    Returns the encoding to compress a werkzeug response with, or None if
+    it is not a successful HTML or JSON response or the client accepts
+    none. Compressible responses vary on Accept-Encoding either way.
+    """
+    if (
+        response.status_code != 200
+        or response.mimetype not in COMPRESSIBLE_TYPES
+        or "Content-Encoding" in response.headers
+    ):
+        return None
+    response.vary.add("Accept-Encoding")
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def compress_response(response, accept_encodings, min_size=1024):
+    """
+    Compresses a successful HTML or JSON response with the best encoding
+    the client accepts, in place, and returns it.
+    """
+    encoding = response_encoding(response, accept_encodings)
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_chunks(response.iter_encoded(), encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        compress, finish = compressor(encoding)
+        response.set_data(compress(body) + finish())
+    response.headers["Content-Encoding"] = encoding
+    return response
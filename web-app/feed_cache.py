@@ -0,0 +1,65 @@
+"""
+Write-invalidated cache for the web app.
+
+Holds one computed value, such as the /home recent-translations list,
+until a write invalidates it or it grows older than its staleness bound.
+"""
+
+import time
+import threading
+
+
+class WriteInvalidatedCache:
+    """
+    Caches the result of 'loader' until invalidate() is called or the value
+    is older than 'max_staleness' seconds. Concurrent misses share a single
+    load instead of all querying the database.
+    """
+
+    def __init__(self, loader, max_staleness=60.0):
+        """'loader' is called without arguments to compute a fresh value."""
+        self.loader = loader
+        self.max_staleness = max_staleness
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        # (value, monotonic load time, generation it was loaded in)
+        self.entry = None
+        self.generation = 0
+        self.counters = {"hits": 0, "misses": 0}
+
+    def fresh_value(self):
+        """Returns the cached value if it is still valid, otherwise None."""
+        with self.lock:
+            if self.entry is None:
+                return None
+            value, loaded_at, generation = self.entry
+            if (
+                generation == self.generation
+                and time.monotonic() - loaded_at < self.max_staleness
+            ):
+                self.counters["hits"] += 1
+                return value
+            return None
+
+    def get(self):
+        """Returns the cached value, loading a fresh one if needed."""
+        value = self.fresh_value()
+        if value is not None:
+            return value
+        with self.load_lock:
+            # another thread may have loaded it while this one waited
+            value = self.fresh_value()
+            if value is not None:
+                return value
+            with self.lock:
+                generation = self.generation
+                self.counters["misses"] += 1
+            value = self.loader()
+            with self.lock:
+                self.entry = (value, time.monotonic(), generation)
+            return value
+
+    def invalidate(self, *_args):
+        """Marks the cached value as stale; accepts and ignores event arguments."""
+        with self.lock:
+            self.generation += 1
@@ -0,0 +1,57 @@
+"""
+Gunicorn settings for the web app.
+
+With WEB_MODE=async (the default), each of WEB_CONCURRENCY worker
+processes runs create_asgi_app() on an event loop: the I/O-bound routes of
+async_app.py, including every translator page's /api/stream, hold up to
+WEB_CONNECTIONS connections per process, and the other routes run on
+WEB_THREADS threads. WEB_MODE=sync serves create_app() on WEB_THREADS
+request threads per process instead, where every open event stream or
+long poll holds a thread, so a few open pages can starve the others. The
+app is imported once before the workers are forked; its MongoDB clients
+only connect on first use, inside each worker.
+
+Every worker keeps its own metrics registry, so each also serves its
+/metrics on WEB_METRICS_PORT plus its slot, the lowest one no other live
+worker holds: a restarted worker takes over the port of the one it
+replaces, and Prometheus scrapes WEB_CONCURRENCY ports per container.
+"""
+
+# gunicorn reads its settings from these lowercase names
+# pylint: disable=invalid-name
+
+import os
+import itertools
+from metrics import start_http_server
+
+if os.getenv("WEB_MODE", "async") == "async":
+    wsgi_app = "async_app:create_asgi_app()"
+    worker_class = "asgi"
+    worker_connections = int(os.getenv("WEB_CONNECTIONS", "1000"))
+else:
+    wsgi_app = "app:create_app()"
+    worker_class = "gthread"
+    threads = int(os.getenv("WEB_THREADS", "8"))
+bind = f"0.0.0.0:{os.getenv('PORT', '5050')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# WEB_RELOAD=1 restarts workers on code changes, for development
+reload = os.getenv("WEB_RELOAD", "") == "1"
+preload_app = not reload
+# finish in-flight requests on restart, event streams reconnect on their own
+graceful_timeout = 10
+# 0 disables the per-worker metrics servers
+WEB_METRICS_PORT = int(os.getenv("WEB_METRICS_PORT", "5101"))
+
+
+def pre_fork(server, worker):
+    """Gives a new worker the lowest metrics slot no live worker holds."""
+    taken = {getattr(other, "metrics_slot", None) for other in server.WORKERS.values()}
+    worker.metrics_slot = next(slot for slot in itertools.count() if slot not in taken)
+
+
+def post_fork(server, worker):
+    """Serves the worker's own metrics on WEB_METRICS_PORT plus its slot."""
+    if WEB_METRICS_PORT:
+        port = WEB_METRICS_PORT + worker.metrics_slot
+        start_http_server(port)
+        server.log.info("Worker %s serves its metrics on port %s", worker.pid, port)
@@ -0,0 +1,113 @@
+"""
+Index management for the web app.
+
+Declares the indexes behind every hot web-app query, creates them
+idempotently at startup and checks with explain() that none of the
+canonical queries falls back to a collection scan.
+
+Usage:
+    python indexes.py          create any missing indexes
+    python indexes.py --check  exit 1 if a canonical query plans a COLLSCAN
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+from pymongo.errors import PyMongoError
+
+# newest first, with _id breaking ties so keyset cursors are stable
+KEYSET_SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "sensor_data": [
+        IndexModel(KEYSET_SORT, name="timestamp_id"),
+        IndexModel([("user_id", ASCENDING), *KEYSET_SORT], name="user_timestamp_id"),
+        # the latest write in scope, for the ETag and Last-Modified validators
+        IndexModel([("updated_at", DESCENDING)], name="updated_at"),
+        # only dead-lettered records, which should stay few
+        IndexModel(
+            [("user_id", ASCENDING), *KEYSET_SORT],
+            name="failed_user_timestamp_id",
+            partialFilterExpression={"status": "failed"},
+        ),
+    ],
+    "sensor_data_archive": [
+        IndexModel([("user_id", ASCENDING), *KEYSET_SORT], name="user_timestamp_id"),
+    ],
+}
+
+# (description, collection, filter, sort) for every hot query of the web app
+CANONICAL_QUERIES = [
+    ("login/register by email", "users", {"email": "user@example.com"}, None),
+    ("/home recent translations", "sensor_data", {}, KEYSET_SORT),
+    ("/account history", "sensor_data", {"user_id": "user-id"}, KEYSET_SORT),
+    (
+        "/account archived history",
+        "sensor_data_archive",
+        {"user_id": "user-id"},
+        KEYSET_SORT,
+    ),
+    ("/api/sensor_data page", "sensor_data", {}, KEYSET_SORT),
+    ("/api/sensor_data Last-Modified", "sensor_data", {}, [("updated_at", -1)]),
+    (
+        "/api/dead_letters page",
+        "sensor_data",
+        {"user_id": "user-id", "status": "failed"},
+        KEYSET_SORT,
+    ),
+]
+
+
+def ensure_indexes(db):
+    """
+    Creates every declared index that does not exist yet. Safe to run on
+    every startup; failures are reported and do not stop the caller.
+    """
+    for collection_name, indexes in INDEXES.items():
+        try:
+            created = db[collection_name].create_indexes(indexes)
+            print(f"Indexes on {collection_name}: {', '.join(created)}")
+        except PyMongoError as e:
+            print(f"Could not create indexes on {collection_name}: {e}")
+
+
+def plan_stages(plan):
+    """Yields the name of every stage in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+
+def check_indexes(db, queries=None):
+    """
+    Runs explain() on each canonical query and returns the descriptions of
+    the ones whose winning plan contains a COLLSCAN.
+    """
+    collection_scans = []
+    for description, collection_name, query, sort in queries or CANONICAL_QUERIES:
+        cursor = db[collection_name].find(query).limit(10)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = set(plan_stages(winning_plan))
+        print(f"{description}: {', '.join(sorted(stages))}")
+        if "COLLSCAN" in stages:
+            collection_scans.append(description)
+    return collection_scans
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    database = MongoClient(os.getenv("MONGO_URI")).get_default_database()
+    if "--check" in sys.argv[1:]:
+        sys.exit(1 if check_indexes(database) else 0)
+    ensure_indexes(database)
@@ -0,0 +1,228 @@
+"""
+Prometheus-style metrics.
+
+A small, dependency-free registry of counters, gauges and histograms that
+renders the Prometheus text exposition format, a pymongo command listener
+that times every MongoDB operation and a tiny /metrics server for
+processes that do not run a web server.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pymongo import monitoring
+
+# seconds; spans a cached lookup up to a slow backend call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(labelnames, values, extra=()):
+    """Renders '{name="value",...}' for a sample, or '' without labels."""
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    rendered = (f'{name}="{escape_label_value(value)}"' for name, value in pairs)
+    return "{" + ",".join(rendered) + "}"
+
+
+def escape_label_value(value):
+    """Escapes backslashes, quotes and newlines in a label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    """
+    Base class holding a metric's name, help text, labels and samples.
+
+    With 'function', the samples are read at scrape time instead: a number,
+    or a dict of {label values tuple: number}.
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self, name, documentation, labelnames=(), function=None, registry=None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self.samples = {}
+        self.lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def label_values(self, labels):
+        """Returns the label values in declaration order."""
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        """Returns the exposition lines of this metric."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, values)} {value}")
+        return lines
+
+    def collect(self):
+        """Returns {label values: value}."""
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                print(f"Could not collect {self.name}: {e}")
+                return {}
+            return value if isinstance(value, dict) else {(): value}
+        with self.lock:
+            return dict(self.samples)
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Adds 'amount' to the counter for these labels."""
+        key = self.label_values(labels)
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        """Sets the gauge for these labels."""
+        with self.lock:
+            self.samples[self.label_values(labels)] = value
+
+
+class Histogram(Metric):
+    """Counts observations into cumulative buckets and keeps their sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        """Records one observation for these labels."""
+        key = self.label_values(labels)
+        with self.lock:
+            counts, total, observations = self.samples.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            counts = [
+                count + (value <= bound) for count, bound in zip(counts, self.buckets)
+            ]
+            self.samples[key] = (counts, total + value, observations + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the with-block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, (counts, total, observations) in sorted(self.collect().items()):
+            for bound, count in zip(self.buckets, counts):
+                labels = format_labels(self.labelnames, values, [("le", bound)])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = format_labels(self.labelnames, values, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {observations}")
+            labels = format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {observations}")
+        return lines
+
+
+class Registry:
+    """The set of metrics exposed together on one endpoint."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """Adds a metric to the registry."""
+        self.metrics.append(metric)
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Content-Type of the text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongodb_command_duration_seconds",
+    "Duration of MongoDB commands.",
+    ["command", "outcome"],
+)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the server's registry on /metrics."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answers a scrape."""
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Scrapes are too frequent to log."""
+
+
+def start_http_server(port, address="0.0.0.0", registry=None):
+    """
+    Serves /metrics from a daemon thread, for processes without a web
+    server of their own. Returns the server.
+    """
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    server.registry = registry if registry is not None else REGISTRY
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    return server
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Times every MongoDB command into MONGO_COMMAND_SECONDS."""
+
+    def started(self, event):
+        """Nothing to do until the command finishes."""
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(
+            event.duration_micros / 1e6, command=event.command_name, outcome="ok"
+        )
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe(
+            event.duration_micros / 1e6, command=event.command_name, outcome="error"
+        )
@@ -0,0 +1,212 @@
+"""
+Translation notifier for the web app.
+
+One background thread per process follows sensor_data for newly translated
+records and fans each one out to the in-memory queues of the subscribers
+belonging to the record's user, so any number of open Server-Sent Events
+connections share a single database cursor. Listeners, such as cache
+invalidation, are called for every insert and translation it sees, and
+record listeners, such as long-polls, for every change it sees to one
+record.
+"""
+
+import time
+import queue
+import datetime
+import threading
+from pymongo.errors import OperationFailure, PyMongoError
+
+# fields pushed to subscribers
+NOTIFY_PROJECTION = {
+    "input_text": 1,
+    "target_language": 1,
+    "target_languages": 1,
+    "translated_text": 1,
+    "translations": 1,
+    "translated_timestamp": 1,
+    "user_id": 1,
+}
+
+# top-level fields whose updates are published: the translation, the
+# progress of records with several target languages and status changes
+# such as dead-lettering
+PUBLISHED_FIELDS = ["translated_text", "translations", "status"]
+
+
+class TranslationNotifier:  # pylint: disable=too-many-instance-attributes
+    """
+    Fans translated sensor_data records out to per-user subscriber queues.
+
+    Uses a change stream when the server supports one and otherwise polls
+    for records translated since the last check (inserts are only seen
+    through the change stream; so are per-language progress and status
+    changes). The watcher thread starts with the first subscriber or with
+    start().
+    """
+
+    def __init__(self, get_collection, poll_interval=1.0, queue_size=100):
+        """'get_collection' returns the sensor_data collection to follow."""
+        self.get_collection = get_collection
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.subscribers = {}
+        self.listeners = []
+        self.record_listeners = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """Starts the watcher thread unless it is already running."""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name="translation-notifier", daemon=True
+                )
+                self.thread.start()
+
+    def add_listener(self, callback):
+        """Calls 'callback(record)' for every inserted or translated record seen."""
+        with self.lock:
+            self.listeners.append(callback)
+
+    def add_record_listener(self, record_id, callback):
+        """Calls 'callback(record)' for every change seen to one record, until removed."""
+        with self.lock:
+            self.record_listeners.setdefault(record_id, set()).add(callback)
+        self.start()
+
+    def remove_record_listener(self, record_id, callback):
+        """Stops calling a record listener."""
+        with self.lock:
+            callbacks = self.record_listeners.get(record_id, set())
+            callbacks.discard(callback)
+            if not callbacks:
+                self.record_listeners.pop(record_id, None)
+
+    def subscribe(self, user_id, subscription=None):
+        """
+        Registers a subscriber for a user and returns its queue: a new
+        bounded queue.Queue, or 'subscription', any object whose
+        put_nowait() raises queue.Full when it is not keeping up.
+        """
+        if subscription is None:
+            subscription = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        """Removes a subscriber queue."""
+        with self.lock:
+            user_subscriptions = self.subscribers.get(user_id, set())
+            user_subscriptions.discard(subscription)
+            if not user_subscriptions:
+                self.subscribers.pop(user_id, None)
+
+    def subscriber_count(self):
+        """Returns the number of open subscriptions."""
+        with self.lock:
+            return sum(len(queues) for queues in self.subscribers.values())
+
+    def publish(self, record):
+        """
+        Passes a record to every listener and to the listeners of the
+        record and, once it is translated, to every subscriber of its user.
+        A subscriber that is not keeping up drops the record rather than
+        blocking the others.
+        """
+        with self.lock:
+            listeners = list(self.listeners)
+            listeners += self.record_listeners.get(record.get("_id"), ())
+            targets = list(self.subscribers.get(record.get("user_id"), ()))
+        for listener in listeners:
+            listener(record)
+        if "translated_text" not in record:
+            return
+        for subscription in targets:
+            try:
+                subscription.put_nowait(record)
+            except queue.Full:
+                pass
+
+    def run(self):
+        """Follows sensor_data for as long as the process lives."""
+        while True:
+            try:
+                self.watch()
+            except OperationFailure as e:
+                print(f"Change streams unavailable, notifier polling instead: {e}")
+                self.poll()
+            except PyMongoError as e:
+                print(f"Notifier lost its change stream, reconnecting: {e}")
+                time.sleep(self.poll_interval)
+
+    def watch(self):
+        """
+        Publishes each record as soon as it is inserted or one of its
+        PUBLISHED_FIELDS is updated.
+        """
+        # whether the top-level field of any updated path, e.g. "translations"
+        # of "translations.fr", is one of PUBLISHED_FIELDS
+        published = {
+            "$map": {
+                "input": {
+                    "$objectToArray": {
+                        "$ifNull": ["$updateDescription.updatedFields", {}]
+                    }
+                },
+                "in": {
+                    "$in": [
+                        {"$arrayElemAt": [{"$split": ["$$this.k", "."]}, 0]},
+                        PUBLISHED_FIELDS,
+                    ]
+                },
+            }
+        }
+        pipeline = [
+            {
+                "$match": {
+                    "$or": [
+                        {"operationType": "insert"},
+                        {
+                            "operationType": "update",
+                            "$expr": {"$anyElementTrue": [published]},
+                        },
+                    ]
+                }
+            },
+            {
+                "$project": {
+                    "fullDocument." + field: 1 for field in ["_id", *NOTIFY_PROJECTION]
+                }
+            },
+        ]
+        with self.get_collection().watch(
+            pipeline, full_document="updateLookup"
+        ) as stream:
+            for change in stream:
+                if change.get("fullDocument"):
+                    self.publish(change["fullDocument"])
+
+    def poll(self):
+        """Publishes records translated since the previous check, while anyone listens."""
+        last_seen = datetime.datetime.now()
+        while True:
+            time.sleep(self.poll_interval)
+            if not self.subscriber_count() and not self.listeners:
+                last_seen = datetime.datetime.now()
+                continue
+            try:
+                records = (
+                    self.get_collection()
+                    .find(
+                        {"translated_timestamp": {"$gt": last_seen}}, NOTIFY_PROJECTION
+                    )
+                    .sort("translated_timestamp", 1)
+                )
+                for record in records:
+                    last_seen = max(last_seen, record["translated_timestamp"])
+                    self.publish(record)
+            except PyMongoError as e:
+                print(f"Notifier poll failed: {e}")
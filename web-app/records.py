@@ -0,0 +1,213 @@
+"""
+sensor_data records as the web app's API serves them.
+
+Parsing of the request arguments of the /api/sensor_data routes into
+queries, keyset cursors and projections, and formatting of records as
+JSON, NDJSON lines and Server-Sent Events. Shared by the Flask routes in
+app.py and their async counterparts in async_app.py.
+"""
+
+import json
+import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# fields of a sensor_data record that API clients may ask for
+RECORD_FIELDS = (
+    "input_text",
+    "target_language",
+    "target_languages",
+    "translated_text",
+    "translations",
+    "timestamp",
+    "translated_timestamp",
+    "user_id",
+    "translator",
+    "attempts",
+    "last_error",
+)
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+
+def serialize_record(record):
+    """Make a sensor_data record JSON friendly (string id, ISO timestamps)."""
+    record["_id"] = str(record["_id"])
+    for field in ("timestamp", "translated_timestamp", "failed_at", "updated_at"):
+        if isinstance(record.get(field), datetime.datetime):
+            record[field] = record[field].isoformat()
+    return record
+
+
+def record_json(record):
+    """Serialize a sensor_data record to one line of JSON."""
+    return json.dumps(serialize_record(record), default=str)
+
+
+def record_status(record):
+    """Returns 'translated', 'failed' (dead-lettered) or 'pending'."""
+    if "translated_text" in record:
+        return "translated"
+    return "failed" if record.get("status") == "failed" else "pending"
+
+
+def language_progress(record):
+    """
+    Returns {target language: status} of a record with several target
+    languages, or None for a single one. Languages translated so far are
+    'translated', the others share the status of the record.
+    """
+    if not record.get("target_languages"):
+        return None
+    status = record_status(record)
+    translations = record.get("translations", {})
+    return {
+        language: "translated" if language in translations else status
+        for language in record["target_languages"]
+    }
+
+
+def sensor_data_filters(args):
+    """
+    Build a sensor_data query from the ?user_id=, ?target_language=,
+    ?status= and ?since= / ?until= request arguments. Raises ValueError on
+    bad values.
+    """
+    query = {}
+    for field in ("user_id", "target_language"):
+        if args.get(field):
+            query[field] = args[field]
+    status = args.get("status")
+    if status in ("translated", "pending"):
+        query["translated_text"] = {"$exists": status == "translated"}
+        if status == "pending":
+            query["status"] = {"$ne": "failed"}
+    elif status == "failed":
+        query["status"] = "failed"
+    elif status:
+        raise ValueError("status must be 'translated', 'pending' or 'failed'")
+    time_range = {}
+    for arg, operator in (("since", "$gte"), ("until", "$lt")):
+        if args.get(arg):
+            try:
+                time_range[operator] = datetime.datetime.fromisoformat(args[arg])
+            except ValueError as e:
+                raise ValueError(f"{arg} must be an ISO timestamp") from e
+    if time_range:
+        query["timestamp"] = time_range
+    return query
+
+
+def parse_fields(fields_arg):
+    """
+    Turn a comma separated ?fields= argument into a find() projection.
+    Returns None for no projection, raises ValueError for unknown fields.
+    """
+    if not fields_arg:
+        return None
+    fields = [field.strip() for field in fields_arg.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in RECORD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {field: 1 for field in fields}
+
+
+def parse_cursor(cursor_arg):
+    """
+    Parse a '<ISO timestamp>,<_id>' cursor into the (timestamp, _id) of the
+    last record seen. Raises ValueError on a malformed cursor.
+    """
+    timestamp, _, record_id = cursor_arg.rpartition(",")
+    try:
+        return datetime.datetime.fromisoformat(timestamp), ObjectId(record_id)
+    except (ValueError, InvalidId) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def format_cursor(record):
+    """Return the cursor that continues a listing after this record."""
+    return f"{record['timestamp'].isoformat()},{record['_id']}"
+
+
+def after_cursor(query, cursor):
+    """Restrict a query to the records after the cursor in KEYSET_SORT order."""
+    timestamp, record_id = cursor
+    return dict(
+        query,
+        **{
+            "$or": [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": record_id}},
+            ]
+        },
+    )
+
+
+def sensor_data_request(args):
+    """
+    Return the query, projection and page size an /api/sensor_data request
+    asks for. Raises ValueError on bad arguments.
+    """
+    query = sensor_data_filters(args)
+    projection = parse_fields(args.get("fields"))
+    if args.get("cursor"):
+        query = after_cursor(query, parse_cursor(args["cursor"]))
+    if projection:
+        # the sort key is always returned so clients can build the next cursor
+        projection["timestamp"] = 1
+    limit = min(max(args.get("limit", API_PAGE_SIZE, type=int), 1), API_MAX_PAGE_SIZE)
+    return query, projection, limit
+
+
+def sensor_record_request(record_id, args):
+    """
+    Return the query, projection and long-poll lookup projection of a
+    /api/sensor_data/<record_id> request. Raises ValueError on bad arguments.
+    """
+    try:
+        query = {"_id": ObjectId(record_id)}
+    except InvalidId as e:
+        raise ValueError("Invalid record id") from e
+    projection = parse_fields(args.get("fields"))
+    # always fetch the fields that tell the long-poll when to stop
+    lookup = (
+        dict(
+            projection, translated_text=1, status=1, target_languages=1, translations=1
+        )
+        if projection
+        else None
+    )
+    return query, projection, lookup
+
+
+def still_pending(record, progress):
+    """Whether a long-poll keeps waiting: the record is pending as it was at the start."""
+    return bool(
+        record
+        and record_status(record) == "pending"
+        and language_progress(record) == progress
+    )
+
+
+def record_state(record, projection):
+    """
+    Format a record for /api/sensor_data/<record_id>: the asked for fields,
+    its status and the status of each of several target languages.
+    """
+    status = record_status(record)
+    progress = language_progress(record)
+    if projection:
+        for field in ("translated_text", "target_languages", "translations"):
+            if field not in projection:
+                record.pop(field, None)
+    record = serialize_record(record)
+    record["status"] = status
+    if progress:
+        record["languages"] = progress
+    return record
+
+
+def translation_event(record):
+    """Format a translated record as a Server-Sent Event."""
+    record = serialize_record(record)
+    return f"id: {record['_id']}\nevent: translation\ndata: {json.dumps(record)}\n\n"
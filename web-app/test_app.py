@@ -6,12 +6,20 @@ This file contains unit tests for the Flask application. The tests simulate Mong
 operations using dummy collections and verify that the endpoints behave as expected.
 """
 
+import io
+import gzip
 import json
+import time
+import threading
 import datetime
+from types import SimpleNamespace
+import brotli
 import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
 from werkzeug.security import generate_password_hash
+from bson import ObjectId
 import app as app_mod
-from app import app
+from write_buffer import BufferClosed, GroupCommitBuffer
 
 
 def test_example():
@@ -19,6 +27,62 @@ def test_example():
     assert True
 
 
+# query operators understood by the dummy collection: (present, value, argument)
+QUERY_OPERATORS = {
+    "$exists": lambda present, value, argument: present == argument,
+    "$lt": lambda present, value, argument: present and value < argument,
+    "$gte": lambda present, value, argument: present and value >= argument,
+    "$ne": lambda present, value, argument: value != argument,
+}
+
+
+def matches(doc, query):
+    """Return True if the document satisfies the query."""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            for operator, argument in condition.items():
+                if not QUERY_OPERATORS[operator](key in doc, doc.get(key), argument):
+                    return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+def apply_update(item, update):
+    """Apply an update's operators to a document, following dotted $inc paths."""
+    item.update(update.get("$set", {}))
+    for key in update.get("$unset", {}):
+        item.pop(key, None)
+    for key, amount in update.get("$inc", {}).items():
+        *parents, field = key.split(".")
+        target = item
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[field] = target.get(field, 0) + amount
+    for key, value in update.get("$max", {}).items():
+        item[key] = max(item[key], value) if key in item else value
+
+
+class DummyCursor(list):
+    """A list of documents that also supports the cursor sort() and limit() calls."""
+
+    def sort(self, keys):
+        """Sort by a list of (key, direction) pairs, missing values first."""
+        for key, key_direction in reversed(keys):
+            super().sort(
+                key=lambda doc, k=key: (k in doc, doc.get(k)),
+                reverse=key_direction < 0,
+            )
+        return self
+
+    def limit(self, count):
+        """Return at most 'count' documents."""
+        return DummyCursor(self[:count])
+
+
 # simulate MongoDB operations.
 class DummyCollection:
     """A dummy collection class to simulate MongoDB collection operations."""
@@ -26,35 +90,82 @@ class DummyCollection:
     def __init__(self):
         """Initialize the DummyCollection class."""
         self.data = []
-
-    def find_one(self, query):
-        """Return the first document matching the given query."""
-        for item in self.data:
-            if all(item.get(k) == v for k, v in query.items()):
-                return item
+        self.find_calls = 0
+
+    def find_one(self, query, projection=None, sort=None):
+        """Return the first document matching the given query, in sort order."""
+        items = DummyCursor(item for item in self.data if matches(item, query))
+        for item in items.sort(sort) if sort else items:
+            if projection:
+                return {k: v for k, v in item.items() if k in projection or k == "_id"}
+            return dict(item)
         return None
 
+    def find(self, query, projection=None):
+        """Return a cursor over the documents matching the given query."""
+        self.find_calls += 1
+        return DummyCursor(
+            {
+                k: v
+                for k, v in item.items()
+                if not projection or k in projection or k == "_id"
+            }
+            for item in self.data
+            if matches(item, query)
+        )
+
     def insert_one(self, document):
         """Insert a document into the collection and return a dummy insert result."""
-        document["_id"] = "dummy_id"
+        document["_id"] = ObjectId()
         self.data.append(document)
 
         class DummyInsert:
             """A dummy insert result class."""
 
-            inserted_id = "dummy_id"
+            inserted_id = document["_id"]
 
         return DummyInsert()
 
+    def update_one(self, query, update, upsert=False):
+        """
+        Apply '$set', '$unset', '$inc' and '$max' to the first matching
+        document, or to a new one with the query's _id when upserting.
+        """
+        for item in self.data:
+            if matches(item, query):
+                apply_update(item, update)
+                return SimpleNamespace(matched_count=1, modified_count=1)
+        if upsert:
+            self.data.append({"_id": query["_id"]})
+            apply_update(self.data[-1], update)
+        return SimpleNamespace(matched_count=0, modified_count=0)
+
+    def insert_many(self, documents, ordered=True):  # pylint: disable=w0613
+        """Insert several documents and return a dummy insert result."""
+        inserted_ids = [self.insert_one(document).inserted_id for document in documents]
+
+        class DummyInsertMany:
+            """A dummy insert_many result class."""
+
+        DummyInsertMany.inserted_ids = inserted_ids
+        return DummyInsertMany()
+
 
 @pytest.fixture
 def test_client(monkeypatch):
     """A pytest fixture that returns a test client with dummy MongoDB globals patched."""
-    app.config["TESTING"] = True
+    app = app_mod.create_app({"TESTING": True})
     dummy_users = DummyCollection()
     dummy_sensor_data = DummyCollection()
     monkeypatch.setitem(app_mod.__dict__, "users_collection", dummy_users)
     monkeypatch.setitem(app_mod.__dict__, "sensor_data_collection", dummy_sensor_data)
+    monkeypatch.setitem(
+        app_mod.__dict__, "sensor_data_archive_collection", DummyCollection()
+    )
+    monkeypatch.setitem(app_mod.__dict__, "user_stats_collection", DummyCollection())
+    # the dummy collections have no change streams to follow
+    monkeypatch.setattr(app_mod.notifier, "run", lambda: None)
+    app_mod.recent_translations_cache.invalidate()
     with app.test_client() as client:
         yield client
 
@@ -219,6 +330,17 @@ def test_submit_text_missing_input(test_client):
     assert json_data.get("error") == "Input text is required"
 
 
+def test_submit_text_validates_input_text(test_client, monkeypatch):
+    """Test that a non-string or oversized input_text is refused before it is stored."""
+    monkeypatch.setattr(app_mod, "SUBMIT_TEXT_MAX_CHARS", 5)
+    for input_text in (2**70, ["Hello"], "Hello, world"):
+        response = test_client.post("/submit_text", json={"input_text": input_text})
+        assert response.status_code == 400
+    assert response.get_json()["error"] == "Input text exceeds 5 characters"
+    assert test_client.post("/submit_text", data="not json").status_code == 400
+    assert not app_mod.sensor_data_collection.data
+
+
 def test_submit_text_success(test_client):
     """Test that a valid POST to /submit_text returns a successful message and an id."""
     data = {"input_text": "Hello", "target_language": "fr"}
@@ -227,3 +349,605 @@ def test_submit_text_success(test_client):
     json_data = json.loads(response.get_data(as_text=True))
     assert json_data.get("message") == "Text submitted successfully"
     assert "id" in json_data
+
+
+def test_submit_text_multiple_target_languages(test_client, monkeypatch):
+    """Test that one submission can ask for several languages, stored as one record."""
+    response = test_client.post(
+        "/submit_text",
+        json={"input_text": "Hello", "target_languages": ["fr", "de", "fr"]},
+    )
+    assert response.status_code == 200
+    (stored,) = app_mod.sensor_data_collection.data
+    assert stored["target_language"] == "fr"
+    assert stored["target_languages"] == ["fr", "de"]
+
+    monkeypatch.setattr(app_mod, "MAX_TARGET_LANGUAGES", 2)
+    for target_languages in ("fr", [], ["fr", 3], ["fr", "de", "it"]):
+        response = test_client.post(
+            "/submit_text",
+            json={"input_text": "Hello", "target_languages": target_languages},
+        )
+        assert response.status_code == 400
+    assert len(app_mod.sensor_data_collection.data) == 1
+
+
+def test_submit_batch_inserts_in_order(test_client):
+    """Test that /submit_batch stores every item and returns ids in input order."""
+    items = [
+        {"input_text": "One", "target_language": "fr"},
+        {"input_text": "Two"},
+        {"input_text": "Three", "target_language": "de"},
+    ]
+    response = test_client.post("/submit_batch", json=items)
+    assert response.status_code == 200
+    ids = response.get_json()["ids"]
+    stored = {str(doc["_id"]): doc for doc in app_mod.sensor_data_collection.data}
+    assert [stored[record_id]["input_text"] for record_id in ids] == [
+        "One",
+        "Two",
+        "Three",
+    ]
+    assert stored[ids[1]]["target_language"] == "es"
+    assert {doc["status"] for doc in stored.values()} == {"pending"}
+    assert {doc["priority"] for doc in stored.values()} == {app_mod.PRIORITY_BULK}
+
+
+def test_submit_batch_reports_failed_inserts(test_client, monkeypatch):
+    """Test that a partly failed batch returns the stored ids and counts only those."""
+    collection = app_mod.sensor_data_collection
+    login_as_new_user(test_client)
+
+    def insert_many(documents, ordered=True):
+        assert not ordered
+        for document in documents[::2]:
+            collection.insert_one(document)
+        for document in documents[1::2]:
+            document["_id"] = ObjectId()
+        raise BulkWriteError(
+            {"writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}]}
+        )
+
+    monkeypatch.setattr(collection, "insert_many", insert_many, raising=False)
+    items = [{"input_text": "One"}, {"input_text": "Two"}, {"input_text": "Three"}]
+    response = test_client.post("/submit_batch", json=items)
+    assert response.status_code == 207
+    body = response.get_json()
+    stored = collection.data
+    assert body["ids"] == [str(stored[0]["_id"]), None, str(stored[1]["_id"])]
+    assert body["items"] == [{"index": 1, "error": "Could not store the text"}]
+    (stats,) = app_mod.user_stats_collection.data
+    assert stats["submitted"] == 2
+
+    def unreachable(documents, ordered=True):
+        raise AutoReconnect("connection lost")
+
+    monkeypatch.setattr(collection, "insert_many", unreachable, raising=False)
+    assert test_client.post("/submit_batch", json=items).status_code == 503
+
+
+def test_submit_batch_rejects_invalid_items(test_client):
+    """Test that one invalid item rejects the whole batch with its index."""
+    items = [{"input_text": "One"}, {"input_text": ""}, "Three"]
+    response = test_client.post("/submit_batch", json=items)
+    assert response.status_code == 400
+    assert [error["index"] for error in response.get_json()["items"]] == [1, 2]
+    assert not app_mod.sensor_data_collection.data
+
+
+def test_submit_batch_enforces_limits(test_client, monkeypatch):
+    """Test the item-count and payload-size limits of /submit_batch."""
+    monkeypatch.setattr(app_mod, "SUBMIT_BATCH_MAX_ITEMS", 2)
+    items = [{"input_text": "Hello"}] * 3
+    assert test_client.post("/submit_batch", json=items).status_code == 413
+    monkeypatch.setattr(app_mod, "SUBMIT_BATCH_MAX_BYTES", 10)
+    assert test_client.post("/submit_batch", json=items[:2]).status_code == 413
+    # a chunked body without a Content-Length, as gunicorn passes it on
+    response = test_client.post(
+        "/submit_batch",
+        input_stream=io.BytesIO(json.dumps(items[:2]).encode()),
+        content_type="application/json",
+        headers={"Transfer-Encoding": "chunked"},
+        environ_overrides={"wsgi.input_terminated": True},
+    )
+    assert response.status_code == 413
+    assert response.get_json()["error"] == "Payload exceeds 10 bytes"
+    assert test_client.post("/submit_batch", json={}).status_code == 400
+
+
+def test_submit_text_buffered_mode(test_client, monkeypatch):
+    """Test that buffered ingestion answers with the id of the committed record."""
+    monkeypatch.setattr(app_mod, "INGEST_MODE", "buffered")
+    response = test_client.post("/submit_text", json={"input_text": "Hello"})
+    assert response.status_code == 200
+    stored = app_mod.sensor_data_collection.data
+    assert [str(doc["_id"]) for doc in stored] == [response.get_json()["id"]]
+
+
+def test_group_commit_batches_and_drains():
+    """Test that queued documents share one insert_many and close() drains them."""
+
+    class CountingCollection(DummyCollection):
+        """Counts insert_many calls and can be made to fail."""
+
+        def __init__(self):
+            super().__init__()
+            self.batches = []
+            self.down = False
+
+        def insert_many(self, documents, ordered=True):
+            if self.down:
+                raise AutoReconnect("connection lost")
+            if any(doc["input_text"] == 2**70 for doc in documents):
+                raise OverflowError("MongoDB can only handle up to 8-byte ints")
+            self.batches.append(len(documents))
+            return super().insert_many(documents, ordered)
+
+    collection = CountingCollection()
+    buffer = GroupCommitBuffer(lambda: collection, max_batch=3, max_delay=60)
+    first = [buffer.submit({"input_text": str(i)}) for i in range(3)]
+    assert [future.result(5) for future in first] == [
+        doc["_id"] for doc in collection.data
+    ]
+    assert collection.batches == [3]
+    # an error outside pymongo's fails its batch, the flusher carries on
+    unencodable = [buffer.submit({"input_text": 2**70}) for _ in range(3)]
+    assert all(isinstance(future.exception(5), OverflowError) for future in unencodable)
+    after = [buffer.submit({"input_text": str(i)}) for i in range(3)]
+    assert all(future.result(5) for future in after)
+    assert collection.batches == [3, 3]
+    # below max_batch and max_delay, only close() flushes these
+    collection.down = True
+    failing = [buffer.submit({"input_text": str(i)}) for i in range(2)]
+    buffer.close(5)
+    assert all(isinstance(future.exception(0), AutoReconnect) for future in failing)
+    with pytest.raises(BufferClosed):
+        buffer.submit({"input_text": "after close"})
+
+
+def test_dead_letters_list_and_requeue(test_client):
+    """Test that users list, inspect and requeue only their own dead-lettered records."""
+    assert test_client.get("/api/dead_letters").status_code == 401
+    now = datetime.datetime.now()
+    user_id = login_as_new_user(test_client)
+    failed_id = app_mod.sensor_data_collection.insert_one(
+        {
+            "user_id": user_id,
+            "input_text": "Hello",
+            "target_language": "xx",
+            "timestamp": now,
+            "status": "failed",
+            "attempts": 5,
+            "last_error": "invalid destination language",
+            "failed_at": now,
+        }
+    ).inserted_id
+    app_mod.sensor_data_collection.insert_one(
+        {"input_text": "Hi", "timestamp": now, "status": "pending"}
+    )
+    others_id = app_mod.sensor_data_collection.insert_one(
+        {"user_id": "someone-else", "input_text": "Hey", "status": "failed"}
+    ).inserted_id
+
+    listing = test_client.get("/api/dead_letters").get_json()
+    assert [record["_id"] for record in listing["records"]] == [str(failed_id)]
+    assert listing["records"][0]["last_error"] == "invalid destination language"
+    pending = test_client.get("/api/sensor_data?status=pending").get_json()
+    assert [record["input_text"] for record in pending] == ["Hi"]
+    record = test_client.get(f"/api/sensor_data/{failed_id}?wait=5").get_json()
+    assert record["status"] == "failed"
+
+    response = test_client.post(f"/api/dead_letters/{failed_id}/requeue")
+    assert response.status_code == 200
+    stored = app_mod.sensor_data_collection.data[0]
+    assert stored["status"] == "pending" and stored["attempts"] == 0
+    assert "last_error" not in stored
+    assert not test_client.get("/api/dead_letters").get_json()["records"]
+    response = test_client.post(f"/api/dead_letters/{failed_id}/requeue")
+    assert response.status_code == 404
+    response = test_client.post(f"/api/dead_letters/{others_id}/requeue")
+    assert response.status_code == 404
+
+
+def test_get_sensor_record_projects_fields(test_client):
+    """Test that a single record is returned with only the requested fields and a status."""
+    record_id = app_mod.sensor_data_collection.insert_one(
+        {
+            "input_text": "Hello",
+            "target_language": "fr",
+            "translated_text": "Bonjour",
+            "timestamp": datetime.datetime.now(),
+        }
+    ).inserted_id
+    response = test_client.get(f"/api/sensor_data/{record_id}?fields=translated_text")
+    assert response.status_code == 200
+    json_data = response.get_json()
+    assert json_data == {
+        "_id": str(record_id),
+        "translated_text": "Bonjour",
+        "status": "translated",
+    }
+
+
+def test_get_sensor_record_reports_language_progress(test_client):
+    """Test that a record with several target languages reports each one's status."""
+    record_id = app_mod.sensor_data_collection.insert_one(
+        {
+            "input_text": "Hello",
+            "target_language": "fr",
+            "target_languages": ["fr", "de"],
+            "translations": {"fr": "Bonjour"},
+            "status": "pending",
+        }
+    ).inserted_id
+    response = test_client.get(f"/api/sensor_data/{record_id}?fields=translations")
+    assert response.get_json() == {
+        "_id": str(record_id),
+        "translations": {"fr": "Bonjour"},
+        "status": "pending",
+        "languages": {"fr": "translated", "de": "pending"},
+    }
+
+
+def test_get_sensor_record_long_poll_times_out(test_client):
+    """Test that a long-poll on an untranslated record returns it as pending after the wait."""
+    record_id = app_mod.sensor_data_collection.insert_one(
+        {"input_text": "Hello", "target_language": "fr"}
+    ).inserted_id
+    response = test_client.get(f"/api/sensor_data/{record_id}?wait=0.05")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "pending"
+
+
+def test_get_sensor_record_long_poll_is_woken_by_the_notifier(test_client):
+    """Test that the notifier wakes a long-poll as soon as the record is dead-lettered."""
+    record_id = app_mod.sensor_data_collection.insert_one(
+        {"input_text": "Hello", "target_language": "xx", "status": "pending"}
+    ).inserted_id
+
+    def dead_letter():
+        record = app_mod.sensor_data_collection.data[0]
+        record["status"] = "failed"
+        app_mod.notifier.publish(record)
+
+    threading.Timer(0.05, dead_letter).start()
+    started = time.monotonic()
+    response = test_client.get(f"/api/sensor_data/{record_id}?wait=5")
+    assert response.get_json()["status"] == "failed"
+    assert time.monotonic() - started < 1
+    assert not app_mod.notifier.record_listeners
+
+
+def test_get_sensor_record_errors(test_client):
+    """Test that bad ids, unknown records and unknown fields are rejected."""
+    assert test_client.get("/api/sensor_data/not-an-id").status_code == 400
+    assert test_client.get(f"/api/sensor_data/{ObjectId()}").status_code == 404
+    record_id = app_mod.sensor_data_collection.insert_one(
+        {"input_text": "x"}
+    ).inserted_id
+    response = test_client.get(f"/api/sensor_data/{record_id}?fields=password")
+    assert response.status_code == 400
+
+
+def test_stream_requires_login(test_client):
+    """Test that the event stream is only available to logged in users."""
+    assert test_client.get("/api/stream").status_code == 401
+
+
+def test_stream_pushes_own_translations(test_client, monkeypatch):
+    """Test that the event stream delivers the logged in user's translated records only."""
+    monkeypatch.setattr(app_mod.notifier, "run", lambda: None)
+    with test_client.session_transaction() as sess:
+        sess["user_id"] = "user-1"
+    response = test_client.get("/api/stream", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b"retry:")
+
+    app_mod.notifier.publish(
+        {"_id": ObjectId(), "user_id": "user-2", "translated_text": "Hallo"}
+    )
+    app_mod.notifier.publish(
+        {"_id": ObjectId(), "user_id": "user-1", "translated_text": "Hola"}
+    )
+    event = next(chunks).decode()
+    response.close()
+    assert "event: translation" in event
+    assert json.loads(event.split("data: ")[1])["translated_text"] == "Hola"
+    assert app_mod.notifier.subscriber_count() == 0
+
+
+def test_get_sensor_data_pages_with_cursor(test_client):
+    """Test that /api/sensor_data pages newest first and continues from a cursor."""
+    start = datetime.datetime(2025, 4, 1, 12, 0, 0)
+    for minute in range(5):
+        app_mod.sensor_data_collection.insert_one(
+            {
+                "input_text": f"text{minute}",
+                "target_language": "fr",
+                "timestamp": start + datetime.timedelta(minutes=minute),
+            }
+        )
+    first_page = test_client.get("/api/sensor_data?limit=2&fields=input_text")
+    records = first_page.get_json()
+    assert [record["input_text"] for record in records] == ["text4", "text3"]
+    assert set(records[0]) == {"_id", "input_text", "timestamp"}
+
+    cursor = f"{records[-1]['timestamp']},{records[-1]['_id']}"
+    second_page = test_client.get(
+        "/api/sensor_data", query_string={"limit": 2, "cursor": cursor}
+    )
+    assert [record["input_text"] for record in second_page.get_json()] == [
+        "text2",
+        "text1",
+    ]
+
+
+def test_get_sensor_data_filters_and_ndjson(test_client):
+    """Test that /api/sensor_data filters by status and language and can stream NDJSON."""
+    now = datetime.datetime.now()
+    app_mod.sensor_data_collection.insert_one(
+        {"input_text": "a", "target_language": "fr", "timestamp": now}
+    )
+    app_mod.sensor_data_collection.insert_one(
+        {
+            "input_text": "b",
+            "target_language": "fr",
+            "translated_text": "b!",
+            "timestamp": now,
+        }
+    )
+    app_mod.sensor_data_collection.insert_one(
+        {"input_text": "c", "target_language": "de", "timestamp": now}
+    )
+    response = test_client.get(
+        "/api/sensor_data?status=pending&target_language=fr&format=ndjson"
+    )
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["input_text"] for line in lines] == ["a"]
+
+    assert test_client.get("/api/sensor_data?status=done").status_code == 400
+    assert test_client.get("/api/sensor_data?cursor=bogus").status_code == 400
+
+
+def login_as_new_user(test_client):
+    """Insert a dummy user, log the test client in as them and return their id."""
+    user_id = app_mod.users_collection.insert_one(
+        {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com"}
+    ).inserted_id
+    with test_client.session_transaction() as sess:
+        sess["user_id"] = str(user_id)
+        sess["username"] = "ada@example.com"
+    return str(user_id)
+
+
+def test_account_history_pages(test_client):
+    """Test that account history is paged newest first with a cursor for older pages."""
+    user_id = login_as_new_user(test_client)
+    start = datetime.datetime(2025, 4, 1, 12, 0, 0)
+    for minute in range(app_mod.ACCOUNT_PAGE_SIZE + 5):
+        app_mod.sensor_data_collection.insert_one(
+            {
+                "input_text": f"text{minute}",
+                "user_id": user_id,
+                "timestamp": start + datetime.timedelta(minutes=minute),
+            }
+        )
+    first_page = test_client.get("/api/account/translations").get_json()
+    assert len(first_page["translations"]) == app_mod.ACCOUNT_PAGE_SIZE
+    assert first_page["translations"][0]["input_text"] == (
+        f"text{app_mod.ACCOUNT_PAGE_SIZE + 4}"
+    )
+    last_page = test_client.get(
+        "/api/account/translations",
+        query_string={"cursor": first_page["next_cursor"]},
+    ).get_json()
+    assert [record["input_text"] for record in last_page["translations"]] == [
+        f"text{minute}" for minute in range(4, -1, -1)
+    ]
+    assert last_page["next_cursor"] is None
+
+    response = test_client.get("/account")
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert "Older translations" in page
+    assert "text0" not in page
+
+
+def test_account_history_includes_archived(test_client):
+    """Test that account history pages across live and archived translations."""
+    user_id = login_as_new_user(test_client)
+    start = datetime.datetime(2025, 4, 1, 12, 0, 0)
+    for minute in range(app_mod.ACCOUNT_PAGE_SIZE + 4):
+        collection = (
+            app_mod.sensor_data_archive_collection
+            if minute % 2
+            else app_mod.sensor_data_collection
+        )
+        collection.insert_one(
+            {
+                "input_text": f"text{minute}",
+                "user_id": user_id,
+                "timestamp": start + datetime.timedelta(minutes=minute),
+            }
+        )
+    seen = []
+    cursor = None
+    while True:
+        query_string = {"cursor": cursor} if cursor else {}
+        page = test_client.get(
+            "/api/account/translations", query_string=query_string
+        ).get_json()
+        seen.extend(record["input_text"] for record in page["translations"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [
+        f"text{minute}" for minute in range(app_mod.ACCOUNT_PAGE_SIZE + 3, -1, -1)
+    ]
+
+
+def test_home_feed_is_cached_until_a_write(test_client, monkeypatch):
+    """Test that /home reuses the cached feed until a submission or translation invalidates it."""
+    monkeypatch.setattr(app_mod.notifier, "run", lambda: None)
+    login_as_new_user(test_client)
+    sensor_data = app_mod.sensor_data_collection
+    sensor_data.insert_one(
+        {
+            "input_text": "first",
+            "target_language": "fr",
+            "timestamp": datetime.datetime.now(),
+        }
+    )
+    assert "first" in test_client.get("/home").get_data(as_text=True)
+    test_client.get("/home")
+    assert sensor_data.find_calls == 1
+
+    test_client.post("/submit_text", json={"input_text": "second"})
+    assert "second" in test_client.get("/home").get_data(as_text=True)
+    assert sensor_data.find_calls == 2
+
+    app_mod.notifier.publish({"_id": ObjectId(), "translated_text": "zweite"})
+    test_client.get("/home")
+    assert sensor_data.find_calls == 3
+
+
+def test_metrics_exposes_route_latency(test_client):
+    """Test that /metrics reports request latency per route pattern."""
+    test_client.get("/login")
+    test_client.get(f"/api/sensor_data/{ObjectId()}")
+    body = test_client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/login",status="200"}'
+        in body
+    )
+    assert 'route="/api/sensor_data/<record_id>",status="404"' in body
+    assert "home_feed_cache_lookups_total" in body
+
+
+def test_create_app_configures_the_connection_pool():
+    """Test that create_app applies config overrides to the lazily connected client."""
+    app = app_mod.create_app(
+        {"MONGO_MAX_POOL_SIZE": 7, "MONGO_READ_PREFERENCE": "secondaryPreferred"}
+    )
+    assert app.config["MONGO_MAX_POOL_SIZE"] == 7
+    assert app_mod.mongo.cx.options.pool_options.max_pool_size == 7
+    assert app_mod.mongo.cx.read_preference.mongos_mode == "secondaryPreferred"
+    assert "main.account" in app.view_functions
+
+
+def test_submissions_update_user_stats(test_client):
+    """Test that submissions count into the user's stats, served by /api/stats."""
+    assert test_client.get("/api/stats").status_code == 401
+    user_id = login_as_new_user(test_client)
+    test_client.post("/submit_text", json={"input_text": "Hi", "target_language": "fr"})
+    test_client.post(
+        "/submit_batch",
+        json=[
+            {"input_text": "One", "target_languages": ["fr", "de"]},
+            {"input_text": "Two"},
+        ],
+    )
+    app_mod.user_stats_collection.update_one(
+        {"_id": user_id},
+        {"$inc": {"translated": 1, "languages.fr.translated": 1}},
+    )
+
+    response = test_client.get("/api/stats")
+    assert response.status_code == 200
+    stats = response.get_json()
+    assert stats["submitted"] == 3
+    assert stats["translated"] == 1
+    assert stats["failures"] == 0
+    assert stats["languages"] == {
+        "fr": {"submitted": 2, "translated": 1},
+        "de": {"submitted": 1},
+        "es": {"submitted": 1},
+    }
+    assert stats["last_activity"]
+    assert "of 2 translated" in test_client.get("/account").get_data(as_text=True)
+
+
+def test_get_sensor_data_answers_not_modified(test_client):
+    """Test that /api/sensor_data revalidates with ETag and Last-Modified."""
+    now = datetime.datetime.now()
+    app_mod.sensor_data_collection.insert_one({"input_text": "a", "timestamp": now})
+    response = test_client.get("/api/sensor_data")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["Last-Modified"]
+    assert "no-cache" in response.headers["Cache-Control"]
+
+    cached = test_client.get("/api/sensor_data", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert not cached.get_data()
+    cached = test_client.get(
+        "/api/sensor_data",
+        headers={"If-Modified-Since": response.headers["Last-Modified"]},
+    )
+    assert cached.status_code == 304
+
+    app_mod.sensor_data_collection.insert_one(
+        {"input_text": "b", "timestamp": now + datetime.timedelta(seconds=1)}
+    )
+    changed = test_client.get("/api/sensor_data", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+    # a failed attempt changes neither timestamp, but sets updated_at
+    etag = changed.headers["ETag"]
+    app_mod.sensor_data_collection.data[0].update(
+        attempts=1,
+        last_error="backend down",
+        updated_at=now + datetime.timedelta(seconds=5),
+    )
+    changed = test_client.get("/api/sensor_data", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.get_json()[1]["last_error"] == "backend down"
+
+
+def test_account_answers_not_modified(test_client):
+    """Test that /account is revalidated against the user's statistics."""
+    user_id = login_as_new_user(test_client)
+    response = test_client.get("/account")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert (
+        test_client.get("/account", headers={"If-None-Match": etag}).status_code == 304
+    )
+
+    test_client.post("/submit_text", json={"input_text": "Hi"})
+    assert app_mod.user_stats_collection.find_one({"_id": user_id})
+    assert (
+        test_client.get("/account", headers={"If-None-Match": etag}).status_code == 200
+    )
+
+
+def test_responses_are_compressed(test_client, monkeypatch):
+    """Test that large JSON responses are sent with brotli or gzip encoding."""
+    monkeypatch.setitem(app_mod.__dict__, "COMPRESS_MIN_BYTES", 100)
+    now = datetime.datetime.now()
+    for index in range(20):
+        app_mod.sensor_data_collection.insert_one(
+            {"input_text": f"text {index}", "timestamp": now}
+        )
+    plain = test_client.get("/api/sensor_data")
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["Vary"] == "Accept-Encoding"
+
+    compressed = test_client.get(
+        "/api/sensor_data", headers={"Accept-Encoding": "gzip"}
+    )
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+
+    compressed = test_client.get(
+        "/api/sensor_data", headers={"Accept-Encoding": "gzip, br"}
+    )
+    assert compressed.headers["Content-Encoding"] == "br"
+    assert brotli.decompress(compressed.get_data()) == plain.get_data()
+
+    small = test_client.get("/api/stats", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
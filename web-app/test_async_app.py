@@ -0,0 +1,322 @@
+# pylint: disable=r0903,w0621
+"""
+Testing for async_app.py.
+
+Requests are sent straight through the ASGI interface. The async tier's
+collections wrap the dummy collections of test_app.py, which the Flask app
+behind it shares, so both tiers see the same records.
+"""
+
+import gzip
+import json
+import time
+import asyncio
+import threading
+import datetime
+import pytest
+from bson import ObjectId
+import app as app_mod
+import async_app
+from test_app import DummyCollection
+
+
+class AsyncDummyCursor:
+    """A DummyCursor iterated with 'async for', like pymongo's AsyncCursor."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, keys):
+        """Sort by a list of (key, direction) pairs."""
+        return AsyncDummyCursor(self.cursor.sort(keys))
+
+    def limit(self, count):
+        """Return at most 'count' documents."""
+        return AsyncDummyCursor(self.cursor.limit(count))
+
+    async def __aiter__(self):
+        for document in self.cursor:
+            yield document
+
+
+class AsyncDummyCollection:
+    """Awaitable operations on a DummyCollection, like pymongo's AsyncCollection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, query, projection=None, sort=None):
+        """Return the first document matching the given query."""
+        return self.collection.find_one(query, projection, sort=sort)
+
+    def find(self, query, projection=None):
+        """Return a cursor over the documents matching the given query."""
+        return AsyncDummyCursor(self.collection.find(query, projection))
+
+    async def insert_one(self, document):
+        """Insert a document."""
+        return self.collection.insert_one(document)
+
+    async def update_one(self, query, update, upsert=False):
+        """Update the first matching document."""
+        return self.collection.update_one(query, update, upsert=upsert)
+
+
+@pytest.fixture
+def asgi_app(monkeypatch):
+    """The async tier, with dummy collections shared by both tiers patched in."""
+    sensor_data = DummyCollection()
+    user_stats = DummyCollection()
+    for name, collection in (
+        ("users_collection", DummyCollection()),
+        ("sensor_data_collection", sensor_data),
+        ("sensor_data_archive_collection", DummyCollection()),
+        ("user_stats_collection", user_stats),
+    ):
+        monkeypatch.setitem(app_mod.__dict__, name, collection)
+    monkeypatch.setitem(
+        async_app.__dict__, "sensor_data_collection", AsyncDummyCollection(sensor_data)
+    )
+    monkeypatch.setitem(
+        async_app.__dict__, "user_stats_collection", AsyncDummyCollection(user_stats)
+    )
+    monkeypatch.setattr(app_mod.notifier, "run", lambda: None)
+    return async_app.create_asgi_app({"TESTING": True})
+
+
+async def call(asgi, request_line, body=b"", headers=(), until=None):
+    """
+    Send one request, e.g. "GET /api/stream", to an ASGI app and return its
+    status, headers and body. The client disconnects once 'until(body
+    received so far)' is true.
+    """
+    method, path = request_line.split(" ", 1)
+    disconnected = asyncio.Event()
+    requests = [{"type": "http.request", "body": body}]
+    response = {"body": b""}
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {
+                name.decode(): value.decode() for name, value in message["headers"]
+            }
+        else:
+            response["body"] += message.get("body", b"")
+            if until and until(response["body"]):
+                disconnected.set()
+
+    path, _, query_string = path.partition("?")
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "query_string": query_string.encode(),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 12345),
+    }
+    await asgi(scope, receive, send)
+    return response["status"], response["headers"], response["body"]
+
+
+def request(asgi, request_line, **kwargs):
+    """call() from synchronous code."""
+    return asyncio.run(call(asgi, request_line, **kwargs))
+
+
+def login_cookie(asgi, user_id="user-1"):
+    """Return a Cookie header with the Flask app's session of a logged in user."""
+    client = asgi.flask_app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["username"] = f"{user_id}@example.com"
+    return ("Cookie", f"session={client.get_cookie('session').value}")
+
+
+def test_submit_text_reads_the_flask_session(asgi_app):
+    """Test that /submit_text stores the logged in user's record and counts it."""
+    status, _, body = request(
+        asgi_app,
+        "POST /submit_text",
+        body=json.dumps(
+            {"input_text": "Hello", "target_languages": ["fr", "de"]}
+        ).encode(),
+        headers=[login_cookie(asgi_app), ("Content-Type", "application/json")],
+    )
+    assert status == 200
+    stored = app_mod.sensor_data_collection.data
+    assert [str(doc["_id"]) for doc in stored] == [json.loads(body)["id"]]
+    assert stored[0]["user_id"] == "user-1"
+    assert stored[0]["translator"] == "user-1@example.com"
+    assert stored[0]["target_languages"] == ["fr", "de"]
+    stats = app_mod.user_stats_collection.find_one({"_id": "user-1"})
+    assert stats["languages"] == {"fr": {"submitted": 1}, "de": {"submitted": 1}}
+
+    assert request(asgi_app, "POST /submit_text", body=b"{}")[0] == 400
+    assert request(asgi_app, "POST /submit_text", body=b"not json")[0] == 400
+
+
+def test_submit_text_rejects_large_payloads(asgi_app, monkeypatch):
+    """Test that an oversized body is refused before it is parsed."""
+    monkeypatch.setattr(async_app, "SUBMIT_TEXT_MAX_BYTES", 10)
+    status, _, _ = request(
+        asgi_app, "POST /submit_text", body=b'{"input_text": "Hello, world"}'
+    )
+    assert status == 413
+
+
+def test_submit_text_buffered_mode(asgi_app, monkeypatch):
+    """Test that buffered ingestion awaits the group commit of the record."""
+    monkeypatch.setattr(async_app, "INGEST_MODE", "buffered")
+    status, _, body = request(
+        asgi_app, "POST /submit_text", body=b'{"input_text": "Hello"}'
+    )
+    assert status == 200
+    stored = app_mod.sensor_data_collection.data
+    assert [str(doc["_id"]) for doc in stored] == [json.loads(body)["id"]]
+
+
+def test_long_poll_returns_when_translated(asgi_app):
+    """Test that the notifier wakes a long-poll as soon as the record is translated."""
+    record_id = app_mod.sensor_data_collection.insert_one(
+        {"input_text": "Hi", "timestamp": datetime.datetime.now()}
+    ).inserted_id
+
+    async def translate_later():
+        await asyncio.sleep(0.05)
+        record = app_mod.sensor_data_collection.data[0]
+        record["translated_text"] = "Hola"
+        # from the notifier thread, as its change stream would
+        threading.Thread(target=app_mod.notifier.publish, args=(record,)).start()
+
+    async def poll():
+        started = time.monotonic()
+        (status, _, body), _ = await asyncio.gather(
+            call(asgi_app, f"GET /api/sensor_data/{record_id}?wait=5"),
+            translate_later(),
+        )
+        return status, json.loads(body), time.monotonic() - started
+
+    status, record, elapsed = asyncio.run(poll())
+    assert status == 200
+    assert record["status"] == "translated"
+    assert record["translated_text"] == "Hola"
+    assert elapsed < 1
+    assert not app_mod.notifier.record_listeners
+
+    assert request(asgi_app, "GET /api/sensor_data/bogus")[0] == 400
+    assert request(asgi_app, f"GET /api/sensor_data/{ObjectId()}")[0] == 404
+
+
+def test_long_polls_share_one_thread(asgi_app):
+    """Test that many waiting long-polls are held concurrently by the event loop."""
+    record_id = app_mod.sensor_data_collection.insert_one(
+        {"input_text": "Hi", "timestamp": datetime.datetime.now()}
+    ).inserted_id
+
+    async def polls():
+        started = time.monotonic()
+        responses = await asyncio.gather(
+            *(
+                call(asgi_app, f"GET /api/sensor_data/{record_id}?wait=0.2")
+                for _ in range(100)
+            )
+        )
+        return responses, time.monotonic() - started
+
+    responses, elapsed = asyncio.run(polls())
+    assert {json.loads(body)["status"] for _, _, body in responses} == {"pending"}
+    # one after the other, they would take 100 * 0.2 seconds
+    assert elapsed < 5
+
+
+def test_sensor_data_streams_pages(asgi_app, monkeypatch):
+    """Test that /api/sensor_data pages, revalidates and compresses like the Flask app."""
+    monkeypatch.setattr(async_app, "COMPRESS_MIN_BYTES", 100)
+    start = datetime.datetime(2025, 5, 1)
+    for second in range(5):
+        app_mod.sensor_data_collection.insert_one(
+            {"input_text": f"text{second}", "timestamp": start.replace(second=second)}
+        )
+    status, headers, body = request(asgi_app, "GET /api/sensor_data?limit=2")
+    assert status == 200
+    assert [record["input_text"] for record in json.loads(body)] == ["text4", "text3"]
+    assert headers["vary"] == "Accept-Encoding"
+
+    _, _, body = request(asgi_app, "GET /api/sensor_data?format=ndjson&fields=x")
+    assert json.loads(body)["error"].startswith("Unknown fields")
+    _, headers, body = request(
+        asgi_app, "GET /api/sensor_data?format=ndjson&fields=input_text"
+    )
+    assert headers["content-type"] == "application/x-ndjson"
+    assert len(body.splitlines()) == 5
+    _, _, body = request(asgi_app, "GET /api/sensor_data?status=translated")
+    assert json.loads(body) == []
+
+    status, _, _ = request(
+        asgi_app,
+        "GET /api/sensor_data",
+        headers=[("If-None-Match", headers["etag"])],
+    )
+    assert status == 304
+
+    _, headers, body = request(
+        asgi_app, "GET /api/sensor_data", headers=[("Accept-Encoding", "gzip")]
+    )
+    assert headers["content-encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(body))) == 5
+
+
+def test_stream_pushes_translations(asgi_app):
+    """Test that the event stream delivers the user's translations and unsubscribes."""
+    assert request(asgi_app, "GET /api/stream")[0] == 401
+
+    async def stream():
+        response = asyncio.ensure_future(
+            call(
+                asgi_app,
+                "GET /api/stream",
+                headers=[login_cookie(asgi_app)],
+                until=lambda body: b"event: translation" in body,
+            )
+        )
+        while not app_mod.notifier.subscriber_count():
+            await asyncio.sleep(0.01)
+        app_mod.notifier.publish(
+            {"_id": ObjectId(), "user_id": "user-2", "translated_text": "Hallo"}
+        )
+        app_mod.notifier.publish(
+            {"_id": ObjectId(), "user_id": "user-1", "translated_text": "Hola"}
+        )
+        return await response
+
+    status, headers, body = asyncio.run(stream())
+    assert status == 200
+    assert headers["content-type"].startswith("text/event-stream")
+    event = body.decode().split("\n\n")[1]
+    assert json.loads(event.split("data: ")[1])["translated_text"] == "Hola"
+    assert app_mod.notifier.subscriber_count() == 0
+
+
+def test_other_routes_are_served_by_flask(asgi_app):
+    """Test that the remaining routes reach the Flask app with the same session."""
+    status, headers, body = request(asgi_app, "GET /")
+    assert status == 200
+    assert headers["content-type"].startswith("text/html")
+    assert b"<form" in body.lower()
+
+    status, _, body = request(
+        asgi_app, "GET /api/stats", headers=[login_cookie(asgi_app)]
+    )
+    assert status == 200
+    assert json.loads(body)["submitted"] == 0
+    assert request(asgi_app, "GET /submit_text")[0] == 405
@@ -0,0 +1,56 @@
+# pylint: disable=r0903,w0613
+"""
+Testing for the web app index management (indexes.py).
+
+This file runs the COLLSCAN check against dummy collections that return
+canned explain() output.
+"""
+
+from indexes import check_indexes
+
+
+class DummyExplainCursor:
+    """A dummy cursor whose explain() reports a fixed winning plan."""
+
+    def __init__(self, winning_plan):
+        """Initialize the cursor with the plan explain() returns."""
+        self.winning_plan = winning_plan
+
+    def limit(self, count):
+        """Ignore the limit."""
+        return self
+
+    def sort(self, keys):
+        """Ignore the sort."""
+        return self
+
+    def explain(self):
+        """Return the canned plan in the shape MongoDB uses."""
+        return {"queryPlanner": {"winningPlan": self.winning_plan}}
+
+
+class DummyExplainCollection:
+    """A dummy collection that plans every query the same way."""
+
+    def __init__(self, winning_plan):
+        """Initialize the collection with the plan its queries get."""
+        self.winning_plan = winning_plan
+
+    def find(self, query):
+        """Return a cursor with the canned plan."""
+        return DummyExplainCursor(self.winning_plan)
+
+
+def test_check_indexes_reports_collection_scans():
+    """Only queries planned with a COLLSCAN are reported."""
+    database = {
+        "users": DummyExplainCollection(
+            {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}
+        ),
+        "sensor_data": DummyExplainCollection({"stage": "COLLSCAN"}),
+    }
+    queries = [
+        ("by email", "users", {"email": "a@b.c"}, None),
+        ("history", "sensor_data", {"user_id": "u"}, [("timestamp", -1)]),
+    ]
+    assert check_indexes(database, queries) == ["history"]
@@ -0,0 +1,130 @@
+"""
+Group-commit write buffer for the web app.
+
+Request threads hand their documents to a GroupCommitBuffer, which assigns
+the _id up front and lets one background thread commit everything queued
+with a single insert_many once 'max_batch' documents are waiting or the
+oldest has waited 'max_delay' seconds. Each request gets a future that
+resolves when its own batch is acknowledged, so bursts of submissions
+share one round trip to the database instead of paying one each.
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+
+class BufferFull(Exception):
+    """Raised when the buffer already holds 'max_pending' documents."""
+
+
+class BufferClosed(Exception):
+    """Raised when a document is submitted after close()."""
+
+
+class GroupCommitBuffer:  # pylint: disable=too-many-instance-attributes
+    """Batches inserts into one collection and commits them together."""
+
+    def __init__(
+        self, get_collection, max_batch=100, max_delay=0.005, max_pending=10000
+    ):
+        """'get_collection' returns the collection the documents are inserted into."""
+        self.get_collection = get_collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = None
+
+    def submit(self, document):
+        """
+        Queues a document for insertion and returns a future that resolves to
+        its _id once the batch holding it is committed, or raises the error
+        that made the batch fail.
+        """
+        document.setdefault("_id", ObjectId())
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise BufferClosed("Write buffer is closed")
+            if len(self.pending) >= self.max_pending:
+                raise BufferFull(f"{self.max_pending} documents already waiting")
+            self.pending.append((time.monotonic(), document, future))
+            # a flusher that died on an unexpected error is replaced
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name="group-commit", daemon=True
+                )
+                self.thread.start()
+            self.condition.notify()
+        return future
+
+    def __len__(self):
+        return len(self.pending)
+
+    def next_batch(self):
+        """
+        Waits until a batch is due and removes it from the queue. Returns an
+        empty list once the buffer is closed and drained.
+        """
+        with self.condition:
+            while True:
+                if len(self.pending) >= self.max_batch or (
+                    self.closed and self.pending
+                ):
+                    break
+                if self.closed:
+                    return []
+                if self.pending:
+                    wait = self.pending[0][0] + self.max_delay - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self.condition.wait(wait)
+                else:
+                    self.condition.wait()
+            count = min(self.max_batch, len(self.pending))
+            return [self.pending.popleft() for _ in range(count)]
+
+    def commit(self, batch):
+        """Inserts a batch with one unordered insert_many and settles its futures."""
+        failures = {}
+        try:
+            self.get_collection().insert_many(
+                [document for _, document, _ in batch], ordered=False
+            )
+        except BulkWriteError as e:
+            if e.details.get("writeConcernErrors"):
+                failures = dict.fromkeys(range(len(batch)), e)
+            for error in e.details.get("writeErrors", []):
+                failures[error["index"]] = e
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # e.g. DocumentTooLarge or OverflowError while encoding: only this
+            # batch fails, the flusher thread keeps running
+            failures = dict.fromkeys(range(len(batch)), e)
+        for index, (_, document, future) in enumerate(batch):
+            if index in failures:
+                future.set_exception(failures[index])
+            else:
+                future.set_result(document["_id"])
+
+    def run(self):
+        """Commits batches until the buffer is closed and drained."""
+        while True:
+            batch = self.next_batch()
+            if not batch:
+                return
+            self.commit(batch)
+
+    def close(self, timeout=None):
+        """Stops accepting documents and waits for the queued ones to commit."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+            thread = self.thread
+        if thread is not None:
+            thread.join(timeout)